@@ -0,0 +1,56 @@
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+IO_THREAD_POOL_SIZE = int(os.getenv("IO_THREAD_POOL_SIZE", "16"))
+
+# Timeout (seconds) for each blocking call made from the graph
+IO_TIMEOUTS = {
+    "safety_check": float(os.getenv("SAFETY_CHECK_TIMEOUT", "5")),
+    "memory_search": float(os.getenv("MEMORY_SEARCH_TIMEOUT", "5")),
+    "memory_put": float(os.getenv("MEMORY_PUT_TIMEOUT", "5")),
+    "token_fetch": float(os.getenv("TOKEN_FETCH_TIMEOUT", "10")),
+    "semantic_cache": float(os.getenv("SEMANTIC_CACHE_TIMEOUT", "2")),
+    "tool_compaction": float(os.getenv("TOOL_COMPACTION_TIMEOUT", "5")),
+}
+
+# When set, asyncio debug mode logs every callback/task step (e.g. a graph node) that
+# holds the event loop longer than this many milliseconds
+LOOP_BLOCK_DEBUG_MS = os.getenv("LOOP_BLOCK_DEBUG_MS")
+
+# Dedicated pool so blocking SDK calls never compete with the default executor
+io_executor = ThreadPoolExecutor(max_workers=IO_THREAD_POOL_SIZE, thread_name_prefix="agent-io")
+
+
+async def run_blocking(name: str, func, *args, timeout: float = None, **kwargs):
+    """Run a blocking call on the IO thread pool, bounded by the timeout configured for name"""
+    timeout = IO_TIMEOUTS.get(name) if timeout is None else timeout
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(io_executor, functools.partial(func, *args, **kwargs))
+    try:
+        return await asyncio.wait_for(future, timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.info(f"Blocking call {name} timed out after {timeout}s")
+        raise
+
+
+def enable_loop_block_detection(threshold_ms: float = None):
+    """Turn on asyncio debug mode so slow loop steps get logged with the offending coroutine"""
+    if threshold_ms is None:
+        if not LOOP_BLOCK_DEBUG_MS:
+            return False
+        threshold_ms = float(LOOP_BLOCK_DEBUG_MS)
+    loop = asyncio.get_running_loop()
+    loop.set_debug(True)
+    loop.slow_callback_duration = threshold_ms / 1000
+    logging.getLogger("asyncio").setLevel(logging.WARNING)
+    logger.info(f"Event loop block detection enabled, threshold {threshold_ms}ms")
+    return True
+
+
+def shutdown_io_executor():
+    io_executor.shutdown(wait=False, cancel_futures=True)
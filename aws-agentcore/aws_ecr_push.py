@@ -11,6 +11,8 @@ REGION = os.getenv("REGION")
 IMAGE_TAG = os.getenv("IMAGE_TAG")
 ecr_client = boto3.client('ecr', region_name=REGION)
 account_id = os.getenv("ACCOUNT_ID")
+# Modules shared with the mediator, passed to the build as the "common" context
+COMMON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common")
 
 
 
@@ -60,6 +62,7 @@ def build_and_push_image(repository_uri, tag, platform='linux/arm64'):
     build_cmd = [
         'sudo', 'docker', 'buildx', 'build',
         '--platform', platform,
+        '--build-context', f'common={COMMON_DIR}',
         '-t', full_image_name,
         '--push',
         '.'
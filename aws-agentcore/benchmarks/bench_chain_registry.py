@@ -0,0 +1,75 @@
+"""
+Micro-benchmark: per-turn CPU time of building the main tool chain on every tool-loop
+iteration (old mainToolLLM) versus looking it up in the ChainRegistry.
+
+    python benchmarks/bench_chain_registry.py --tools 8 --depth 10 --turns 50
+
+No network is used: bind_tools only converts the tool schemas locally.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.tools import StructuredTool
+from langchain_google_genai import ChatGoogleGenerativeAI
+from pydantic import BaseModel, Field
+
+from chain_registry import ChainRegistry, build_prompt
+from prompts import MAIN_TOOL_PROMPT
+
+
+class RetrievalArgs(BaseModel):
+    query: str = Field(description="Search query for arXiv")
+    max_results: int = Field(default=5, description="Number of papers to return")
+    sort_by: str = Field(default="relevance", description="relevance, lastUpdatedDate or submittedDate")
+
+
+class Verdict(BaseModel):
+    block: str = Field(description="Block the user's query, either true or false")
+
+
+def make_tools(count: int):
+    async def _noop(**kwargs):
+        return ""
+    return [
+        StructuredTool.from_function(coroutine=_noop, name=f"tool_{i}", description=f"Fake research tool {i}", args_schema=RetrievalArgs)
+        for i in range(count)
+    ]
+
+
+def cpu_per_turn(build_chain, turns: int, depth: int) -> float:
+    start = time.process_time()
+    for _ in range(turns):
+        for _ in range(depth):
+            build_chain()
+    return (time.process_time() - start) / turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tools", type=int, default=8)
+    parser.add_argument("--depth", type=int, default=10, help="tool-loop iterations per turn")
+    parser.add_argument("--turns", type=int, default=50)
+    args = parser.parse_args()
+
+    llm = ChatGoogleGenerativeAI(api_key="benchmark", model="gemini-2.5-pro")
+    tools = make_tools(args.tools)
+    verdict_parser = PydanticOutputParser(pydantic_object=Verdict)
+    node_llms = {node: llm for node in ("llm_guardrail", "topic_classifier", "main_tool_llm", "context_summarizer")}
+    registry = ChainRegistry(node_llms, verdict_parser, verdict_parser)
+
+    per_call = cpu_per_turn(lambda: build_prompt(MAIN_TOOL_PROMPT) | llm.bind_tools(tools), args.turns, args.depth)
+    registry_time = cpu_per_turn(lambda: registry.main_tool_chain(tools, 1), args.turns, args.depth)
+
+    print(f"tools={args.tools} depth={args.depth} turns={args.turns}")
+    print(f"rebuild per call : {per_call * 1000:.3f} ms CPU per turn")
+    print(f"chain registry   : {registry_time * 1000:.3f} ms CPU per turn")
+    print(f"saved            : {(per_call - registry_time) * 1000:.3f} ms CPU per turn")
+
+
+if __name__ == "__main__":
+    main()
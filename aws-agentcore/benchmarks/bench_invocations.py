@@ -0,0 +1,343 @@
+"""
+Offline end-to-end load benchmark of /invocations.
+
+The agent server (and optionally the mediator in front of it) runs in-process with fake
+chat models, a local fake MCP server and in-memory checkpointer/store, so no cloud
+service or API key is needed. Requests are driven over real HTTP at a fixed
+concurrency and TTFB, total latency, throughput and per-node time are reported.
+
+    python benchmarks/bench_invocations.py --concurrency 16 --requests 200
+    python benchmarks/bench_invocations.py --target mediator
+    python benchmarks/bench_invocations.py --compare benchmarks/results/baseline.json
+
+Results are written as JSON (with the git commit) so runs can be compared across commits.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(os.path.dirname(AGENT_DIR), "backend")
+COMMON_DIR = os.path.join(os.path.dirname(AGENT_DIR), "common")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Placeholders so the agent module imports without credentials, nothing is ever called
+BENCH_ENV = {
+    "GEMINI_API_KEY": "benchmark",
+    "OPENAI_API_KEY": "benchmark",
+    "AWS_REGION_NAME": "us-east-1",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "MEMORY_ID": "benchmark",
+    "CASCADE_ENABLED": "false",
+}
+
+sys.path.insert(0, AGENT_DIR)
+sys.path.append(COMMON_DIR)
+
+import httpx
+import uvicorn
+
+
+def percentile(values, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values, scale: float = 1000.0):
+    """p50/p95/p99/mean/max of durations in seconds, reported in ms"""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values) * scale, 2),
+        "p50": round(percentile(values, 0.50) * scale, 2),
+        "p95": round(percentile(values, 0.95) * scale, 2),
+        "p99": round(percentile(values, 0.99) * scale, 2),
+        "max": round(max(values) * scale, 2),
+    }
+
+
+def load_agent_module(args):
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    os.environ["TOOL_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="agent-bench-"), "tool_cache.sqlite3")
+    os.environ["VERDICT_CACHE_ENABLED"] = "true" if args.verdict_cache else "false"
+    os.environ["ADMISSION_ENABLED"] = "true" if args.admission else "false"
+    path = os.path.join(AGENT_DIR, "langgraph-agent-main.py")
+    spec = importlib.util.spec_from_file_location("langgraph_agent_main", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def wire_fakes(module, args, mcp_url: str):
+    """Swap every remote dependency of the agent module for its offline stand-in"""
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    import mcp_tool_registry
+    from chain_registry import ChainRegistry
+    from context_window import ContextManager
+    from memory_gateway import MemoryGateway
+    from tiered_checkpointer import TieredCheckpointSaver
+    from fakes import NodeTimer, SlowStore, TimedGraph, fake_access_token, fake_node_llms
+
+    def check_query_safety(query: str):
+        time.sleep(args.safety_latency)
+        return "LLM_GUARDRAIL" if args.safety_route == "llm" else "NO_GUARDRAIL"
+
+    mcp_tool_registry.afetch_access_token = fake_access_token
+    module.tool_registry = mcp_tool_registry.MCPToolRegistry(gateway_url=mcp_url)
+    module.check_query_safety = check_query_safety
+    module.store = SlowStore(args.memory_latency)
+    module.memory = None
+    module.checkpointer = InMemorySaver()
+    if args.write_behind:
+        module.checkpointer = TieredCheckpointSaver(module.checkpointer)
+        module.memory = MemoryGateway(module.store)
+
+    node_llms = fake_node_llms(args.llm_latency, args.tokens_per_second, args.answer_tokens, args.tool_rounds, args.verdict_latency)
+    module.chain_registry = ChainRegistry(node_llms, module.lg_parser, module.topic_class_parser, None, module.verdict_cache)
+    module.context_manager = ContextManager(summarizer=module.chain_registry.context_summarizer)
+
+    timer = NodeTimer()
+    module.app = TimedGraph(module.graph.compile(checkpointer=module.checkpointer), timer)
+    return timer
+
+
+def load_mediator(agent_url: str, concurrency: int):
+    sys.path.insert(0, BACKEND_DIR)
+    # The agent's admission settings apply to both services
+    import fastapi_mediator_service as mediator
+    from auth import get_current_user
+    from fakes import LocalAgentRuntime
+
+    mediator.app.dependency_overrides[get_current_user] = lambda: {"sub": "benchmark", "email": "benchmark@example.com"}
+    mediator.agentcore_pool = LocalAgentRuntime(agent_url, max_connections=concurrency * 2)
+    return mediator.app
+
+
+class ServerThread(threading.Thread):
+    """Runs the benchmarked servers on their own event loop, away from the load generator"""
+
+    def __init__(self, servers):
+        super().__init__(daemon=True)
+        self.servers = servers
+        self.error = None
+
+    def run(self):
+        try:
+            asyncio.run(self._serve())
+        except Exception as e:
+            self.error = e
+
+    async def _serve(self):
+        await asyncio.gather(*(server.serve() for server in self.servers))
+
+    def wait_started(self, timeout: float = 30):
+        deadline = time.monotonic() + timeout
+        while not all(server.started for server in self.servers):
+            if self.error is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"Benchmark servers failed to start: {self.error}")
+            time.sleep(0.05)
+
+    def stop(self):
+        for server in self.servers:
+            server.should_exit = True
+        self.join(timeout=10)
+
+
+def make_server(app, port: int) -> uvicorn.Server:
+    return uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+
+
+def make_requests(args):
+    """Payloads in send order, each virtual thread asks `turns` consecutive questions"""
+    payloads = []
+    for index in range(args.requests):
+        thread = index // args.turns
+        question = index % args.distinct_queries
+        payload = {
+            "prompt": f"What are the latest results on efficient attention for long context LLMs, variant {question}?",
+            "actor_id": f"bench-actor-{thread % args.actors}",
+            "thread_id": f"bench-thread-{thread}",
+            "stream_mode": args.stream_mode,
+        }
+        payloads.append(payload)
+    return payloads
+
+
+async def send(client: httpx.AsyncClient, url: str, payload: dict):
+    start = time.perf_counter()
+    ttfb = None
+    size = 0
+    async with client.stream("POST", url, json={"input": payload}) as response:
+        async for chunk in response.aiter_raw():
+            if chunk and ttfb is None:
+                ttfb = time.perf_counter() - start
+            size += len(chunk)
+        status = response.status_code
+    return {"status": status, "ttfb": ttfb, "latency": time.perf_counter() - start, "bytes": size}
+
+
+async def drive(url: str, payloads, concurrency: int):
+    """Sends the payloads with `concurrency` workers, turns of one thread stay in order"""
+    threads = {}
+    for payload in payloads:
+        threads.setdefault(payload["thread_id"], []).append(payload)
+    queue = asyncio.Queue()
+    for turns in threads.values():
+        queue.put_nowait(turns)
+
+    results = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(300, connect=5), limits=limits) as client:
+        async def worker():
+            while not queue.empty():
+                for payload in queue.get_nowait():
+                    try:
+                        results.append(await send(client, url, payload))
+                    except Exception as e:
+                        results.append({"status": None, "error": repr(e)})
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+    return results, wall
+
+
+def report(results, wall: float, timer):
+    ok = [r for r in results if r.get("status") == 200]
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(ok) / wall, 2) if wall else None,
+        "ttfb_ms": summarize([r["ttfb"] for r in ok if r["ttfb"] is not None]),
+        "latency_ms": summarize([r["latency"] for r in ok]),
+        "bytes_per_response": round(sum(r["bytes"] for r in ok) / len(ok)) if ok else 0,
+        "node_ms": {node: summarize(durations) for node, durations in sorted(timer.durations.items())},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=AGENT_DIR, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, baseline):
+    """Relative change of the headline metrics against an earlier result file"""
+    rows = [("throughput_rps", None)] + [(metric, q) for metric in ("ttfb_ms", "latency_ms") for q in ("p50", "p95", "p99")]
+    print(f"\nvs {baseline.get('commit')} ({baseline.get('timestamp')})")
+    for metric, q in rows:
+        old = baseline["results"][metric] if q is None else baseline["results"][metric].get(q)
+        new = current["results"][metric] if q is None else current["results"][metric].get(q)
+        if old and new is not None:
+            print(f"  {metric + ('.' + q if q else ''):<16} {old:>10} -> {new:>10}  ({(new - old) / old:+.1%})")
+
+
+def print_report(result):
+    res = result["results"]
+    print(f"target={result['config']['target']} concurrency={result['config']['concurrency']} "
+          f"requests={res['requests']} errors={res['errors']} wall={res['wall_seconds']}s "
+          f"throughput={res['throughput_rps']} req/s")
+    for metric in ("ttfb_ms", "latency_ms"):
+        s = res[metric]
+        if s["count"]:
+            print(f"  {metric:<11} p50={s['p50']:>9} p95={s['p95']:>9} p99={s['p99']:>9} max={s['max']:>9}")
+    print("  per node (ms):")
+    for node, s in res["node_ms"].items():
+        print(f"    {node:<22} n={s['count']:<6} mean={s['mean']:>9} p50={s['p50']:>9} p95={s['p95']:>9}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=("agent", "mediator"), default="agent", help="service /invocations is sent to")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=1, help="consecutive questions per thread")
+    parser.add_argument("--actors", type=int, default=10)
+    parser.add_argument("--distinct-queries", type=int, default=None, help="defaults to --requests (no repeats)")
+    parser.add_argument("--stream-mode", choices=("legacy", "ndjson", "sse"), default="ndjson")
+    parser.add_argument("--llm-latency", type=float, default=0.4, help="seconds to first token")
+    parser.add_argument("--verdict-latency", type=float, default=None, help="guardrail/classifier latency, defaults to --llm-latency")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--answer-tokens", type=int, default=150)
+    parser.add_argument("--tool-rounds", type=int, default=1, help="tool-loop iterations per turn")
+    parser.add_argument("--retrieval-latency", type=float, default=0.3)
+    parser.add_argument("--pdf-latency", type=float, default=0.8)
+    parser.add_argument("--payload-chars", type=int, default=8000, help="size of each tool result")
+    parser.add_argument("--safety-latency", type=float, default=0.05, help="blocking vector search time")
+    parser.add_argument("--safety-route", choices=("llm", "no"), default="llm")
+    parser.add_argument("--verdict-cache", action="store_true")
+    parser.add_argument("--memory-latency", type=float, default=0.1, help="blocking long-term memory call time")
+    parser.add_argument("--write-behind", action="store_true",
+                        help="wrap the checkpointer in TieredCheckpointSaver and the store in MemoryGateway")
+    parser.add_argument("--admission", action="store_true", help="enable admission control (429s count as errors)")
+    parser.add_argument("--port", type=int, default=18080, help="agent port, MCP and mediator use the next two")
+    parser.add_argument("--output", default=None, help="result JSON path, defaults to benchmarks/results/")
+    parser.add_argument("--compare", default=None, help="earlier result JSON to compare against")
+    args = parser.parse_args()
+    args.distinct_queries = args.distinct_queries or args.requests
+    return args
+
+
+def main():
+    args = parse_args()
+    from fakes import fake_mcp_server
+
+    agent_url = f"http://127.0.0.1:{args.port}"
+    mcp_port, mediator_port = args.port + 1, args.port + 2
+    module = load_agent_module(args)
+    timer = wire_fakes(module, args, f"http://127.0.0.1:{mcp_port}/mcp")
+
+    mcp_app = fake_mcp_server(args.retrieval_latency, args.pdf_latency, args.payload_chars).streamable_http_app()
+    servers = [make_server(mcp_app, mcp_port), make_server(module.fapi_app, args.port)]
+    url = f"{agent_url}/invocations"
+    if args.target == "mediator":
+        servers.append(make_server(load_mediator(agent_url, args.concurrency), mediator_port))
+        url = f"http://127.0.0.1:{mediator_port}/invocations"
+
+    server_thread = ServerThread(servers)
+    server_thread.start()
+    try:
+        server_thread.wait_started()
+        results, wall = asyncio.run(drive(url, make_requests(args), args.concurrency))
+    finally:
+        server_thread.stop()
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": vars(args),
+        "results": report(results, wall, timer),
+    }
+    print_report(result)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{result['commit'] or 'local'}-{int(time.time())}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Micro-benchmark: query latency of the local paper index on a synthetic corpus, BM25
+over the sqlite postings, the brute force embedding scan and the IVF lists, plus the
+recall@k of IVF against the brute force scan.
+
+    python benchmarks/bench_paper_index.py --papers 50000 --queries 200
+    python benchmarks/bench_paper_index.py --papers 200000 --lists 1024 --probes 32
+
+Papers mix Zipf distributed common words with the words of one of --topics topics,
+queries are drawn from a topic's words. Everything is embedded with the hashing
+embedder, so no network or dataset is needed. Building the corpus takes most of the run.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import paper_index
+from paper_index import PaperIndex
+
+
+def topic_words(topic: int, count: int):
+    return [f"t{topic}w{i}" for i in range(count)]
+
+
+def make_papers(count: int, vocabulary: int, topics: int, rng):
+    words = [f"w{i}" for i in range(vocabulary)]
+    for i in range(count):
+        length = rng.integers(60, 160)
+        common = [words[j] for j in np.minimum(rng.zipf(1.3, size=length // 3), vocabulary) - 1]
+        own = topic_words(rng.integers(topics), 300)
+        text = [own[j] for j in np.minimum(rng.zipf(1.1, size=length - len(common)), 300) - 1] + common
+        rng.shuffle(text)
+        yield {"arxiv_id": f"bench.{i}", "title": " ".join(text[:10]), "authors": "", "abstract": " ".join(text[10:]),
+               "categories": "cs.CL", "published": "", "pdf_url": ""}
+
+
+def timed(search, queries):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+    return np.percentile(latencies, 50), np.percentile(latencies, 95), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--lists", type=int, default=None, help="IVF lists, sqrt(papers) by default")
+    parser.add_argument("--probes", type=int, default=paper_index.PAPER_INDEX_IVF_PROBES)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    paper_index.PAPER_INDEX_IVF_MIN_DOCS = args.papers + 1  # trained below, timed separately
+    paper_index.PAPER_INDEX_IVF_PROBES = args.probes
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        index = PaperIndex(directory)
+        index.add_papers(make_papers(args.papers, args.vocabulary, args.topics, rng), embedder_name="hashing")
+        print(f"ingest           : {time.perf_counter() - start:.1f} s for {index.count} papers")
+        start = time.perf_counter()
+        index.build_ivf(args.lists)
+        index.reload()
+        print(f"ivf training     : {time.perf_counter() - start:.1f} s, {len(index.ivf[0])} lists, {args.probes} probes")
+
+        queries = [" ".join(rng.choice(topic_words(rng.integers(args.topics), 30), size=rng.integers(2, 6)))
+                   for _ in range(args.queries)]
+        ivf = index.ivf
+        p50, p95, _ = timed(lambda q: index.bm25(q), queries)
+        print(f"bm25             : p50 {p50:.2f} ms  p95 {p95:.2f} ms")
+        index.ivf = None
+        p50, p95, exact = timed(lambda q: index.dense(q, args.k), queries)
+        print(f"dense, full scan : p50 {p50:.2f} ms  p95 {p95:.2f} ms")
+        index.ivf = ivf
+        p50, p95, approx = timed(lambda q: index.dense(q, args.k), queries)
+        recall = np.mean([len({d for d, _ in a} & {d for d, _ in e}) / max(1, len(e)) for a, e in zip(approx, exact)])
+        print(f"dense, ivf       : p50 {p50:.2f} ms  p95 {p95:.2f} ms  recall@{args.k} {recall:.3f}")
+        p50, p95, _ = timed(lambda q: index.search(q, 5), queries)
+        print(f"hybrid search    : p50 {p50:.2f} ms  p95 {p95:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Offline stand-ins used by the end-to-end benchmark: a chat model with configurable
+latency and token rate, a local MCP server with the research tools, and a relay that
+lets the mediator call a local agent server instead of the AgentCore runtime.
+"""
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langgraph.store.memory import InMemoryStore
+from mcp.server.fastmcp import FastMCP
+
+RETRIEVAL_TOOL = "get_retrievals"
+PDF_TOOL = "extract_text_from_pdf_url_pymupdf"
+
+# Structured replies of the JSON-producing nodes, parsed by their PydanticOutputParser
+ROLE_REPLIES = {
+    "llm_guardrail": json.dumps({"block": "false", "confidence": 0.95}),
+    "topic_classifier": json.dumps({"response": "", "pass_down": "true", "confidence": 0.95}),
+    "context_summarizer": "The user asked about recent LLM research and got cited answers.",
+}
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers like the real node without any network call. The reply
+    starts after `latency` seconds and its tokens arrive at `tokens_per_second`.
+    As main_tool_llm it calls a research tool for the first `tool_rounds` iterations
+    of a turn and then writes an answer of `answer_tokens` tokens.
+    """
+
+    role: str
+    latency: float = 0.3
+    tokens_per_second: float = 80.0
+    answer_tokens: int = 150
+    tool_rounds: int = 1
+    tool_names: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"tool_names": [tool.name for tool in tools]})
+
+    def _tool_for(self, suffix: str) -> Optional[str]:
+        # Gateway tool names may carry a target prefix
+        return next((name for name in self.tool_names if name.endswith(suffix)), None)
+
+    def _reply(self, messages):
+        if self.role != "main_tool_llm":
+            return ROLE_REPLIES[self.role], []
+        latest = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+        query = str(messages[latest].content)[-200:] if messages else ""
+        rounds = sum(1 for m in messages[latest:] if isinstance(m, AIMessage) and m.tool_calls)
+        if rounds < self.tool_rounds and self.tool_names:
+            if rounds % 2 == 0 or self._tool_for(PDF_TOOL) is None:
+                name, args = self._tool_for(RETRIEVAL_TOOL) or self.tool_names[0], {"query": query}
+            else:
+                name, args = self._tool_for(PDF_TOOL), {"pdf_url": f"https://arxiv.org/pdf/{abs(hash(query)) % 10000}.pdf"}
+            return "", [{"name": name, "args": args, "id": f"call_{rounds}_{time.monotonic_ns()}", "type": "tool_call"}]
+        return " ".join(f"token{i}" for i in range(self.answer_tokens)), []
+
+    def _usage(self, messages, text: str):
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        output_tokens = len(text.split())
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _duration(self, text: str) -> float:
+        return self.latency + len(text.split()) / self.tokens_per_second
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text, tool_calls = self._reply(messages)
+        time.sleep(self._duration(text))
+        message = AIMessage(content=text, tool_calls=tool_calls, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text, tool_calls = self._reply(messages)
+        await asyncio.sleep(self._duration(text))
+        message = AIMessage(content=text, tool_calls=tool_calls, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        text, tool_calls = self._reply(messages)
+        await asyncio.sleep(self.latency)
+        tokens = text.split()
+        for index, token in enumerate(tokens):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token if index == 0 else " " + token))
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="",
+            tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i, "type": "tool_call_chunk"}
+                for i, call in enumerate(tool_calls)
+            ],
+            usage_metadata=self._usage(messages, text),
+        ))
+
+
+def fake_node_llms(latency: float, tokens_per_second: float, answer_tokens: int, tool_rounds: int,
+                   verdict_latency: float = None) -> Dict[str, FakeChatModel]:
+    verdict_latency = latency if verdict_latency is None else verdict_latency
+    return {
+        "llm_guardrail": FakeChatModel(role="llm_guardrail", latency=verdict_latency, tokens_per_second=tokens_per_second),
+        "topic_classifier": FakeChatModel(role="topic_classifier", latency=verdict_latency, tokens_per_second=tokens_per_second),
+        "context_summarizer": FakeChatModel(role="context_summarizer", latency=latency, tokens_per_second=tokens_per_second),
+        "main_tool_llm": FakeChatModel(role="main_tool_llm", latency=latency, tokens_per_second=tokens_per_second,
+                                       answer_tokens=answer_tokens, tool_rounds=tool_rounds),
+    }
+
+
+def fake_mcp_server(retrieval_latency: float, pdf_latency: float, payload_chars: int) -> FastMCP:
+    """Streamable HTTP MCP server exposing the research tools with fixed latencies"""
+    server = FastMCP("fake-research-paper-server")
+
+    @server.tool(name=RETRIEVAL_TOOL)
+    async def get_retrievals(query: str, top_k: int = 5, rerank: bool = True) -> str:
+        """Retrieves relevant document chunks from a curated knowledge base of AI/LLM research papers"""
+        await asyncio.sleep(retrieval_latency)
+        chunk = ("lorem ipsum " * (payload_chars // 12 // max(top_k, 1) + 1))[: payload_chars // max(top_k, 1)]
+        return json.dumps([
+            {"title": f"Paper {i} on {query[:40]}", "authors": ["A. Author"], "pdf_url": f"https://arxiv.org/pdf/{i}.pdf",
+             "score": 1 - i / 10, "chunk": chunk}
+            for i in range(top_k)
+        ])
+
+    @server.tool(name=PDF_TOOL)
+    async def extract_text_from_pdf_url_pymupdf(pdf_url: str) -> str:
+        """Extracts full text content from PDF papers"""
+        await asyncio.sleep(pdf_latency)
+        return f"Full text of {pdf_url}\n" + "lorem ipsum " * (payload_chars // 12)
+
+    return server
+
+
+async def fake_access_token(timeout: float = None):
+    return "benchmark-token", 3600
+
+
+class SlowStore(InMemoryStore):
+    """InMemoryStore with a fixed blocking delay per call, like a round trip to AgentCore Memory"""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    def batch(self, ops):
+        time.sleep(self.latency)
+        return super().batch(ops)
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Collects the wall time of every graph node run from the LangGraph callbacks"""
+
+    run_inline = True
+
+    def __init__(self):
+        self.started = {}
+        self.durations = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node is not None and kwargs.get("name") == node:
+            self.started[run_id] = (node, time.perf_counter())
+
+    def _finish(self, run_id):
+        started = self.started.pop(run_id, None)
+        if started is not None:
+            node, start = started
+            self.durations.setdefault(node, []).append(time.perf_counter() - start)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+
+class TimedGraph:
+    """Proxy of the compiled graph that attaches the NodeTimer to every streamed run"""
+
+    def __init__(self, graph_app, timer: NodeTimer):
+        self._graph_app = graph_app
+        self._timer = timer
+
+    def astream(self, inputs, config=None, **kwargs):
+        config = dict(config or {})
+        config["callbacks"] = list(config.get("callbacks") or []) + [self._timer]
+        return self._graph_app.astream(inputs, config, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._graph_app, name)
+
+
+class _RelayBody:
+    """Iterates like the AgentCore streaming body: raw byte chunks, or read() at once"""
+
+    def __init__(self, response: httpx.Response):
+        self._response = response
+
+    def __aiter__(self):
+        return self._response.aiter_raw()
+
+    async def read(self) -> bytes:
+        return await self._response.aread()
+
+
+class LocalAgentRuntime:
+    """Drop-in for the mediator's AgentCorePool that forwards to a local agent server"""
+
+    def __init__(self, agent_url: str, max_connections: int = 100):
+        self.agent_url = agent_url
+        self.max_connections = max_connections
+        self.client = None
+
+    async def start(self):
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(300, connect=5),
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+        )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+        self.client = None
+
+    @asynccontextmanager
+    async def invoke(self, input_payload: Dict[str, Any]):
+        async with self.client.stream("POST", f"{self.agent_url}/invocations", json={"input": input_payload}) as response:
+            yield {"response": _RelayBody(response), "statusCode": response.status_code}
+
+    def stats(self):
+        return {"relay": self.agent_url}
@@ -0,0 +1,86 @@
+import logging
+import threading
+
+from langchain_core.messages import SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langgraph.constants import TAG_NOSTREAM
+
+from prompts import LLM_GUARDRAIL_PROMPT, TOPIC_CLASSIFIER_PROMPT, MAIN_TOOL_PROMPT, CONTEXT_SUMMARY_PROMPT
+from model_tiers import Cascade
+from verdict_cache import VerdictCachedChain
+from metrics import role_tag
+
+logger = logging.getLogger(__name__)
+
+
+def tagged(chain, role: str):
+    """Marks the chain's runs with its LLM role for the metrics callbacks"""
+    return chain.with_config(tags=[role_tag(role)])
+
+
+def build_prompt(system_prompt: str) -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages([
+        SystemMessage(content=system_prompt),
+        MessagesPlaceholder(variable_name="messages")
+    ])
+
+
+class ChainRegistry:
+    """
+    Builds every chain of the graph once. The tool-bound main chain is only rebuilt when
+    the MCP tool set version changes, so bind_tools no longer converts every tool schema
+    on each tool-loop iteration. Chains are immutable runnables and are shared by all
+    concurrent sessions.
+    node_llms maps each LLM role to its model. With a cascade_llm the guardrail and the
+    classifier try the cheap model first and escalate to their own model when needed.
+    With a verdict_cache their verdicts are reused for repeated queries in the same context.
+    """
+
+    def __init__(self, node_llms, lg_parser, topic_class_parser, cascade_llm=None, verdict_cache=None):
+        self.main_llm = node_llms["main_tool_llm"]
+        self.main_prompt = build_prompt(MAIN_TOOL_PROMPT)
+        lg_prompt = build_prompt(LLM_GUARDRAIL_PROMPT)
+        tc_prompt = build_prompt(TOPIC_CLASSIFIER_PROMPT)
+        self.llm_guardrail = tagged(lg_prompt | node_llms["llm_guardrail"] | lg_parser, "llm_guardrail")
+        self.topic_classifier = tagged(tc_prompt | node_llms["topic_classifier"] | topic_class_parser, "topic_classifier")
+        # Runs inside main_tool_llm, nostream keeps the summary out of the messages stream
+        self.context_summarizer = tagged(
+            build_prompt(CONTEXT_SUMMARY_PROMPT) | node_llms["context_summarizer"] | StrOutputParser(), "context_summarizer"
+        ).with_config(tags=[TAG_NOSTREAM])
+        self.cascades = {}
+        if cascade_llm is not None:
+            # Blocks are always confirmed by the strong model, direct answers are written by it
+            self.llm_guardrail = self.cascades["llm_guardrail"] = Cascade(
+                "llm_guardrail", tagged(lg_prompt | cascade_llm | lg_parser, "llm_guardrail"), self.llm_guardrail,
+                should_escalate=lambda verdict: verdict.block != "false",
+            )
+            self.topic_classifier = self.cascades["topic_classifier"] = Cascade(
+                "topic_classifier", tagged(tc_prompt | cascade_llm | topic_class_parser, "topic_classifier"), self.topic_classifier,
+                should_escalate=lambda verdict: verdict.pass_down == "false",
+            )
+        if verdict_cache is not None:
+            # Blocks get the shorter TTL, so a wrongly blocked query recovers quickly
+            self.llm_guardrail = VerdictCachedChain(
+                "llm_guardrail", LLM_GUARDRAIL_PROMPT, self.llm_guardrail, verdict_cache,
+                is_block=lambda verdict: verdict.block != "false",
+            )
+            self.topic_classifier = VerdictCachedChain(
+                "topic_classifier", TOPIC_CLASSIFIER_PROMPT, self.topic_classifier, verdict_cache,
+                is_block=lambda verdict: verdict.pass_down == "false",
+            )
+        self._tool_chain = (None, None)
+        self._lock = threading.Lock()
+
+    def main_tool_chain(self, tools, version):
+        """Main prompt piped into the LLM bound to tools, cached per tool set version"""
+        cached_version, chain = self._tool_chain
+        if chain is not None and cached_version == version:
+            return chain
+        with self._lock:
+            cached_version, chain = self._tool_chain
+            if chain is None or cached_version != version:
+                chain = tagged(self.main_prompt | self.main_llm.bind_tools(tools or []), "main_tool_llm")
+                self._tool_chain = (version, chain)
+                logger.info(f"Main tool chain rebuilt for tool set version {version}")
+            return chain
@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+
+from langchain_core.messages import HumanMessage, AnyMessage
+
+from memory_prefix import add_memory_prefix
+
+logger = logging.getLogger(__name__)
+
+# Token budget of the message history sent to each LLM node
+DEFAULT_CONTEXT_BUDGETS = {
+    "llm_guardrail": 4000,
+    "no_guardrail": 8000,
+    "main_tool_llm": 48000,
+}
+CONTEXT_DEFAULT_BUDGET = int(os.getenv("CONTEXT_DEFAULT_BUDGET", "16000"))
+# When summarizing, fold older turns until the rest fits in this share of the budget,
+# so the summary is not updated again on the very next call
+CONTEXT_TARGET_RATIO = float(os.getenv("CONTEXT_TARGET_RATIO", "0.6"))
+CHARS_PER_TOKEN = 4
+# Each folded message is cut to this many characters before it is sent to the summarizer
+SUMMARY_MESSAGE_CHARS = int(os.getenv("SUMMARY_MESSAGE_CHARS", "4000"))
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def load_context_budgets():
+    """DEFAULT_CONTEXT_BUDGETS, overridden by the CONTEXT_BUDGETS env var (JSON object)"""
+    budgets = dict(DEFAULT_CONTEXT_BUDGETS)
+    raw = os.getenv("CONTEXT_BUDGETS")
+    if raw:
+        try:
+            budgets.update({k: int(v) for k, v in json.loads(raw).items()})
+        except Exception as e:
+            logger.info(f"Ignoring invalid CONTEXT_BUDGETS: {e}")
+    return budgets
+
+
+def estimate_tokens(message: AnyMessage) -> int:
+    """Cheap token estimate, good enough for budgeting without a tokenizer round-trip"""
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        content += json.dumps(tool_calls, default=str)
+    return len(content) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def split_turns(messages: list[AnyMessage]) -> list[list[AnyMessage]]:
+    """
+    Group messages into turns, each starting at a HumanMessage. A turn holds the AI
+    tool calls together with their ToolMessages, so trimming at turn boundaries never
+    separates a tool call from its result.
+    """
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+def fit_turns(turns: list[list[AnyMessage]], budget: int) -> int:
+    """Index of the first turn to keep so the newest turns fit the budget. The last turn is always kept"""
+    used = 0
+    for index in range(len(turns) - 1, -1, -1):
+        used += sum(estimate_tokens(m) for m in turns[index])
+        if used > budget and index < len(turns) - 1:
+            return index + 1
+    return 0
+
+
+def summary_message(summary: str) -> HumanMessage:
+    return HumanMessage(content=f"Summary of the earlier conversation:\n{summary}")
+
+
+def with_memory_context(messages: list[AnyMessage], memory_context: str) -> list[AnyMessage]:
+    """Copy of messages whose latest HumanMessage is prefixed with the retrieved long-term memory"""
+    if not memory_context:
+        return messages
+    for index in range(len(messages) - 1, -1, -1):
+        message = messages[index]
+        if isinstance(message, HumanMessage) and isinstance(message.content, str):
+            augmented = message.model_copy(update={"content": add_memory_prefix(message.content, memory_context)})
+            return messages[:index] + [augmented] + messages[index + 1:]
+    return messages
+
+
+def transcript(messages: list[AnyMessage]) -> str:
+    """Plain text transcript for the summarizer, tool payloads cut to SUMMARY_MESSAGE_CHARS"""
+    lines = []
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+        lines.append(f"{message.type}: {content[:SUMMARY_MESSAGE_CHARS]}")
+    return "\n\n".join(lines)
+
+
+class ContextManager:
+    """
+    Stage placed before each LLM call. Messages already folded into the rolling summary
+    (the first summarized_count messages) are replaced by the summary, and the remaining
+    turns are trimmed to the node's token budget. Nodes that may summarize fold the turns
+    which no longer fit into the summary, the new summary is returned as a state update
+    so it is stored in the checkpoint.
+    """
+
+    def __init__(self, summarizer=None, budgets: dict = None, default_budget: int = CONTEXT_DEFAULT_BUDGET):
+        self.summarizer = summarizer
+        self.budgets = load_context_budgets() if budgets is None else budgets
+        self.default_budget = default_budget
+
+    def budget_for(self, node: str) -> int:
+        return self.budgets.get(node, self.default_budget)
+
+    def window(self, messages, summary: str, summarized_count: int, node: str, memory_context: str = ""):
+        turns = split_turns(messages[summarized_count:])
+        kept = [m for turn in turns[fit_turns(turns, self.budget_for(node)):] for m in turn]
+        # Retrieved memory only exists in the prompt, it is never written to the message log
+        return ([summary_message(summary)] if summary else []) + with_memory_context(kept, memory_context)
+
+    async def prepare(self, state, node: str, summarize: bool = False, memory_context: str = ""):
+        """Returns (messages to send to the LLM, state update for the summary channels)"""
+        messages = state["messages"]
+        summary = state.get("summary") or ""
+        summarized_count = state.get("summarized_count") or 0
+        update = {}
+
+        budget = self.budget_for(node)
+        turns = split_turns(messages[summarized_count:])
+        if summarize and self.summarizer is not None and fit_turns(turns, budget) > 0:
+            cut = fit_turns(turns, int(budget * CONTEXT_TARGET_RATIO))
+            folded = [m for turn in turns[:cut] for m in turn]
+            try:
+                summary = await self.summarizer.ainvoke({"messages": [HumanMessage(
+                    content=f"Current summary:\n{summary or '(empty)'}\n\nOlder messages:\n{transcript(folded)}"
+                )]})
+                summarized_count += len(folded)
+                update = {"summary": summary, "summarized_count": summarized_count}
+                logger.info(f"Folded {len(folded)} messages into the conversation summary for {node}")
+            except Exception as e:
+                logger.info(f"Summarizing older turns failed, trimming only: {e}")
+
+        return self.window(messages, summary, summarized_count, node, memory_context), update
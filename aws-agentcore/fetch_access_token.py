@@ -1,20 +1,37 @@
 import requests
+import httpx
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
-def fetch_access_token():
+def _token_request_data():
     client_id = os.getenv("CLIENT_ID")
     client_secret = os.getenv("CLIENT_SECRET")
+    return "grant_type=client_credentials&client_id={client_id}&client_secret={client_secret}".format(client_id=client_id, client_secret=client_secret)
+
+def fetch_access_token():
     token_url = os.getenv("TOKEN_URL")
     response = requests.post(
         token_url,
-        data="grant_type=client_credentials&client_id={client_id}&client_secret={client_secret}".format(client_id=client_id, client_secret=client_secret),
+        data=_token_request_data(),
         headers={'Content-Type': 'application/x-www-form-urlencoded'}
     )
     expires_in = response.json()['expires_in']
     access_token = response.json()['access_token']
     return access_token, expires_in
 
+async def afetch_access_token(timeout: float = 10):
+    """Async version of fetch_access_token, safe to call from the event loop"""
+    token_url = os.getenv("TOKEN_URL")
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        response = await client.post(
+            token_url,
+            content=_token_request_data(),
+            headers={'Content-Type': 'application/x-www-form-urlencoded'}
+        )
+    expires_in = response.json()['expires_in']
+    access_token = response.json()['access_token']
+    return access_token, expires_in
+
 if __name__ == "__main__":
-    print(fetch_access_token())
\ No newline at end of file
+    print(fetch_access_token())
@@ -0,0 +1,242 @@
+"""
+Local semantic guardrail index.
+
+The guardrail corpus is embedded offline into a normalized float32 matrix which is
+memory-mapped at startup, so a safety check is one query embedding plus a matrix product.
+
+Build the index with:
+    python guardrail_index.py build --corpus corpus.jsonl --out guardrail_index --embedder openai
+The corpus is either a .jsonl file with a "text" field per line or a plain text file with
+one entry per line.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+GUARDRAIL_INDEX_DIR = os.getenv("GUARDRAIL_INDEX_DIR")
+# Cosine similarity a query needs with its nearest corpus entry to match. This is not on the
+# scale of the vector store scores behind GUARDRAIL_SCORE_THRESHOLD, so it has its own setting:
+# unset, the threshold given at build time or the embedder's default below is used
+GUARDRAIL_INDEX_THRESHOLD = os.getenv("GUARDRAIL_INDEX_THRESHOLD")
+INDEX_THRESHOLD_DEFAULTS = {"openai": 0.5, "hashing": 0.35}
+GUARDRAIL_EMBEDDING_MODEL = os.getenv("GUARDRAIL_EMBEDDING_MODEL", "text-embedding-3-small")
+# Query embeddings kept in memory, a repeated query skips the embeddings API call
+GUARDRAIL_QUERY_CACHE_SIZE = int(os.getenv("GUARDRAIL_QUERY_CACHE_SIZE", "2048"))
+
+EMBEDDINGS_FILE = "embeddings.npy"
+META_FILE = "meta.json"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class OpenAIEmbedder:
+    """Embeds texts with the OpenAI embeddings API"""
+
+    name = "openai"
+
+    def __init__(self, model: str = GUARDRAIL_EMBEDDING_MODEL, client=None):
+        self.model = model
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI()
+        return self._client
+
+    def embed(self, texts) -> np.ndarray:
+        response = self.client.embeddings.create(model=self.model, input=list(texts))
+        return normalize_rows([item.embedding for item in response.data])
+
+
+class HashingEmbedder:
+    """
+    Dependency free local embedder: signed feature hashing of word unigrams and bigrams.
+    Much weaker than a learned model, but needs no network and is deterministic.
+    """
+
+    name = "hashing"
+
+    def __init__(self, model: str = "1024"):
+        self.model = str(model)
+        self.dim = int(self.model)
+
+    def _features(self, text: str):
+        tokens = _TOKEN_RE.findall(text.lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts) -> np.ndarray:
+        texts = list(texts)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                matrix[row, digest % self.dim] += 1.0 if (digest >> 63) & 1 else -1.0
+        return normalize_rows(matrix)
+
+
+EMBEDDERS = {
+    OpenAIEmbedder.name: OpenAIEmbedder,
+    HashingEmbedder.name: HashingEmbedder,
+}
+
+
+def get_embedder(name: str, model: str = None, **kwargs):
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown embedder {name}, expected one of {list(EMBEDDERS)}")
+    if model is None:
+        return EMBEDDERS[name](**kwargs)
+    return EMBEDDERS[name](model=model, **kwargs)
+
+
+class GuardrailIndex:
+    """Memory-mapped matrix of normalized corpus embeddings with cosine top-k search"""
+
+    def __init__(self, embeddings: np.ndarray, texts, embedder, threshold: float = None,
+                 query_cache_size: int = GUARDRAIL_QUERY_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.texts = texts
+        self.embedder = embedder
+        self.threshold = INDEX_THRESHOLD_DEFAULTS[embedder.name] if threshold is None else threshold
+        self.query_cache_size = query_cache_size
+        self._query_vectors = OrderedDict()  # normalized query -> embedding row
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0}
+
+    @classmethod
+    def load(cls, directory: str, threshold: float = None, openai_client=None):
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+        # An index built with the OpenAI embedder reuses the application's client
+        embedder_kwargs = {"client": openai_client} if meta["embedder"] == OpenAIEmbedder.name and openai_client is not None else {}
+        embedder = get_embedder(meta["embedder"], meta.get("model"), **embedder_kwargs)
+        if threshold is None and GUARDRAIL_INDEX_THRESHOLD:
+            threshold = float(GUARDRAIL_INDEX_THRESHOLD)
+        if threshold is None:
+            threshold = meta.get("threshold")
+        index = cls(embeddings, meta.get("texts", []), embedder, threshold)
+        logger.info(f"Loaded guardrail index with {embeddings.shape[0]} entries from {directory}, threshold {index.threshold}")
+        return index
+
+    def search_vectors(self, query_vectors: np.ndarray, k: int = 5):
+        """Batched cosine top-k. Returns (scores, indices), both shaped (n_queries, k)"""
+        query_vectors = normalize_rows(np.atleast_2d(query_vectors))
+        scores = query_vectors @ self.embeddings.T
+        k = min(k, scores.shape[1])
+        if k == 0:
+            empty = np.zeros((scores.shape[0], 0))
+            return empty, empty.astype(np.int64)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top_scores, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+    def query_vector(self, query: str) -> np.ndarray:
+        """Embedding of one query, served from the LRU when the same query was seen before"""
+        key = " ".join(query.lower().split())
+        with self._lock:
+            vector = self._query_vectors.get(key)
+            if vector is not None:
+                self._query_vectors.move_to_end(key)
+                self.counters["hits"] += 1
+                return vector
+            self.counters["misses"] += 1
+        vector = self.embedder.embed([query])
+        with self._lock:
+            self._query_vectors[key] = vector
+            while len(self._query_vectors) > self.query_cache_size:
+                self._query_vectors.popitem(last=False)
+        return vector
+
+    def stats(self):
+        return {**self.counters, "entries": int(self.embeddings.shape[0]), "cached_queries": len(self._query_vectors)}
+
+    def search(self, queries, k: int = 5):
+        return self.search_vectors(self.embedder.embed(queries), k)
+
+    def matches(self, query_vector: np.ndarray, k: int = 5):
+        """Scores above the threshold for a single query embedding"""
+        scores, _ = self.search_vectors(query_vector, k)
+        return [float(score) for score in scores[0] if score > self.threshold]
+
+
+def load_guardrail_index(directory: str = GUARDRAIL_INDEX_DIR, openai_client=None):
+    """Load the index once at startup, None when it is not configured or fails to load"""
+    if not directory:
+        return None
+    try:
+        return GuardrailIndex.load(directory, openai_client=openai_client)
+    except Exception as e:
+        logger.info(f"Failed to load guardrail index from {directory}: {e}")
+        return None
+
+
+def read_corpus(path: str):
+    texts = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                texts.append(json.loads(line)["text"])
+            else:
+                texts.append(line)
+    return texts
+
+
+def build_index(corpus_path: str, out_dir: str, embedder_name: str = "openai", model: str = None, batch_size: int = 256,
+                threshold: float = None):
+    texts = read_corpus(corpus_path)
+    embedder = get_embedder(embedder_name, model)
+    batches = [embedder.embed(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+    embeddings = np.vstack(batches) if batches else np.zeros((0, 1), dtype=np.float32)
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, EMBEDDINGS_FILE), embeddings.astype(np.float32))
+    with open(os.path.join(out_dir, META_FILE), "w") as f:
+        json.dump({
+            "embedder": embedder.name,
+            "model": embedder.model,
+            "dim": int(embeddings.shape[1]),
+            "count": len(texts),
+            "texts": texts,
+            **({"threshold": threshold} if threshold is not None else {}),
+        }, f)
+    return embeddings.shape
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Guardrail index tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Embed a guardrail corpus into a local index")
+    build.add_argument("--corpus", required=True)
+    build.add_argument("--out", required=True)
+    build.add_argument("--embedder", default="openai", choices=list(EMBEDDERS))
+    build.add_argument("--model", default=None)
+    build.add_argument("--batch-size", type=int, default=256)
+    build.add_argument("--threshold", type=float, default=None,
+                       help="match threshold stored with the index, the embedder's default otherwise")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        shape = build_index(args.corpus, args.out, args.embedder, args.model, args.batch_size, args.threshold)
+        print(f"Guardrail index written to {args.out}: {shape[0]} entries, dim {shape[1]}")
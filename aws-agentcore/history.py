@@ -0,0 +1,73 @@
+import hashlib
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from memory_prefix import strip_memory_prefix
+from stream_frames import message_text
+
+HISTORY_DEFAULT_LIMIT = 20
+HISTORY_MAX_LIMIT = 100
+
+
+def project_message(message, include_tools: bool = False):
+    """Compact {id, role, text} view of a message, None when it has nothing to show"""
+    if isinstance(message, HumanMessage):
+        return {"id": message.id, "role": "user", "text": strip_memory_prefix(message_text(message.content))}
+    if isinstance(message, AIMessage):
+        item = {"id": message.id, "role": "assistant", "text": message_text(message.content)}
+        if include_tools and message.tool_calls:
+            item["tool_calls"] = [{"id": c["id"], "name": c["name"], "args": c["args"]} for c in message.tool_calls]
+        elif not item["text"]:
+            return None
+        return item
+    if isinstance(message, ToolMessage) and include_tools:
+        return {
+            "id": message.id,
+            "role": "tool",
+            "name": message.name,
+            "tool_call_id": message.tool_call_id,
+            "text": message_text(message.content),
+        }
+    return None
+
+
+def history_etag(checkpoint_id, cursor, limit, include_tools) -> str:
+    raw = f"{checkpoint_id}|{cursor}|{limit}|{include_tools}"
+    return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+
+def paginate(messages, cursor=None, limit: int = HISTORY_DEFAULT_LIMIT, include_tools: bool = False):
+    """
+    Newest first page of projected messages. cursor is the id of the last message of the
+    previous page, the page holds the messages older than it.
+    """
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+    ordered = list(reversed(messages))
+    start = 0
+    if cursor:
+        start = next((i + 1 for i, m in enumerate(ordered) if m.id == cursor), len(ordered))
+
+    items = []
+    index = start
+    while index < len(ordered) and len(items) < limit:
+        item = project_message(ordered[index], include_tools)
+        if item is not None:
+            items.append(item)
+        index += 1
+    has_more = any(project_message(m, include_tools) is not None for m in ordered[index:])
+    return {
+        "messages": items,
+        "next_cursor": items[-1]["id"] if items and has_more else None,
+    }
+
+
+async def history_page(graph_app, actor_id: str, thread_id: str, cursor=None, limit: int = HISTORY_DEFAULT_LIMIT,
+                       include_tools: bool = False, if_none_match: str = None):
+    """Returns (etag, page). page is None when if_none_match matches the current etag"""
+    config = {"configurable": {"thread_id": thread_id, "actor_id": actor_id}}
+    state = await graph_app.aget_state(config)
+    checkpoint_id = (state.config or {}).get("configurable", {}).get("checkpoint_id")
+    etag = history_etag(checkpoint_id, cursor, limit, include_tools)
+    if if_none_match and if_none_match == etag:
+        return etag, None
+    return etag, paginate(state.values.get("messages", []), cursor, limit, include_tools)
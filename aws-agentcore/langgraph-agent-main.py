@@ -1,5 +1,5 @@
 from langgraph.graph import StateGraph, START, END
-from typing import TypedDict, Dict, Literal
+from typing import TypedDict, Dict, Literal, Optional
 import asyncio
 import os
 import uuid
@@ -12,10 +12,26 @@ from pydantic import BaseModel, Field
 from prompts import LLM_GUARDRAIL_PROMPT, TOPIC_CLASSIFIER_PROMPT, MAIN_TOOL_PROMPT
 from langgraph_checkpoint_aws import AgentCoreMemorySaver, AgentCoreMemoryStore
 from langgraph.graph.message import add_messages
-from datetime import datetime, timedelta
-
-from langchain_mcp_adapters.client import MultiServerMCPClient
-from fetch_access_token import fetch_access_token
+from langgraph.config import get_stream_writer
+
+from tool_executor import execute_tool_calls
+from tool_output_compactor import compact_tool_messages, tool_output_compactor, BUILTIN_TOOLS
+from paper_index import PAPER_TOOLS
+from tool_cache import tool_cache, tool_calls_inflight
+from mcp_tool_registry import tool_registry, MCPToolsUnavailable, MCP_REFRESH_RETRY_SECONDS
+from chain_registry import ChainRegistry
+from model_tiers import make_chat_model, CASCADE_ENABLED
+from verdict_cache import verdict_cache
+from context_window import ContextManager
+from tiered_checkpointer import TieredCheckpointSaver
+from memory_gateway import MemoryGateway
+from history import history_page, HISTORY_DEFAULT_LIMIT
+from semantic_cache import answer_cache
+from guardrail_index import load_guardrail_index
+from async_io import run_blocking, enable_loop_block_detection, shutdown_io_executor
+from stream_frames import agent_frames, encode_frame, message_text, STREAM_MODE_LEGACY, STREAM_MODES, MEDIA_TYPES
+from metrics import RunMetrics, cache_ratios, instrument_stream, render_metrics
+from admission import controller_from_env, admitted_stream, AdmissionRejected
 
 from typing import Annotated
 from openai import OpenAI
@@ -35,18 +51,15 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 load_dotenv()
 
+# Model and temperature per LLM role, see model_tiers.NODE_MODEL_DEFAULTS. Gemini is required,
+# so these are built outside the OpenAI block below and fail the import when misconfigured
+node_llms = {node: make_chat_model(node) for node in ("llm_guardrail", "topic_classifier", "main_tool_llm", "context_summarizer")}
+cascade_llm = make_chat_model("cascade") if CASCADE_ENABLED else None
+
+# Only needed for the hosted vector store guardrail or the openai embedder of the local index
+client = None
 try:
     client = OpenAI()
-    gemini_chat = ChatGoogleGenerativeAI(
-        api_key=os.getenv("GEMINI_API_KEY"),
-        model="gemini-2.5-pro",
-        temperature=0.7
-    )
-    gemini = ChatGoogleGenerativeAI(
-        api_key=os.getenv("GEMINI_API_KEY"),
-        model="gemini-2.5-pro",
-        temperature=0.7
-    )
 except Exception as e:
     logger.info(f"Failed to initialize client: {e}")
 
@@ -56,35 +69,16 @@ except Exception as e:
 
 
 
-# Global MCP tools storage (add this before your nodes)
-mcp_tools_cache = {"tools": None, "expiry_time": None}
+# In-process tools bound next to the MCP tools: chunk reader for compacted outputs and,
+# when PAPER_INDEX_DIR is set, the local paper search (remote tools remain the fallback)
+LOCAL_TOOLS = BUILTIN_TOOLS + PAPER_TOOLS
+LOCAL_TOOLS_BY_NAME = {local_tool.name: local_tool for local_tool in LOCAL_TOOLS}
 
+# MCP tools are owned by the registry: persistent session, single-flight and background refresh
 async def get_or_initialize_mcp_tools():
-    """Initialize MCP tools once and cache them"""
-    if mcp_tools_cache["tools"] is None or mcp_tools_cache["expiry_time"] < datetime.now():
+    """Current MCP tools, refreshed ahead of token expiry by the tool registry"""
+    return await tool_registry.get_tools()
 
-        try:
-            access_token, expires_in = fetch_access_token()
-            client = MultiServerMCPClient({
-                "research-paper-server": {
-                    "transport": "http",
-                    "url": os.getenv("GATEWAY_URL"),
-                    "headers": {
-                        "Authorization": f"Bearer {access_token}"
-                    }
-                }
-            })
-
-            # This gets ALL tools from that server automatically
-            tools = await client.get_tools()  
-            mcp_tools_cache["tools"] = tools
-            mcp_tools_cache["expiry_time"] = datetime.now() + timedelta(seconds=expires_in)
-            logger.info("MCP tools initialized successfully")
-        
-        except Exception as e:
-            logger.info(f"Failed to initialize MCP tools: {e}")
-    
-    return mcp_tools_cache["tools"]
 
 
 
@@ -94,17 +88,26 @@ async def get_or_initialize_mcp_tools():
 
 
 
+# Local guardrail index, loaded once at startup when GUARDRAIL_INDEX_DIR is set
+guardrail_index = load_guardrail_index(openai_client=client)
+# Score an OpenAI vector store result needs to match, the local index has GUARDRAIL_INDEX_THRESHOLD
+GUARDRAIL_SCORE_THRESHOLD = float(os.getenv("GUARDRAIL_SCORE_THRESHOLD", "0.2"))
+
 
 def check_query_safety(
     query: str,
 ) -> Literal["LLM_GUARDRAIL", "NO_GUARDRAIL"]:
     try:
-        # Search the vector store
-        results = client.vector_stores.search(
-            vector_store_id=os.getenv("VECTOR_STORE_ID"),
-            query=query,
-        )
-        matches = [i.score for i in results.data if i.score > 0.2]
+        if guardrail_index is not None:
+            # Embed the query and score it against the local memory-mapped index
+            matches = guardrail_index.matches(guardrail_index.query_vector(query))
+        else:
+            # Search the vector store
+            results = client.vector_stores.search(
+                vector_store_id=os.getenv("VECTOR_STORE_ID"),
+                query=query,
+            )
+            matches = [i.score for i in results.data if i.score > GUARDRAIL_SCORE_THRESHOLD]
         logger.info(f"Matching for harmful content done. Following matches found: {matches}")
         if not matches:
             return "LLM_GUARDRAIL"
@@ -115,6 +118,15 @@ def check_query_safety(
         return "NO_GUARDRAIL"
 
 
+async def acheck_query_safety(query: str) -> Literal["LLM_GUARDRAIL", "NO_GUARDRAIL"]:
+    """Runs check_query_safety on the IO thread pool so the event loop keeps serving other streams"""
+    try:
+        return await run_blocking("safety_check", check_query_safety, query)
+    except Exception as e:
+        logger.error(f"Error during safety check: {e}")
+        return "NO_GUARDRAIL"
+
+
 class MyAgentState(TypedDict):
     messages: Annotated[list[AnyMessage], add_messages]
     user_input: str
@@ -124,18 +136,48 @@ class MyAgentState(TypedDict):
     response: str
     pass_down: str
     block: str
+    # Rolling summary of the messages[:summarized_count] that left the context window
+    summary: str
+    summarized_count: int
 
 class TopicClassifier(BaseModel):
     response: str = Field(description="Response to the user's query")
     pass_down: str = Field(description="Pass down to the research agent, either true or false")
+    confidence: Optional[float] = Field(default=None, description="How sure the model is of the decision, 0 to 1")
 class LGParser(BaseModel):
     block: str = Field(description="Block the user's query, either true or false")
+    confidence: Optional[float] = Field(default=None, description="How sure the model is of the decision, 0 to 1")
 
 topic_class_parser = PydanticOutputParser(pydantic_object=TopicClassifier)
 lg_parser = PydanticOutputParser(pydantic_object=LGParser)
 checkpointer = AgentCoreMemorySaver(os.getenv("MEMORY_ID"), region_name=os.getenv("AWS_REGION_NAME"))
+if os.getenv("CHECKPOINT_WRITE_BEHIND", "false").lower() == "true":
+    # Recent checkpoints served from memory, flushed to AgentCore Memory in the background
+    checkpointer = TieredCheckpointSaver(checkpointer)
 
 store = AgentCoreMemoryStore(memory_id=os.getenv("MEMORY_ID"), region_name=os.getenv("AWS_REGION_NAME"))
+# Memory writes queued and flushed in batches, recent searches cached per actor
+memory = MemoryGateway(store) if os.getenv("MEMORY_WRITE_BEHIND", "true").lower() == "true" else None
+# Streams running at once in this container, plus a short bounded queue in front of them
+admission = controller_from_env("agent", max_in_flight=32, max_queue=16)
+
+# Chains are built once and shared, the tool-bound chain follows the MCP tool set version
+chain_registry = ChainRegistry(node_llms, lg_parser, topic_class_parser, cascade_llm, verdict_cache)
+# Trims the history sent to each LLM node to its token budget
+context_manager = ContextManager(summarizer=chain_registry.context_summarizer)
+
+
+# Per-request values shared between the nodes of one run without being checkpointed. The
+# dict is created by stream_response, only scalar configurable values reach checkpoint metadata.
+TURN_CONTEXT_KEY = "turn_context"
+
+
+def turn_context(config: RunnableConfig) -> Dict:
+    return config.get("configurable", {}).get(TURN_CONTEXT_KEY, {})
+
+
+def context_window(state: MyAgentState, messages: list[AnyMessage], node: str, memory_context: str = "") -> list[AnyMessage]:
+    return context_manager.window(messages, state.get("summary") or "", state.get("summarized_count") or 0, node, memory_context)
 
 ## DEFINING THE NODES
 async def entry_node(state: MyAgentState):
@@ -145,7 +187,7 @@ async def entry_node(state: MyAgentState):
 async def semanticGuardrail(state: MyAgentState) -> Dict:
     logger.info("SEMANTIC GUARDRAIL NODE")
     latest_query = state["messages"][-1].content
-    in_type = check_query_safety(latest_query)
+    in_type = await acheck_query_safety(latest_query)
     return {
         "in_type": in_type,
         "messages": state["messages"]
@@ -154,10 +196,7 @@ async def semanticGuardrail(state: MyAgentState) -> Dict:
 
 async def llmGuardrail(state: MyAgentState) -> Dict: 
     logger.info("LLM GUARDRAIL NODE")
-    llm_guardrail_system_message = SystemMessage(content=LLM_GUARDRAIL_PROMPT)
-    lg_prompt = ChatPromptTemplate.from_messages([llm_guardrail_system_message, MessagesPlaceholder(variable_name="messages")])
-    lg_chain = lg_prompt | gemini_chat | lg_parser
-    response = await lg_chain.ainvoke({"messages": state["messages"]})
+    response = await chain_registry.llm_guardrail.ainvoke({"messages": context_window(state, state["messages"], "llm_guardrail")})
     if response.block == "false":
         return {
             "block": response.block,
@@ -170,38 +209,103 @@ async def llmGuardrail(state: MyAgentState) -> Dict:
         }
 
 
-async def noGuardrail(state: MyAgentState, config: RunnableConfig) -> Dict:
-    logger.info("NO GUARDRAIL NODE")
-    topic_classifier_system_message = SystemMessage(content=TOPIC_CLASSIFIER_PROMPT)
-    tc_prompt = ChatPromptTemplate.from_messages([topic_classifier_system_message, MessagesPlaceholder(variable_name="messages")])
-    tc_chain = tc_prompt | gemini_chat | topic_class_parser
-
-    ## Retrieving and Updating the memories
-    actor_id = config["configurable"]["actor_id"]
-    thread_id = config["configurable"]["thread_id"]
-    context = store.search(("preferences", actor_id), query=state["messages"][-1].content, limit=5)
+async def retrieve_memory_context(query: str, actor_id: str) -> str:
+    try:
+        if memory is not None:
+            context = await memory.asearch(("preferences", actor_id), query=query, limit=5)
+        else:
+            context = await run_blocking("memory_search", store.search, ("preferences", actor_id), query=query, limit=5)
+    except Exception as e:
+        logger.info(f"***** Memory retrieval failed: {e}")
+        context = None
     logger.info(f"***** Memory was retrieved: {context}")
-    context = context if context else "No Info"
-    state["messages"][-1].content = "Some Previous Info: " + context + "\n\n" + state["messages"][-1].content
+    return "\n".join(str(item.value) for item in context) if context else "No Info"
 
-    ## Putting the latest query into the memory
-    store.put((actor_id, thread_id), str(uuid.uuid4()), {"message": state["messages"][-1]})
-    logger.info("***** Human latest message was uploaded.")
 
-    response = await tc_chain.ainvoke({"messages": state["messages"]})
+async def remember_query(message: AnyMessage, actor_id: str, thread_id: str):
+    try:
+        if memory is not None:
+            await memory.aput((actor_id, thread_id), str(uuid.uuid4()), {"message": message})
+            logger.info("***** Human latest message was queued for upload.")
+        else:
+            await run_blocking("memory_put", store.put, (actor_id, thread_id), str(uuid.uuid4()), {"message": message})
+            logger.info("***** Human latest message was uploaded.")
+    except Exception as e:
+        logger.info(f"***** Uploading the latest message failed: {e}")
+
+
+async def classify_topic(state: MyAgentState, memory_context: str) -> TopicClassifier:
+    messages = context_window(state, state["messages"], "no_guardrail", memory_context)
+    response = await chain_registry.topic_classifier.ainvoke({"messages": messages})
     logger.info(f"***** Topic Classifier Response: {response}")
+    return response
+
+
+def topic_classifier_update(response: TopicClassifier, memory_context: str, config: RunnableConfig) -> Dict:
+    # Long-term memory of this turn, read by main_tool_llm when it builds its prompt
+    turn_context(config)["memory_context"] = memory_context
     if response.pass_down == "false":
         return {
             "messages": [AIMessage(content=response.response)],
-            "pass_down": response.pass_down
+            "pass_down": response.pass_down,
         }
     else:
         return {
             "pass_down": response.pass_down,
-            "messages": state["messages"]
         }
 
 
+async def noGuardrail(state: MyAgentState, config: RunnableConfig) -> Dict:
+    logger.info("NO GUARDRAIL NODE")
+
+    ## Retrieving and Updating the memories
+    actor_id = config["configurable"]["actor_id"]
+    thread_id = config["configurable"]["thread_id"]
+    context = await retrieve_memory_context(state["messages"][-1].content, actor_id)
+
+    ## Putting the latest query into the memory
+    await remember_query(state["messages"][-1], actor_id, thread_id)
+
+    response = await classify_topic(state, context)
+    return topic_classifier_update(response, context, config)
+
+
+async def speculativeGuardrail(state: MyAgentState, config: RunnableConfig) -> Dict:
+    """
+    Speculative replacement for semantic_guardrail -> (llm_guardrail, no_guardrail).
+    Memory retrieval and topic classification start right away, next to the guardrails,
+    for the latest message. Their result is only committed (memory write, state
+    update) once the guardrails let the query through, a block cancels them.
+    """
+    logger.info("SPECULATIVE GUARDRAIL NODE")
+    actor_id = config["configurable"]["actor_id"]
+    thread_id = config["configurable"]["thread_id"]
+    latest = state["messages"][-1]
+
+    async def speculate():
+        context = await retrieve_memory_context(latest.content, actor_id)
+        response = await classify_topic(state, context)
+        return context, response
+
+    speculative = asyncio.create_task(speculate())
+    try:
+        in_type = await acheck_query_safety(latest.content)
+        if in_type == "LLM_GUARDRAIL":
+            verdict = await llmGuardrail(state)
+            if verdict["block"] != "false":
+                logger.info("Query blocked, speculative memory retrieval and classification cancelled")
+                return {"in_type": in_type, "pass_down": "false", **verdict}
+
+        context, response = await speculative
+        await remember_query(latest, actor_id, thread_id)
+        update = topic_classifier_update(response, context, config)
+        return {"in_type": in_type, "block": "false", **update}
+    finally:
+        # Awaited on every exit so a cancelled or failed speculation is never left unretrieved
+        speculative.cancel()
+        await asyncio.gather(speculative, return_exceptions=True)
+
+
 async def assembler(state: MyAgentState):
     logger.info("ASSEMBLER NODE")
     state["pass_down"] = state.get("pass_down")
@@ -213,55 +317,50 @@ async def mainToolLLM(state: MyAgentState, config: RunnableConfig):  # ADD confi
     logger.info("MAIN TOOL LLM NODE")
     # ADD THESE LINES to get MCP tools from config:
     mcp_tools = config.get("configurable", {}).get("mcp_tools", [])
-    
-    gemini_with_all_tools = gemini.bind_tools(mcp_tools)
-    
-    promptTemplate = ChatPromptTemplate.from_messages([
-        SystemMessage(content=MAIN_TOOL_PROMPT), 
-        MessagesPlaceholder(variable_name="messages")
-    ])
-    chain = promptTemplate | gemini_with_all_tools  # Use gemini_with_all_tools
-    response = await chain.ainvoke({"messages": state["messages"]})
+    mcp_tools_version = config.get("configurable", {}).get("mcp_tools_version")
+
+    # Tool-bound chain is only rebuilt when the tool set version changes
+    chain = chain_registry.main_tool_chain(mcp_tools, mcp_tools_version)
+    # Older turns that no longer fit the budget are folded into the rolling summary
+    messages, summary_update = await context_manager.prepare(
+        state, "main_tool_llm", summarize=True, memory_context=turn_context(config).get("memory_context") or ""
+    )
+    response = await chain.ainvoke({"messages": messages})
     return {
-        "messages": [response]
+        "messages": [response],
+        **summary_update
     }
 
 async def toolNode(state: MyAgentState, config: RunnableConfig):  # ADD config parameter
     logger.info("TOOL NODE")
-    # ADD THIS LINE to get MCP tools from config:
-    mcp_tools = config.get("configurable", {}).get("mcp_tools", [])
-    
-    result = []
-    for tool_call in state["messages"][-1].tool_calls:
-        tool_name = tool_call["name"]
-        
-        # Check if it's a custom tool (your existing logic)
-        if mcp_tools:
-            mcp_tool = next((t for t in mcp_tools if t.name == tool_name), None)
-            if mcp_tool:
-                observation = await mcp_tool.ainvoke(tool_call["args"])
-                result.append(ToolMessage(content=observation, tool_call_id=tool_call["id"]))
-            else:
-                result.append(ToolMessage(
-                    content=f"Tool {tool_name} not found", 
-                    tool_call_id=tool_call["id"]
-                ))
-        else:
-            result.append(ToolMessage(
-                content=f"Tool {tool_name} not found", 
-                tool_call_id=tool_call["id"]
-            ))
-    
+    # Name -> tool lookup prepared alongside the cached MCP tools
+    mcp_tools_by_name = config.get("configurable", {}).get("mcp_tools_by_name", {})
+
+    # All tool calls of the turn run concurrently, results keep the tool_call order
+    # tool_start / tool_end events reach token streaming clients through the custom stream
+    result = await execute_tool_calls(state["messages"][-1].tool_calls, mcp_tools_by_name, emit=get_stream_writer())
+
+    # Large outputs (full papers) reach the LLM as a table of contents plus the chunks
+    # most relevant to the question, read_tool_output serves the rest on demand
+    question = next((m.content for m in reversed(state["messages"]) if isinstance(m, HumanMessage)), "")
+    result = await compact_tool_messages(result, message_text(question))
+
     return {"messages": result}
 
 
 
 ## BUILDING THE GRAPH
+# Overlap the guardrails with memory retrieval and topic classification
+SPECULATIVE_EXECUTION = os.getenv("SPECULATIVE_EXECUTION", "false").lower() == "true"
+
 graph = StateGraph(MyAgentState)
 
-graph.add_node("semantic_guardrail", semanticGuardrail)
-graph.add_node("llm_guardrail", llmGuardrail)
-graph.add_node("no_guardrail", noGuardrail)
+if SPECULATIVE_EXECUTION:
+    graph.add_node("speculative_guardrail", speculativeGuardrail)
+else:
+    graph.add_node("semantic_guardrail", semanticGuardrail)
+    graph.add_node("llm_guardrail", llmGuardrail)
+    graph.add_node("no_guardrail", noGuardrail)
 graph.add_node("assembler", assembler)
 graph.add_node("main_tool_llm", mainToolLLM)
 graph.add_node("tool_node", toolNode)
@@ -291,20 +390,24 @@ def route_decision3(state: MyAgentState):
         return "END"
 
 
-# fan-out
-graph.add_edge(START, "semantic_guardrail")
-graph.add_conditional_edges(
-    "semantic_guardrail",
-    route_decision1,
-    {
-        "END": END,
-        "LLM_GUARDRAIL": "llm_guardrail",
-        "NO_GUARDRAIL": "no_guardrail",
-    },
-)
+if SPECULATIVE_EXECUTION:
+    graph.add_edge(START, "speculative_guardrail")
+    graph.add_edge("speculative_guardrail", "assembler")
+else:
+    # fan-out
+    graph.add_edge(START, "semantic_guardrail")
+    graph.add_conditional_edges(
+        "semantic_guardrail",
+        route_decision1,
+        {
+            "END": END,
+            "LLM_GUARDRAIL": "llm_guardrail",
+            "NO_GUARDRAIL": "no_guardrail",
+        },
+    )
 
-graph.add_edge("llm_guardrail", "assembler")
-graph.add_edge("no_guardrail", "assembler")
+    graph.add_edge("llm_guardrail", "assembler")
+    graph.add_edge("no_guardrail", "assembler")
 graph.add_conditional_edges(
     "assembler",
     route_decision2,
@@ -341,42 +444,159 @@ async def get_session_history(actor_id: str, thread_id: str):
     return state.values["messages"]
     
 
-async def stream_response(query: str, actor_id: str, thread_id: str):
+async def thread_has_history(config: Dict) -> bool:
+    """Follow-ups depend on earlier turns, so only a thread's first question uses the semantic cache"""
+    try:
+        state = await app.aget_state(config)
+        return bool(state.values.get("messages"))
+    except Exception as e:
+        logger.info(f"Reading the thread before the semantic cache failed: {e}")
+        return True
+
+
+async def semantic_cache_lookup(query: str, actor_id: str):
+    """Returns (query embedding, cache hit or None), both None when the cache is unavailable"""
+    try:
+        vector = await run_blocking("semantic_cache", answer_cache.embed, query)
+        return vector, answer_cache.lookup_vector(vector, actor_id)
+    except Exception as e:
+        logger.info(f"Semantic cache lookup failed: {e}")
+        return None, None
+
+
+async def stream_cached_answer(query: str, hit: Dict, config: Dict, stream_mode: str):
+    logger.info(f"Semantic cache hit ({hit['scope']}, similarity {hit['similarity']:.3f}) for: {query}")
+    answer = AIMessage(content=hit["answer"])
+    # Keep the thread history complete, main_tool_llm routes straight to END
+    await app.aupdate_state(config, {"messages": [HumanMessage(content=query), answer]}, as_node="main_tool_llm")
+    if stream_mode == STREAM_MODE_LEGACY:
+        yield f"step: semantic_cache \nContent: {answer.content_blocks}"
+        return
+    yield encode_frame({"type": "message", "node": "semantic_cache", "text": hit["answer"], "cached": True, "similarity": hit["similarity"]}, stream_mode)
+    yield encode_frame({"type": "end", "cached": True, "usage": None, "ttft_ms": None, "latency_ms": None}, stream_mode)
+
+
+async def remember_answer(vector, query: str, actor_id: str, config: Dict):
+    """Cache the final research answer of this run, guardrail blocks and direct replies are skipped"""
+    try:
+        state = await app.aget_state(config)
+        values = state.values
+        last = values.get("messages", [None])[-1]
+        if values.get("block") == "true" or values.get("pass_down") != "true":
+            return
+        if isinstance(last, AIMessage) and not last.tool_calls and last.content:
+            answer_cache.store_vector(vector, query, last.content, actor_id)
+    except Exception as e:
+        logger.info(f"Storing the answer in the semantic cache failed: {e}")
+
+
+async def stream_response(query: str, actor_id: str, thread_id: str, stream_mode: str = STREAM_MODE_LEGACY):
+
+    try:
+        mcp_tools = await get_or_initialize_mcp_tools()
+    except MCPToolsUnavailable as e:
+        logger.error(f"No MCP tools to run the agent with: {e}")
+        if stream_mode == STREAM_MODE_LEGACY:
+            raise
+        yield encode_frame({"type": "error", "message": str(e)}, stream_mode)
+        yield encode_frame({"type": "end", "usage": None, "ttft_ms": None, "latency_ms": None}, stream_mode)
+        return
+    # Node, LLM and tool-loop metrics of this run
+    run_metrics = RunMetrics()
 
-    mcp_tools = await get_or_initialize_mcp_tools()
-    
     config = {
+        "callbacks": [run_metrics],
         "configurable": {
             "thread_id": thread_id, 
             "actor_id": actor_id,
-            "mcp_tools": mcp_tools
+            "mcp_tools": (mcp_tools or []) + LOCAL_TOOLS,
+            "mcp_tools_by_name": {**tool_registry.tools_by_name, **LOCAL_TOOLS_BY_NAME},
+            "mcp_tools_version": tool_registry.version,
+            TURN_CONTEXT_KEY: {},
         }
     }
     logger.info(f"Invoking agent for following Config: \nThread ID: {thread_id}\nActor ID: {actor_id}")
 
-    # Rest of your existing main() code stays the same...
-    async for message_chunk in app.astream(
-        {"messages": [HumanMessage(content=query)]},
-        config=config,
-        stream_mode="updates",  
-    ):
-        for step, data in message_chunk.items():
-            yield f"step: {step} \nContent: {data['messages'][-1].content_blocks}"
+    # Recorded however the run ends, client disconnects and failures included
+    status = "error"
+    try:
+        # Opt-in semantic answer cache for first questions, a hit skips the whole graph
+        cache_vector = None
+        if answer_cache is not None and not await thread_has_history(config):
+            cache_vector, hit = await semantic_cache_lookup(query, actor_id)
+            # The semantic guardrail still has to pass the query, otherwise the graph runs the LLM guardrail
+            if hit is not None and await acheck_query_safety(query) == "NO_GUARDRAIL":
+                async for chunk in stream_cached_answer(query, hit, config, stream_mode):
+                    yield chunk
+                status = "cached"
+                return
+
+        if stream_mode != STREAM_MODE_LEGACY:
+            # Token level streaming as NDJSON / SSE frames
+            async for frame in agent_frames(app, {"messages": [HumanMessage(content=query)]}, config):
+                yield encode_frame(frame, stream_mode)
+        else:
+            # Rest of your existing main() code stays the same...
+            async for message_chunk in app.astream(
+                {"messages": [HumanMessage(content=query)]},
+                config=config,
+                stream_mode="updates",  
+            ):
+                for step, data in message_chunk.items():
+                    yield f"step: {step} \nContent: {data['messages'][-1].content_blocks}"
+        status = "ok"
+    except (asyncio.CancelledError, GeneratorExit):
+        status = "cancelled"
+        raise
+    finally:
+        run_metrics.finish(status)
+
+    if cache_vector is not None:
+        await remember_answer(cache_vector, query, actor_id, config)
 
 
 
 
 
 ## FASTAPI RELATED CODE
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Response
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, ORJSONResponse
 import asyncio
 
 fapi_app = FastAPI(title="Agent Server")
 
+# Hit ratio gauges, read from the caches' own counters at scrape time
+cache_ratios.add("tool_cache", tool_cache.stats)
+if verdict_cache is not None:
+    cache_ratios.add("verdict_cache", verdict_cache.stats)
+if answer_cache is not None:
+    cache_ratios.add("semantic_cache", answer_cache.stats)
+if isinstance(checkpointer, TieredCheckpointSaver):
+    cache_ratios.add("checkpointer", checkpointer.stats)
+if memory is not None:
+    cache_ratios.add("memory_search", memory.stats)
+if guardrail_index is not None:
+    cache_ratios.add("guardrail_query_embeddings", guardrail_index.stats)
+
+@fapi_app.on_event("startup")
+async def on_startup():
+    enable_loop_block_detection()
+    tool_registry.start()
+    if memory is not None:
+        memory.start()
+
+@fapi_app.on_event("shutdown")
+async def on_shutdown():
+    await tool_registry.stop()
+    if isinstance(checkpointer, TieredCheckpointSaver):
+        await checkpointer.aclose()
+    if memory is not None:
+        await memory.aclose()
+    shutdown_io_executor()
+
 class InvocationRequest(BaseModel):
     input: dict
 
@@ -386,17 +606,97 @@ async def invoke_agent(request: InvocationRequest):
         user_message = request.input.get("prompt", "")
         actor_id = request.input.get("actor_id", "")
         thread_id = request.input.get("thread_id", "")
+        stream_mode = request.input.get("stream_mode", STREAM_MODE_LEGACY)
+        if stream_mode not in STREAM_MODES:
+            raise HTTPException(status_code=400, detail=f"Unknown stream_mode {stream_mode}, expected one of {list(STREAM_MODES)}")
+        if request.input.get("action") == "history":
+            # Paginated history through AgentCore, which only forwards /invocations
+            try:
+                limit = int(request.input.get("limit", HISTORY_DEFAULT_LIMIT))
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="limit must be an integer")
+            etag, page = await history_page(
+                app, actor_id, thread_id,
+                cursor=request.input.get("cursor"),
+                limit=limit,
+                include_tools=bool(request.input.get("include_tools", False)),
+                if_none_match=request.input.get("if_none_match"),
+            )
+            return ORJSONResponse({"etag": etag, "not_modified": page is None, **(page or {})})
         if user_message == "#*HIST*#":
             return await get_session_history(actor_id, thread_id)
-        return StreamingResponse(stream_response(user_message, actor_id, thread_id))
+        try:
+            # 503 instead of a run with local tools only while no MCP tool set was ever loaded
+            await get_or_initialize_mcp_tools()
+        except MCPToolsUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(MCP_REFRESH_RETRY_SECONDS))})
+        chunks = instrument_stream(stream_response(user_message, actor_id, thread_id, stream_mode), stream_mode)
+        if admission is not None:
+            # Fast 429 when the actor or the container is saturated, the slot is held until the stream ends
+            try:
+                ticket = await admission.acquire(actor_id)
+            except AdmissionRejected as e:
+                raise HTTPException(status_code=429, detail=str(e), headers=e.headers())
+            chunks = admitted_stream(ticket, chunks)
+        if stream_mode == STREAM_MODE_LEGACY:
+            return StreamingResponse(chunks)
+        return StreamingResponse(
+            chunks,
+            media_type=MEDIA_TYPES[stream_mode],
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    except HTTPException:
+        raise
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Agent processing failed: {str(e)}")
 
+@fapi_app.get("/history")
+async def get_history(
+    actor_id: str,
+    thread_id: str,
+    cursor: Optional[str] = None,
+    limit: int = HISTORY_DEFAULT_LIMIT,
+    include_tools: bool = False,
+    if_none_match: Optional[str] = Header(default=None),
+):
+    """Newest first, cursor paginated, compact thread history with ETag support"""
+    etag, page = await history_page(app, actor_id, thread_id, cursor, limit, include_tools, if_none_match)
+    if page is None:
+        return Response(status_code=304, headers={"ETag": etag})
+    return ORJSONResponse(page, headers={"ETag": etag})
+
 @fapi_app.get("/ping")
 async def ping():
     return {"status": "healthy"}
 
+@fapi_app.get("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@fapi_app.get("/cache/stats")
+async def cache_stats():
+    stats = {"tool_cache": tool_cache.stats(), "tool_calls_inflight": tool_calls_inflight.stats(), "mcp_tools": tool_registry.stats()}
+    if answer_cache is not None:
+        stats["semantic_cache"] = answer_cache.stats()
+    if verdict_cache is not None:
+        stats["verdict_cache"] = verdict_cache.stats()
+    if chain_registry.cascades:
+        stats["cascade"] = {node: cascade.stats() for node, cascade in chain_registry.cascades.items()}
+    if isinstance(checkpointer, TieredCheckpointSaver):
+        stats["checkpointer"] = checkpointer.stats()
+    if memory is not None:
+        stats["memory"] = memory.stats()
+    if guardrail_index is not None:
+        stats["guardrail_index"] = guardrail_index.stats()
+    if admission is not None:
+        stats["admission"] = admission.stats()
+    if tool_output_compactor is not None:
+        stats["tool_output_compaction"] = tool_output_compactor.stats()
+    return stats
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(fapi_app, host="0.0.0.0", port=8080)
\ No newline at end of file
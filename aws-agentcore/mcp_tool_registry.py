@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import os
+import time
+
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import load_mcp_tools
+
+from fetch_access_token import afetch_access_token
+from tool_executor import build_tools_by_name
+from tool_cache import wrap_tools_with_cache
+from async_io import IO_TIMEOUTS
+
+logger = logging.getLogger(__name__)
+
+MCP_SERVER_NAME = "research-paper-server"
+# Refresh this many seconds before the access token expires (capped at half its lifetime)
+MCP_REFRESH_MARGIN_SECONDS = float(os.getenv("MCP_REFRESH_MARGIN_SECONDS", "300"))
+MCP_REFRESH_RETRY_SECONDS = float(os.getenv("MCP_REFRESH_RETRY_SECONDS", "15"))
+# Background retries back off exponentially from MCP_REFRESH_RETRY_SECONDS up to this
+MCP_REFRESH_MAX_RETRY_SECONDS = float(os.getenv("MCP_REFRESH_MAX_RETRY_SECONDS", "300"))
+# Attempts a request makes (0.5s, 1s, ... apart) while no tool set was ever loaded
+MCP_FIRST_LOAD_ATTEMPTS = int(os.getenv("MCP_FIRST_LOAD_ATTEMPTS", "3"))
+MCP_REFRESH_TIMEOUT_SECONDS = float(os.getenv("MCP_REFRESH_TIMEOUT_SECONDS", "30"))
+# How long a replaced MCP session stays open for tool calls that are still running on it
+MCP_SESSION_GRACE_SECONDS = float(os.getenv("MCP_SESSION_GRACE_SECONDS", "180"))
+
+
+class MCPToolsUnavailable(Exception):
+    """No MCP tool set was ever loaded and loading it keeps failing"""
+
+
+class MCPToolRegistry:
+    """
+    Owns the MCP tool list.
+    - one persistent MCP session per access token, tools are loaded on that session
+    - single-flight refresh: concurrent callers share one token fetch + tool listing
+    - background refresh ahead of token expiry
+    - the last good tool set keeps being served while refreshes fail; without one,
+      get_tools() retries with backoff and raises MCPToolsUnavailable
+    """
+
+    def __init__(self, gateway_url: str = None):
+        self.gateway_url = gateway_url or os.getenv("GATEWAY_URL")
+        self.tools = None
+        self.tools_by_name = {}
+        self.version = 0
+        self.expires_at = None
+        self.last_refresh_at = None
+        self.last_refresh_latency = None
+        self.refresh_failures = 0
+        self.last_error = None
+        self.last_failure_at = None
+        self._refresh_task = None
+        self._background_task = None
+        self._session_close = None
+
+    def _expired(self) -> bool:
+        return self.expires_at is None or time.monotonic() >= self.expires_at
+
+    async def _hold_session(self, access_token: str, ready: asyncio.Future, close: asyncio.Event):
+        # The MCP transport must be entered and exited in the same task, so every
+        # session lives in its own task until it is told to close
+        client = MultiServerMCPClient({
+            MCP_SERVER_NAME: {
+                "transport": "http",
+                "url": self.gateway_url,
+                "headers": {
+                    "Authorization": f"Bearer {access_token}"
+                }
+            }
+        })
+        try:
+            async with client.session(MCP_SERVER_NAME) as session:
+                tools = await load_mcp_tools(session)
+                ready.set_result(tools)
+                await close.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            elif close is self._session_close:
+                logger.info(f"MCP session dropped, forcing a tool refresh: {e}")
+                self.expires_at = time.monotonic()
+
+    async def _refresh(self):
+        start = time.monotonic()
+        try:
+            access_token, expires_in = await afetch_access_token(timeout=IO_TIMEOUTS["token_fetch"])
+            ready = asyncio.get_running_loop().create_future()
+            close = asyncio.Event()
+            holder = asyncio.create_task(self._hold_session(access_token, ready, close))
+            try:
+                tools = await asyncio.wait_for(asyncio.shield(ready), timeout=MCP_REFRESH_TIMEOUT_SECONDS)
+            except BaseException:
+                close.set()
+                holder.cancel()
+                raise
+        except Exception as e:
+            self.refresh_failures += 1
+            self.last_error = str(e)
+            self.last_failure_at = time.monotonic()
+            logger.info(f"Failed to initialize MCP tools: {e}")
+            return False
+
+        previous_close = self._session_close
+        self._session_close = close
+        self.tools = tools
+        # toolNode calls go through the persistent tool result cache
+        self.tools_by_name = wrap_tools_with_cache(build_tools_by_name(tools))
+        self.version += 1
+        self.expires_at = time.monotonic() + expires_in
+        self.last_refresh_at = time.monotonic()
+        self.last_refresh_latency = self.last_refresh_at - start
+        self.last_error = None
+        if previous_close is not None:
+            asyncio.get_running_loop().call_later(MCP_SESSION_GRACE_SECONDS, previous_close.set)
+        logger.info(f"MCP tools initialized successfully (version {self.version}, {len(tools)} tools, {self.last_refresh_latency:.2f}s)")
+        return True
+
+    async def refresh(self):
+        """Single-flight refresh, concurrent callers await the same attempt"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        return await asyncio.shield(self._refresh_task)
+
+    async def get_tools(self):
+        """Current tools, refreshing when missing or expired. Serves the last good set on failure"""
+        if self.tools is None:
+            return await self._first_load()
+        if self._expired() and not self._recently_failed():
+            if not await self.refresh():
+                logger.info(f"Serving stale MCP tools (version {self.version}) while refresh is failing")
+        return self.tools
+
+    async def _first_load(self):
+        for attempt in range(MCP_FIRST_LOAD_ATTEMPTS):
+            if await self.refresh():
+                return self.tools
+            if attempt + 1 < MCP_FIRST_LOAD_ATTEMPTS:
+                await asyncio.sleep(0.5 * 2 ** attempt)
+        raise MCPToolsUnavailable(f"MCP tools could not be loaded: {self.last_error}")
+
+    def _recently_failed(self) -> bool:
+        return self.last_failure_at is not None and time.monotonic() - self.last_failure_at < MCP_REFRESH_RETRY_SECONDS
+
+    def _next_refresh_delay(self) -> float:
+        if self.expires_at is None:
+            return 0
+        lifetime = self.expires_at - (self.last_refresh_at or time.monotonic())
+        margin = min(MCP_REFRESH_MARGIN_SECONDS, lifetime / 2)
+        return max(0.0, self.expires_at - margin - time.monotonic())
+
+    async def _background_refresh(self):
+        failures = 0
+        while True:
+            await asyncio.sleep(self._next_refresh_delay())
+            if await self.refresh():
+                failures = 0
+                continue
+            await asyncio.sleep(min(MCP_REFRESH_RETRY_SECONDS * 2 ** failures, MCP_REFRESH_MAX_RETRY_SECONDS))
+            failures += 1
+
+    def start(self):
+        if self._background_task is None:
+            self._background_task = asyncio.create_task(self._background_refresh())
+
+    async def stop(self):
+        if self._background_task is not None:
+            self._background_task.cancel()
+            await asyncio.gather(self._background_task, return_exceptions=True)
+            self._background_task = None
+        if self._session_close is not None:
+            self._session_close.set()
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "version": self.version,
+            "tool_count": len(self.tools or []),
+            "last_refresh_latency_ms": None if self.last_refresh_latency is None else round(self.last_refresh_latency * 1000, 1),
+            "staleness_seconds": None if self.last_refresh_at is None else round(now - self.last_refresh_at, 1),
+            "seconds_to_expiry": None if self.expires_at is None else round(self.expires_at - now, 1),
+            "serving_stale": self.tools is not None and self._expired(),
+            "refresh_failures": self.refresh_failures,
+            "last_error": self.last_error,
+        }
+
+
+tool_registry = MCPToolRegistry()
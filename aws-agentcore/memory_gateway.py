@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from langgraph.store.base import BaseStore, Item, PutOp
+
+from async_io import run_blocking
+
+logger = logging.getLogger(__name__)
+
+MEMORY_FLUSH_INTERVAL = float(os.getenv("MEMORY_FLUSH_INTERVAL", "0.5"))
+MEMORY_FLUSH_BATCH_SIZE = int(os.getenv("MEMORY_FLUSH_BATCH_SIZE", "32"))
+MEMORY_FLUSH_RETRIES = int(os.getenv("MEMORY_FLUSH_RETRIES", "3"))
+# Puts waiting for the store, aput() waits for room once this many are queued
+MEMORY_MAX_PENDING = int(os.getenv("MEMORY_MAX_PENDING", "1024"))
+MEMORY_SEARCH_CACHE_TTL = float(os.getenv("MEMORY_SEARCH_CACHE_TTL", "30"))
+MEMORY_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("MEMORY_SEARCH_CACHE_MAX_ENTRIES", "2048"))
+
+
+def _under(namespace: tuple, prefix: tuple) -> bool:
+    return tuple(namespace[:len(prefix)]) == tuple(prefix)
+
+
+def normalize_query(query: str):
+    return " ".join(query.casefold().split()) if query else query
+
+
+class MemoryGateway:
+    """
+    Long-term memory in front of a store (AgentCoreMemoryStore, or InMemoryStore in tests):
+    - aput() queues the item and returns, a background task writes the queue to the store
+      in batches; the queue is bounded, aput() waits for room when it is full
+    - asearch() results are cached per (namespace, normalized query, limit) for a short
+      TTL, a flushed put under the namespace drops the cached results
+    - aclose() flushes everything that is still queued, call it on shutdown
+    Searches are eventually consistent: a put is visible once it was flushed, and on
+    AgentCore only after the service extracted it into the searched namespace (e.g. the
+    conversational events of (actor, thread) into ("preferences", actor)), so queued
+    items are not merged into search results.
+    """
+
+    def __init__(self, store: BaseStore, flush_interval: float = MEMORY_FLUSH_INTERVAL,
+                 batch_size: int = MEMORY_FLUSH_BATCH_SIZE, max_pending: int = MEMORY_MAX_PENDING,
+                 search_ttl: float = MEMORY_SEARCH_CACHE_TTL, max_searches: int = MEMORY_SEARCH_CACHE_MAX_ENTRIES):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.search_ttl = search_ttl
+        self.max_searches = max_searches
+        self.searches = OrderedDict()  # (namespace_prefix, query, limit) -> (expires_at, items)
+        self.counters = {"hits": 0, "misses": 0, "puts": 0, "flushed": 0, "flush_failures": 0}
+        self._queue = None
+        self._worker = None
+
+    # -- write-behind queue ------------------------------------------------
+
+    def start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._flush_loop())
+
+    async def aput(self, namespace: tuple, key: str, value: dict):
+        self.start()
+        self.counters["puts"] += 1
+        await self._queue.put(PutOp(namespace=tuple(namespace), key=key, value=value))
+
+    async def _apply(self, ops: list[PutOp]) -> bool:
+        for attempt in range(MEMORY_FLUSH_RETRIES):
+            try:
+                await run_blocking("memory_put", self.store.batch, ops)
+                self.counters["flushed"] += len(ops)
+                return True
+            except Exception as e:
+                logger.info(f"Memory flush of {len(ops)} items failed (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(0.2 * 2 ** attempt)
+        self.counters["flush_failures"] += len(ops)
+        logger.error(f"Dropping {len(ops)} memory items after repeated flush failures")
+        return False
+
+    async def _flush_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(self.flush_interval)
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._apply(batch)
+            finally:
+                for op in batch:
+                    self._invalidate(op.namespace)
+                    self._queue.task_done()
+
+    async def aflush(self):
+        """Wait until every queued put reached the store"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def aclose(self):
+        await self.aflush()
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+    # -- search cache ------------------------------------------------------
+
+    def _invalidate(self, namespace: tuple):
+        for cache_key in [cache_key for cache_key in self.searches if _under(namespace, cache_key[0])]:
+            del self.searches[cache_key]
+
+    async def asearch(self, namespace_prefix: tuple, *, query: str = None, limit: int = 10) -> list[Item]:
+        namespace_prefix = tuple(namespace_prefix)
+        cache_key = (namespace_prefix, normalize_query(query), limit)
+        cached = self.searches.get(cache_key)
+        if cached is not None and cached[0] > time.monotonic():
+            self.searches.move_to_end(cache_key)
+            self.counters["hits"] += 1
+            items = cached[1]
+        else:
+            self.counters["misses"] += 1
+            items = await run_blocking("memory_search", self.store.search, namespace_prefix, query=query, limit=limit)
+            if self.search_ttl > 0:
+                self.searches[cache_key] = (time.monotonic() + self.search_ttl, items)
+                self.searches.move_to_end(cache_key)
+                while len(self.searches) > self.max_searches:
+                    self.searches.popitem(last=False)
+        return items
+
+    def stats(self):
+        return {
+            **self.counters,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "cached_searches": len(self.searches),
+        }
@@ -0,0 +1,19 @@
+import re
+
+# Retrieved long-term memory is prepended to the latest user message sent to an LLM. Older
+# versions also persisted it, so readers of stored messages strip it again.
+MEMORY_PREFIX = "Some Previous Info: "
+MEMORY_PREFIX_RE = re.compile(r"^Some Previous Info: .*?\n\n", re.DOTALL)
+
+
+def add_memory_prefix(content: str, memory_context: str) -> str:
+    return MEMORY_PREFIX + memory_context + "\n\n" + content
+
+
+def strip_memory_prefix(content: str) -> str:
+    while content.startswith(MEMORY_PREFIX):
+        stripped = MEMORY_PREFIX_RE.sub("", content, count=1)
+        if stripped == content:
+            break
+        content = stripped
+    return content
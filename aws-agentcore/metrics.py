@@ -0,0 +1,150 @@
+import logging
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536, 262144)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+NODE_DURATION = Histogram("agent_node_duration_seconds", "Wall time of one graph node run", ["node"], buckets=LATENCY_BUCKETS)
+LLM_LATENCY = Histogram("agent_llm_latency_seconds", "Latency of one chat model call", ["role", "model"], buckets=LATENCY_BUCKETS)
+LLM_TOKENS = Histogram("agent_llm_tokens", "Tokens of one chat model call", ["role", "model", "kind"], buckets=TOKEN_BUCKETS)
+TOOL_LATENCY = Histogram("agent_tool_latency_seconds", "Latency of one MCP tool call", ["tool", "status"], buckets=LATENCY_BUCKETS)
+TOOL_ERRORS = Counter("agent_tool_errors_total", "MCP tool calls that ended in an error ToolMessage", ["tool"])
+TOOL_LOOP_DEPTH = Histogram("agent_tool_loop_depth", "Tool-loop iterations of one request", ["status"], buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16))
+RUN_DURATION = Histogram("agent_run_duration_seconds", "Wall time of one request by how it ended: ok, cached, cancelled or error",
+                         ["status"], buckets=LATENCY_BUCKETS)
+STREAM_TTFB = Histogram("agent_stream_ttfb_seconds", "Time to the first streamed chunk", ["mode"], buckets=LATENCY_BUCKETS)
+STREAM_BYTES = Histogram("agent_stream_bytes", "Bytes sent by one streamed response", ["mode"], buckets=BYTE_BUCKETS)
+STREAMS_IN_FLIGHT = Gauge("agent_streams_in_flight", "Streamed responses currently open")
+
+# Chains carry this tag so LLM metrics are labelled with the role rather than the node
+ROLE_TAG_PREFIX = "role:"
+
+
+def role_tag(role: str) -> str:
+    return ROLE_TAG_PREFIX + role
+
+
+class CacheRatioCollector:
+    """Hit ratio gauges read from each cache's stats() at scrape time, nothing on the hot path"""
+
+    def __init__(self):
+        self.sources = {}
+
+    def add(self, name: str, stats):
+        self.sources[name] = stats
+
+    def collect(self):
+        gauge = GaugeMetricFamily("agent_cache_hit_ratio", "Hit ratio of an in-process cache", labels=["cache"])
+        for name, stats in self.sources.items():
+            try:
+                values = stats()
+            except Exception as e:
+                logger.info(f"Reading {name} stats for metrics failed: {e}")
+                continue
+            ratio = values.get("hit_ratio")
+            if ratio is None and "hits" in values:
+                total = values["hits"] + values.get("misses", 0)
+                ratio = values["hits"] / total if total else 0.0
+            if ratio is not None:
+                gauge.add_metric([name], ratio)
+        yield gauge
+
+
+cache_ratios = CacheRatioCollector()
+REGISTRY.register(cache_ratios)
+
+
+def observe_tool_call(tool: str, status: str, seconds: float):
+    TOOL_LATENCY.labels(tool, status).observe(seconds)
+    if status == "error":
+        TOOL_ERRORS.labels(tool).inc()
+
+
+class RunMetrics(BaseCallbackHandler):
+    """
+    Per-request callback handler: node durations, LLM latency and token usage per
+    role/model, and the run duration and tool-loop depth once the run is finished, also
+    when it was cancelled or failed. Runs inline on the event loop, each event is a dict
+    operation plus a histogram observe.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.nodes = {}
+        self.llm_calls = {}
+        self.tool_loops = 0
+        self.started = time.perf_counter()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node is not None and kwargs.get("name") == node:
+            self.nodes[run_id] = (node, time.perf_counter())
+
+    def _node_done(self, run_id):
+        started = self.nodes.pop(run_id, None)
+        if started is not None:
+            node, start = started
+            NODE_DURATION.labels(node).observe(time.perf_counter() - start)
+            if node == "tool_node":
+                self.tool_loops += 1
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._node_done(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._node_done(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        role = next((tag[len(ROLE_TAG_PREFIX):] for tag in tags or [] if tag.startswith(ROLE_TAG_PREFIX)),
+                    metadata.get("langgraph_node", "unknown"))
+        self.llm_calls[run_id] = (role, metadata.get("ls_model_name", "unknown"), time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self.llm_calls.pop(run_id, None)
+        if started is None:
+            return
+        role, model, start = started
+        LLM_LATENCY.labels(role, model).observe(time.perf_counter() - start)
+        message = getattr(response.generations[0][0], "message", None) if response.generations and response.generations[0] else None
+        usage = getattr(message, "usage_metadata", None) or {}
+        for kind in ("input_tokens", "output_tokens"):
+            if usage.get(kind) is not None:
+                LLM_TOKENS.labels(role, model, kind).observe(usage[kind])
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.llm_calls.pop(run_id, None)
+
+    def finish(self, status: str = "ok"):
+        RUN_DURATION.labels(status).observe(time.perf_counter() - self.started)
+        TOOL_LOOP_DEPTH.labels(status).observe(self.tool_loops)
+
+
+async def instrument_stream(chunks, mode: str):
+    """Passes the chunks through while recording TTFB, size and the in-flight gauge"""
+    STREAMS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    first = True
+    size = 0
+    try:
+        async for chunk in chunks:
+            if first:
+                STREAM_TTFB.labels(mode).observe(time.perf_counter() - start)
+                first = False
+            size += len(chunk.encode() if isinstance(chunk, str) else chunk)
+            yield chunk
+    finally:
+        STREAMS_IN_FLIGHT.dec()
+        STREAM_BYTES.labels(mode).observe(size)
+
+
+def render_metrics():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
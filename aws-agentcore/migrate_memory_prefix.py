@@ -0,0 +1,185 @@
+"""
+One-off migration: strip the "Some Previous Info: ..." prefix that older versions of
+noGuardrail wrote into persisted HumanMessages.
+
+    python migrate_memory_prefix.py --thread ACTOR_ID THREAD_ID [--thread ...]
+    python migrate_memory_prefix.py --threads-file threads.jsonl [--dry-run] [--compact] [--clean-store]
+
+threads.jsonl holds one {"actor_id": ..., "thread_id": ...} object per line. The cleaned
+messages are written as a new checkpoint, replacing the old messages by id. That appends
+to the thread's history, the older checkpoints still hold the prefixed text:
+- --compact deletes the thread's checkpoints and writes back only the latest one (without
+  the old memory_context channel). Earlier checkpoints, and time travel to them, are gone.
+- --clean-store rewrites the thread's conversational events in the long-term memory store
+  whose text starts with the prefix (create the cleaned event, then delete the old one).
+  Memory records AgentCore already extracted from those events are not touched.
+Checkpoints are written straight to AgentCoreMemorySaver, never through the write-behind tier.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import copy_checkpoint
+from langgraph_checkpoint_aws import AgentCoreMemorySaver
+
+from memory_prefix import MEMORY_PREFIX, strip_memory_prefix
+
+logger = logging.getLogger(__name__)
+
+# State channel of earlier versions that held the retrieved memory of the last turn
+LEGACY_CHANNELS = ("memory_context",)
+
+
+def load_agent_module():
+    # The agent module name contains dashes, so it is loaded from its path
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "langgraph-agent-main.py")
+    spec = importlib.util.spec_from_file_location("langgraph_agent_main", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def durable_checkpointer(module):
+    checkpointer = module.checkpointer
+    return getattr(checkpointer, "durable", checkpointer)
+
+
+def cleaned_messages(messages):
+    cleaned = []
+    for message in messages:
+        if isinstance(message, HumanMessage) and isinstance(message.content, str):
+            content = strip_memory_prefix(message.content)
+            if content != message.content:
+                cleaned.append(message.model_copy(update={"content": content}))
+    return cleaned
+
+
+def ended_on_answer(messages) -> bool:
+    last = messages[-1] if messages else None
+    return isinstance(last, AIMessage) and not last.tool_calls
+
+
+async def migrate_thread(app, actor_id: str, thread_id: str, dry_run: bool = False) -> int:
+    config = {"configurable": {"thread_id": thread_id, "actor_id": actor_id}}
+    state = await app.aget_state(config)
+    messages = state.values.get("messages", [])
+    cleaned = cleaned_messages(messages)
+    if not cleaned or dry_run:
+        return len(cleaned)
+
+    if not ended_on_answer(messages):
+        logger.info(f"Skipping {actor_id}/{thread_id}: the thread did not end on a final answer")
+        return 0
+    # Writing as main_tool_llm routes straight to END, so no node is scheduled for the thread
+    await app.aupdate_state(config, {"messages": cleaned}, as_node="main_tool_llm")
+    return len(cleaned)
+
+
+async def compact_thread(checkpointer, actor_id: str, thread_id: str, dry_run: bool = False) -> int:
+    """Replace the thread's checkpoint history with its latest checkpoint, returns the checkpoints dropped"""
+    config = {"configurable": {"thread_id": thread_id, "actor_id": actor_id, "checkpoint_ns": ""}}
+    latest = await checkpointer.aget_tuple(config)
+    if latest is None:
+        return 0
+    dropped = len([item async for item in checkpointer.alist(config)]) - 1
+    if dry_run or dropped <= 0:
+        return max(dropped, 0)
+    if not ended_on_answer(latest.checkpoint["channel_values"].get("messages", [])):
+        logger.info(f"Not compacting {actor_id}/{thread_id}: the thread did not end on a final answer")
+        return 0
+
+    checkpoint = copy_checkpoint(latest.checkpoint)
+    for channel in LEGACY_CHANNELS:
+        checkpoint["channel_values"].pop(channel, None)
+        checkpoint["channel_versions"].pop(channel, None)
+    if isinstance(checkpointer, AgentCoreMemorySaver):
+        await checkpointer.adelete_thread(thread_id, actor_id)
+    else:
+        await checkpointer.adelete_thread(thread_id)
+    await checkpointer.aput(config, checkpoint, latest.metadata, dict(checkpoint["channel_versions"]))
+    return dropped
+
+
+def clean_store_events(store, actor_id: str, thread_id: str, dry_run: bool = False) -> int:
+    """Rewrite the thread's conversational memory events that carry the prefix, returns their count"""
+    client = store.client
+    events, token = [], None
+    while True:
+        page = client.list_events(
+            memoryId=store.memory_id, actorId=actor_id, sessionId=thread_id,
+            includePayloads=True, maxResults=100, **({"nextToken": token} if token else {}),
+        )
+        events.extend(page.get("events", []))
+        token = page.get("nextToken")
+        if not token:
+            break
+
+    cleaned = 0
+    for event in events:
+        payload, changed = [], False
+        for part in event.get("payload", []):
+            conversational = part.get("conversational")
+            text = (conversational or {}).get("content", {}).get("text", "")
+            if text.startswith(MEMORY_PREFIX):
+                part = {"conversational": {"content": {"text": strip_memory_prefix(text)}, "role": conversational["role"]}}
+                changed = True
+            payload.append(part)
+        if not changed:
+            continue
+        cleaned += 1
+        if dry_run:
+            continue
+        client.create_event(memoryId=store.memory_id, actorId=actor_id, sessionId=thread_id,
+                            eventTimestamp=event["eventTimestamp"], payload=payload)
+        client.delete_event(memoryId=store.memory_id, actorId=actor_id, sessionId=thread_id, eventId=event["eventId"])
+    return cleaned
+
+
+def read_threads(args):
+    threads = [tuple(pair) for pair in args.thread or []]
+    if args.threads_file:
+        with open(args.threads_file) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    threads.append((entry["actor_id"], entry["thread_id"]))
+    return threads
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--thread", nargs=2, action="append", metavar=("ACTOR_ID", "THREAD_ID"))
+    parser.add_argument("--threads-file")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--compact", action="store_true", help="keep only the latest checkpoint of each thread")
+    parser.add_argument("--clean-store", action="store_true", help="also rewrite prefixed long-term memory events")
+    args = parser.parse_args()
+
+    module = load_agent_module()
+    checkpointer = durable_checkpointer(module)
+    app = module.graph.compile(checkpointer=checkpointer)
+    verb = "to clean" if args.dry_run else "cleaned"
+    total = 0
+    for actor_id, thread_id in read_threads(args):
+        try:
+            count = await migrate_thread(app, actor_id, thread_id, args.dry_run)
+            total += count
+            line = f"{actor_id}/{thread_id}: {count} message(s) {verb}"
+            if args.compact:
+                dropped = await compact_thread(checkpointer, actor_id, thread_id, args.dry_run)
+                line += f", {dropped} old checkpoint(s) {'to drop' if args.dry_run else 'dropped'}"
+            if args.clean_store:
+                events = await asyncio.to_thread(clean_store_events, module.store, actor_id, thread_id, args.dry_run)
+                line += f", {events} memory event(s) {verb}"
+            print(line)
+        except Exception as e:
+            print(f"{actor_id}/{thread_id}: failed: {e}")
+    print(f"Done, {total} message(s) {verb}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
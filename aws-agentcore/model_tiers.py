@@ -0,0 +1,107 @@
+import logging
+import os
+import time
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+logger = logging.getLogger(__name__)
+
+# Default (model, temperature) of every LLM role, overridable per node with
+# <NODE>_MODEL / <NODE>_TEMPERATURE, e.g. LLM_GUARDRAIL_MODEL=gemini-2.5-flash
+NODE_MODEL_DEFAULTS = {
+    "llm_guardrail": ("gemini-2.5-pro", 0.7),
+    "topic_classifier": ("gemini-2.5-pro", 0.7),
+    "main_tool_llm": ("gemini-2.5-pro", 0.7),
+    "context_summarizer": ("gemini-2.5-pro", 0.7),
+    "cascade": ("gemini-2.5-flash-lite", 0.0),
+}
+
+# Cascade mode: a cheap model answers the guardrail/classifier first and the node's own
+# model is only called when the cheap verdict can't be trusted
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "false").lower() == "true"
+CASCADE_MIN_CONFIDENCE = float(os.getenv("CASCADE_MIN_CONFIDENCE", "0.7"))
+
+
+def node_model_config(node: str):
+    model, temperature = NODE_MODEL_DEFAULTS[node]
+    prefix = node.upper()
+    return os.getenv(f"{prefix}_MODEL", model), float(os.getenv(f"{prefix}_TEMPERATURE", temperature))
+
+
+def make_chat_model(node: str) -> ChatGoogleGenerativeAI:
+    model, temperature = node_model_config(node)
+    return ChatGoogleGenerativeAI(
+        api_key=os.getenv("GEMINI_API_KEY"),
+        model=model,
+        temperature=temperature
+    )
+
+
+class Cascade:
+    """
+    Runs the cheap chain first and escalates to the strong chain when the cheap output
+    fails to parse, reports a confidence below min_confidence, or when should_escalate
+    flags the verdict. Escalation rate and latency saved are tracked per node.
+    """
+
+    def __init__(self, node: str, cheap_chain, strong_chain, should_escalate=None,
+                 min_confidence: float = CASCADE_MIN_CONFIDENCE):
+        self.node = node
+        self.cheap_chain = cheap_chain
+        self.strong_chain = strong_chain
+        self.should_escalate = should_escalate
+        self.min_confidence = min_confidence
+        self.counters = {"calls": 0, "escalations": 0, "parse_failures": 0}
+        self.cheap_seconds = 0.0
+        self.strong_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def _escalation_reason(self, verdict):
+        confidence = getattr(verdict, "confidence", None)
+        if confidence is not None and confidence < self.min_confidence:
+            return f"low confidence {confidence}"
+        if self.should_escalate is not None and self.should_escalate(verdict):
+            return "verdict requires confirmation"
+        return None
+
+    def _avg_strong_seconds(self):
+        return self.strong_seconds / self.counters["escalations"] if self.counters["escalations"] else None
+
+    async def ainvoke(self, inputs, config=None):
+        self.counters["calls"] += 1
+        start = time.perf_counter()
+        try:
+            verdict = await self.cheap_chain.ainvoke(inputs, config)
+            reason = self._escalation_reason(verdict)
+        except Exception as e:
+            self.counters["parse_failures"] += 1
+            reason = f"cheap model failed: {e}"
+        cheap_elapsed = time.perf_counter() - start
+        self.cheap_seconds += cheap_elapsed
+
+        if reason is None:
+            avg_strong = self._avg_strong_seconds()
+            if avg_strong is not None:
+                self.saved_seconds += max(0.0, avg_strong - cheap_elapsed)
+            logger.info(f"Cascade {self.node}: cheap verdict accepted in {cheap_elapsed * 1000:.0f}ms "
+                        f"(escalation rate {self.escalation_rate():.0%}, saved {self.saved_seconds:.1f}s so far)")
+            return verdict
+
+        self.counters["escalations"] += 1
+        start = time.perf_counter()
+        verdict = await self.strong_chain.ainvoke(inputs, config)
+        self.strong_seconds += time.perf_counter() - start
+        logger.info(f"Cascade {self.node}: escalated ({reason}), escalation rate {self.escalation_rate():.0%}")
+        return verdict
+
+    def escalation_rate(self) -> float:
+        return self.counters["escalations"] / self.counters["calls"] if self.counters["calls"] else 0.0
+
+    def stats(self):
+        return {
+            **self.counters,
+            "escalation_rate": self.escalation_rate(),
+            "avg_cheap_ms": round(self.cheap_seconds / self.counters["calls"] * 1000, 1) if self.counters["calls"] else None,
+            "avg_strong_ms": None if self._avg_strong_seconds() is None else round(self._avg_strong_seconds() * 1000, 1),
+            "saved_seconds": round(self.saved_seconds, 2),
+        }
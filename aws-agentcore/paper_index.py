@@ -0,0 +1,431 @@
+"""
+Local hybrid arXiv paper index.
+
+Paper metadata and a BM25 inverted index live in a sqlite file, optionally next to a
+memory-mapped matrix of normalized title+abstract embeddings for hybrid search. Queries
+are answered in-process by the search_local_papers tool, the remote MCP tools stay
+available for anything the snapshot does not cover.
+
+BM25 only touches the postings of the query terms. Embeddings are scanned brute force
+until the index holds PAPER_INDEX_IVF_MIN_DOCS papers, then an IVF index (k-means lists,
+PAPER_INDEX_IVF_PROBES of them scanned per query) is trained at ingest; new papers are
+added to the nearest list. benchmarks/bench_paper_index.py measures both.
+
+Build or extend the index from arXiv metadata dumps (.jsonl, or .json holding a list):
+    python paper_index.py ingest --input arxiv-metadata.jsonl --out paper_index [--embedder hashing]
+Running ingest again on the same --out appends new papers, known arXiv ids are skipped.
+    python paper_index.py search --index paper_index --query "speculative decoding"
+Retrain the IVF lists, e.g. after a large append:
+    python paper_index.py build-ivf --index paper_index [--lists 1024]
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+from langchain_core.tools import tool
+
+from guardrail_index import EMBEDDERS, get_embedder, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+PAPER_INDEX_DIR = os.getenv("PAPER_INDEX_DIR")
+PAPER_INDEX_MAX_RESULTS = int(os.getenv("PAPER_INDEX_MAX_RESULTS", "10"))
+PAPER_INDEX_ABSTRACT_CHARS = int(os.getenv("PAPER_INDEX_ABSTRACT_CHARS", "600"))
+# Embedding search switches from a full scan to IVF lists at this many papers
+PAPER_INDEX_IVF_MIN_DOCS = int(os.getenv("PAPER_INDEX_IVF_MIN_DOCS", "50000"))
+PAPER_INDEX_IVF_PROBES = int(os.getenv("PAPER_INDEX_IVF_PROBES", "16"))
+
+DB_FILE = "papers.sqlite3"
+EMBEDDINGS_FILE = "embeddings.npy"
+META_FILE = "meta.json"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_ASSIGN_FILE = "ivf_assign.npy"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Reciprocal rank fusion constant used to merge the BM25 and embedding rankings
+RRF_K = 60
+# Candidates taken from each ranking before fusion
+CANDIDATES = 100
+
+SEARCH_TOOL_NAME = "search_local_papers"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it of on or that the this to was were with we our "
+    "via using based towards".split()
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    doc INTEGER PRIMARY KEY, arxiv_id TEXT UNIQUE, title TEXT, authors TEXT, abstract TEXT,
+    categories TEXT, published TEXT, pdf_url TEXT, length INTEGER
+);
+CREATE TABLE IF NOT EXISTS postings (term TEXT, doc INTEGER, tf INTEGER);
+-- Covering index, a term's postings are read from the index alone
+CREATE INDEX IF NOT EXISTS postings_term_doc_tf ON postings (term, doc, tf);
+DROP INDEX IF EXISTS postings_term;
+"""
+
+
+def tokenize(text: str):
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def paper_text(title: str, abstract: str) -> str:
+    return f"{title}\n{abstract}"
+
+
+def normalize_paper(record: dict) -> Optional[dict]:
+    """Maps an arXiv metadata record (OAI snapshot or API style) onto the index columns"""
+    arxiv_id = record.get("id") or record.get("arxiv_id")
+    title = " ".join((record.get("title") or "").split())
+    if not arxiv_id or not title:
+        return None
+    arxiv_id = str(arxiv_id).rsplit("/abs/", 1)[-1]
+    authors = record.get("authors") or ""
+    if isinstance(authors, list):
+        authors = ", ".join(a.get("name", "") if isinstance(a, dict) else str(a) for a in authors)
+    categories = record.get("categories") or ""
+    if isinstance(categories, list):
+        categories = " ".join(categories)
+    return {
+        "arxiv_id": arxiv_id,
+        "title": title,
+        "authors": " ".join(str(authors).split()),
+        "abstract": " ".join((record.get("abstract") or record.get("summary") or "").split()),
+        "categories": categories,
+        "published": record.get("published") or record.get("update_date") or "",
+        "pdf_url": record.get("pdf_url") or f"https://arxiv.org/pdf/{arxiv_id}",
+    }
+
+
+def train_ivf(embeddings, lists: int, iterations: int = 10, sample_size: int = 256, seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids over a sample of the (normalized) embedding rows"""
+    rng = np.random.default_rng(seed)
+    rows = np.arange(1, embeddings.shape[0])
+    sample = np.asarray(embeddings[np.sort(rng.choice(rows, min(len(rows), lists * sample_size), replace=False))])
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        # An empty list keeps its previous centroid
+        empty = np.bincount(assign, minlength=lists) == 0
+        sums[empty] = centroids[empty]
+        centroids = normalize_rows(sums)
+    return centroids.astype(np.float32)
+
+
+def assign_ivf(embeddings, centroids: np.ndarray, start: int = 1, chunk: int = 65536) -> np.ndarray:
+    """Nearest centroid of every row from start on, in chunks so the matrix stays on disk"""
+    assign = np.empty(embeddings.shape[0] - start, dtype=np.int32)
+    for offset in range(start, embeddings.shape[0], chunk):
+        block = np.asarray(embeddings[offset:offset + chunk])
+        assign[offset - start:offset - start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+def read_papers(path: str):
+    with open(path) as f:
+        # The Kaggle arXiv snapshot is JSON lines despite its .json extension
+        first = f.read(1024).lstrip()[:1]
+        f.seek(0)
+        if path.endswith(".jsonl") or first != "[":
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            records = json.load(f)
+        for record in records:
+            paper = normalize_paper(record)
+            if paper is not None:
+                yield paper
+
+
+class PaperIndex:
+    """BM25 over sqlite postings, fused with cosine search over the memory-mapped embeddings"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.db = sqlite3.connect(os.path.join(directory, DB_FILE), check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.meta = {}
+        self.embeddings = None
+        self.embedder = None
+        self.ivf = None
+        self.reload()
+
+    def reload(self):
+        """(Re)reads document lengths, meta and the embedding matrix, e.g. after an append"""
+        with self._lock:
+            rows = self.db.execute("SELECT doc, length FROM papers ORDER BY doc").fetchall()
+        self.lengths = np.zeros(rows[-1][0] + 1 if rows else 1, dtype=np.float32)
+        for doc, length in rows:
+            self.lengths[doc] = length
+        self.count = len(rows)
+        self.avg_length = float(self.lengths[self.lengths > 0].mean()) if rows else 1.0
+        meta_path = os.path.join(self.directory, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+        embeddings_path = os.path.join(self.directory, EMBEDDINGS_FILE)
+        if self.meta.get("embedder") and os.path.exists(embeddings_path):
+            self.embeddings = np.load(embeddings_path, mmap_mode="r")
+            self.embedder = get_embedder(self.meta["embedder"], self.meta.get("model"))
+        self.ivf = self._load_ivf()
+
+    def _load_ivf(self):
+        """(centroids, docs grouped by list, list offsets), None without a matching IVF index"""
+        centroids_path = os.path.join(self.directory, IVF_CENTROIDS_FILE)
+        assign_path = os.path.join(self.directory, IVF_ASSIGN_FILE)
+        if self.embeddings is None or not os.path.exists(centroids_path) or not os.path.exists(assign_path):
+            return None
+        centroids = np.load(centroids_path)
+        assign = np.load(assign_path)
+        if len(assign) != self.embeddings.shape[0]:
+            logger.info("IVF lists don't match the embedding matrix, scanning it instead")
+            return None
+        docs = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(assign[docs], np.arange(len(centroids) + 1))
+        return centroids, docs, offsets
+
+    def build_ivf(self, lists: int = None):
+        """Trains the IVF lists over every embedding row, sqrt(rows) lists by default"""
+        rows = self.embeddings.shape[0] - 1
+        lists = min(rows, lists or max(1, int(np.sqrt(rows))))
+        centroids = train_ivf(self.embeddings, lists)
+        assign = np.concatenate([[-1], assign_ivf(self.embeddings, centroids)]).astype(np.int32)
+        self._save_ivf(centroids, assign)
+
+    def _extend_ivf(self):
+        # New rows join their nearest list, the centroids stay as trained
+        centroids = np.load(os.path.join(self.directory, IVF_CENTROIDS_FILE))
+        assign = np.load(os.path.join(self.directory, IVF_ASSIGN_FILE))
+        if len(assign) < self.embeddings.shape[0]:
+            new = assign_ivf(self.embeddings, centroids, start=len(assign))
+            self._save_ivf(centroids, np.concatenate([assign, new]).astype(np.int32))
+
+    def _save_ivf(self, centroids: np.ndarray, assign: np.ndarray):
+        for name, array in ((IVF_CENTROIDS_FILE, centroids), (IVF_ASSIGN_FILE, assign)):
+            path = os.path.join(self.directory, name)
+            tmp_path = path + ".tmp.npy"
+            np.save(tmp_path, array)
+            os.replace(tmp_path, path)
+
+    # -- ingest -------------------------------------------------------------
+
+    def add_papers(self, papers, embedder_name: str = None, model: str = None, batch_size: int = 256):
+        """Appends papers whose arXiv id is not indexed yet, returns how many were added"""
+        if embedder_name and not self.meta.get("embedder"):
+            if self.count:
+                raise ValueError("Embeddings can only be enabled when the index is created")
+            embedder = get_embedder(embedder_name, model)
+            self.meta = {"embedder": embedder.name, "model": embedder.model}
+        embedder = get_embedder(self.meta["embedder"], self.meta.get("model")) if self.meta.get("embedder") else None
+
+        added, texts = 0, []
+        with self._lock:
+            for paper in papers:
+                tokens = tokenize(paper_text(paper["title"], paper["abstract"]))
+                cursor = self.db.execute(
+                    "INSERT OR IGNORE INTO papers (arxiv_id, title, authors, abstract, categories, published, pdf_url, length) "
+                    "VALUES (:arxiv_id, :title, :authors, :abstract, :categories, :published, :pdf_url, :length)",
+                    {**paper, "length": len(tokens)},
+                )
+                if cursor.rowcount == 0:
+                    continue
+                doc = cursor.lastrowid
+                self.db.executemany(
+                    "INSERT INTO postings (term, doc, tf) VALUES (?, ?, ?)",
+                    [(term, doc, tf) for term, tf in Counter(tokens).items()],
+                )
+                texts.append((doc, paper_text(paper["title"], paper["abstract"])))
+                added += 1
+            self.db.commit()
+
+        if embedder is not None and texts:
+            self._append_embeddings(embedder, texts, batch_size)
+            self.embeddings = np.load(os.path.join(self.directory, EMBEDDINGS_FILE), mmap_mode="r")
+            if os.path.exists(os.path.join(self.directory, IVF_CENTROIDS_FILE)):
+                self._extend_ivf()
+            elif self.embeddings.shape[0] - 1 >= PAPER_INDEX_IVF_MIN_DOCS:
+                self.build_ivf()
+        self.reload()
+        return added
+
+    def _append_embeddings(self, embedder, texts, batch_size: int):
+        # Row i of the matrix belongs to doc i, row 0 is unused since sqlite rowids start at 1
+        path = os.path.join(self.directory, EMBEDDINGS_FILE)
+        new = np.vstack([embedder.embed([t for _, t in texts[i:i + batch_size]]) for i in range(0, len(texts), batch_size)])
+        last_doc = texts[-1][0]
+        old = np.load(path, mmap_mode="r") if os.path.exists(path) else np.zeros((1, new.shape[1]), dtype=np.float32)
+        matrix = np.zeros((last_doc + 1, new.shape[1]), dtype=np.float32)
+        matrix[:old.shape[0]] = old
+        matrix[[doc for doc, _ in texts]] = new
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, matrix)
+        os.replace(tmp_path, path)
+        self.meta.update({"dim": int(new.shape[1]), "count": int(matrix.shape[0] - 1)})
+        with open(os.path.join(self.directory, META_FILE), "w") as f:
+            json.dump(self.meta, f)
+
+    # -- search -------------------------------------------------------------
+
+    def bm25(self, query: str, k: int = CANDIDATES):
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.count:
+            return []
+        with self._lock:
+            postings = [self.db.execute("SELECT doc, tf FROM postings WHERE term = ?", (term,)).fetchall() for term in terms]
+        # Scores are accumulated over the matching postings only, never over the whole corpus
+        all_docs, all_scores = [], []
+        for rows in postings:
+            if not rows:
+                continue
+            docs = np.fromiter((doc for doc, _ in rows), dtype=np.int64, count=len(rows))
+            tf = np.fromiter((tf for _, tf in rows), dtype=np.float32, count=len(rows))
+            idf = np.log(1 + (self.count - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[docs] / self.avg_length)
+            all_docs.append(docs)
+            all_scores.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+        if not all_docs:
+            return []
+        docs, inverse = np.unique(np.concatenate(all_docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+        return _top_k(docs, scores, k)
+
+    def dense(self, query: str, k: int = CANDIDATES):
+        if self.embeddings is None:
+            return []
+        vector = normalize_rows(self.embedder.embed([query]))[0]
+        if self.ivf is None:
+            docs = np.arange(1, self.embeddings.shape[0])
+            scores = self.embeddings[1:] @ vector
+        else:
+            centroids, grouped, offsets = self.ivf
+            probes = np.argsort(-(centroids @ vector))[:PAPER_INDEX_IVF_PROBES]
+            # Sorted so the rows are read from the memory-mapped matrix front to back
+            docs = np.sort(np.concatenate([grouped[offsets[p]:offsets[p + 1]] for p in probes]))
+            scores = self.embeddings[docs] @ vector
+        return _top_k(docs, scores, k)
+
+    def search(self, query: str, k: int = 5):
+        """Top-k papers, BM25 and embedding rankings merged by reciprocal rank fusion"""
+        rankings = [ranking for ranking in (self.bm25(query), self.dense(query)) if ranking]
+        fused = Counter()
+        for ranking in rankings:
+            for rank, (doc, _) in enumerate(ranking):
+                fused[doc] += 1 / (RRF_K + rank + 1)
+        top = fused.most_common(k)
+        if not top:
+            return []
+        with self._lock:
+            rows = self.db.execute(
+                f"SELECT doc, arxiv_id, title, authors, abstract, categories, published, pdf_url FROM papers "
+                f"WHERE doc IN ({','.join('?' * len(top))})",
+                [doc for doc, _ in top],
+            ).fetchall()
+        by_doc = {row[0]: row for row in rows}
+        results = []
+        for doc, score in top:
+            _, arxiv_id, title, authors, abstract, categories, published, pdf_url = by_doc[doc]
+            results.append({
+                "arxiv_id": arxiv_id,
+                "title": title,
+                "authors": authors,
+                "abstract": abstract[:PAPER_INDEX_ABSTRACT_CHARS],
+                "categories": categories,
+                "published": published,
+                "pdf_url": pdf_url,
+                "score": round(score, 5),
+            })
+        return results
+
+
+def _top_k(docs: np.ndarray, scores: np.ndarray, k: int):
+    if k <= 0 or not len(docs):
+        return []
+    if len(docs) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(docs))
+    top = top[np.argsort(-scores[top])]
+    return [(int(docs[i]), float(scores[i])) for i in top]
+
+
+def load_paper_index(directory: str = PAPER_INDEX_DIR):
+    """Open the index once at startup, None when it is not configured or fails to load"""
+    if not directory:
+        return None
+    try:
+        index = PaperIndex(directory)
+        logger.info(f"Loaded paper index with {index.count} papers from {directory}")
+        return index
+    except Exception as e:
+        logger.info(f"Failed to load paper index from {directory}: {e}")
+        return None
+
+
+paper_index = load_paper_index()
+
+
+@tool(SEARCH_TOOL_NAME)
+def search_local_papers(query: str, max_results: int = 5) -> str:
+    """
+    Fast search over a local snapshot of arXiv AI/LLM papers (title, authors, abstract,
+    PDF URL). Use it first to find papers. If it returns nothing relevant, or the user
+    needs very recent papers or full-text chunks, use the remote retrieval tools instead.
+    """
+    if paper_index is None:
+        return "The local paper index is not available, use the remote retrieval tools."
+    results = paper_index.search(query, min(max(1, max_results), PAPER_INDEX_MAX_RESULTS))
+    if not results:
+        return "No local matches, use the remote retrieval tools."
+    return json.dumps(results, ensure_ascii=False)
+
+
+PAPER_TOOLS = [search_local_papers] if paper_index is not None else []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local arXiv paper index tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    ingest = subparsers.add_parser("ingest", help="Create the index or append new papers to it")
+    ingest.add_argument("--input", required=True, nargs="+", help=".jsonl or .json arXiv metadata files")
+    ingest.add_argument("--out", required=True)
+    ingest.add_argument("--embedder", default=None, choices=list(EMBEDDERS), help="also build the embedding matrix")
+    ingest.add_argument("--model", default=None)
+    ingest.add_argument("--batch-size", type=int, default=256)
+    build_ivf = subparsers.add_parser("build-ivf", help="Train the IVF lists of the embedding matrix")
+    build_ivf.add_argument("--index", required=True)
+    build_ivf.add_argument("--lists", type=int, default=None, help="sqrt(papers) by default")
+    search = subparsers.add_parser("search", help="Query an index")
+    search.add_argument("--index", required=True)
+    search.add_argument("--query", required=True)
+    search.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        os.makedirs(args.out, exist_ok=True)
+        index = PaperIndex(args.out)
+        for path in args.input:
+            added = index.add_papers(read_papers(path), args.embedder, args.model, args.batch_size)
+            print(f"{path}: {added} new papers")
+        print(f"Paper index at {args.out} holds {index.count} papers")
+    elif args.command == "build-ivf":
+        index = PaperIndex(args.index)
+        if index.embeddings is None:
+            parser.error("the index has no embeddings, ingest it with --embedder")
+        index.build_ivf(args.lists)
+        index.reload()
+        print(f"Trained {len(index.ivf[0])} IVF lists over {index.embeddings.shape[0] - 1} papers")
+    elif args.command == "search":
+        for paper in PaperIndex(args.index).search(args.query, args.k):
+            print(f"{paper['score']:.4f}  {paper['arxiv_id']}  {paper['title']}")
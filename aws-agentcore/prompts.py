@@ -17,7 +17,8 @@ ALLOW CRITERIA - Set block to "false" if the query:
 
 OUTPUT FORMAT - YOU MUST RESPOND WITH ONLY VALID JSON, NO OTHER TEXT:
 {
-  "block": "true OR false"
+  "block": "true OR false",
+  "confidence": 0.0 to 1.0 (how sure you are of the decision)
 }
 
 EXAMPLES:
@@ -54,7 +55,8 @@ CRITICAL INSTRUCTIONS:
 OUTPUT FORMAT - YOU MUST RESPOND WITH ONLY VALID JSON, NO OTHER TEXT:
 {
   "response": "your direct response here OR empty string if passing down",
-  "pass_down": "true OR false"
+  "pass_down": "true OR false",
+  "confidence": 0.0 to 1.0 (how sure you are of the decision)
 }
 
 EXAMPLES:
@@ -165,9 +167,29 @@ Use the tools that are available to you to accomplish the user's research goals.
 - Be precise about what the research says vs. your interpretation
 - When information is limited or uncertain, acknowledge it and suggest additional searches
 - For broad topics, start with search/retrieval before diving into full papers
+- Long tool results (such as full papers) may arrive compacted as a table of contents plus the most relevant chunks; call read_tool_output with the doc_id and chunk ids, a section index or a query when you need more of the document
 - Present information in a clear, structured way that helps users understand complex AI/LLM concepts
 - Balance depth with accessibility based on the user's apparent expertise level
 - Leverage whatever MCP tools are available to provide the most accurate and comprehensive assistance
 
 Your goal is to make AI/LLM research accessible, help users discover relevant work, and provide accurate, well-sourced information to advance their understanding and research.
- """
\ No newline at end of file
+ """
+
+
+CONTEXT_SUMMARY_PROMPT = """
+You maintain a running summary of a conversation between a user and an AI research assistant.
+
+You are given the current summary (possibly empty) followed by older conversation messages that no longer fit in the context window. Produce an updated summary that merges both.
+
+KEEP:
+- The user's research interests, goals and preferences
+- Papers that were found or discussed: titles, authors, URLs and the key findings reported
+- Answers already given and conclusions reached
+- Open questions or follow-ups the user asked for
+
+DROP:
+- Raw tool payloads, full paper text and other verbatim content
+- Greetings and filler
+
+OUTPUT: only the updated summary as plain text, at most a few short paragraphs or bullet points.
+"""
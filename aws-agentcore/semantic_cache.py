@@ -0,0 +1,129 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from guardrail_index import get_embedder, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+# Also share answers across actors, only enable when answers carry nothing user specific
+SEMANTIC_CACHE_GLOBAL = os.getenv("SEMANTIC_CACHE_GLOBAL", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+SEMANTIC_CACHE_MAX_PER_SCOPE = int(os.getenv("SEMANTIC_CACHE_MAX_PER_SCOPE", "256"))
+SEMANTIC_CACHE_MAX_SCOPES = int(os.getenv("SEMANTIC_CACHE_MAX_SCOPES", "1024"))
+SEMANTIC_CACHE_EMBEDDER = os.getenv("SEMANTIC_CACHE_EMBEDDER", "hashing")
+
+GLOBAL_SCOPE = "__global__"
+
+
+class _Scope:
+    """Answers of one actor (or the global scope) with their normalized query embeddings"""
+
+    def __init__(self):
+        self.entries = OrderedDict()  # query -> (answer, created_at), least recently used first
+        self.queries = []
+        self.vectors = None
+
+    def rebuild(self):
+        self.queries = list(self.entries)
+        self.vectors = None
+
+    def matrix(self, vectors_by_query):
+        if self.vectors is None and self.queries:
+            self.vectors = np.vstack([vectors_by_query[q] for q in self.queries])
+        return self.vectors
+
+
+class SemanticAnswerCache:
+    """
+    Local, in-process nearest-neighbour cache of final answers. A query embedding is
+    compared (cosine) against previous queries of the same actor, then the global scope,
+    and the best answer above the threshold is returned. Entries expire after the TTL and
+    each scope is an LRU bounded to max_per_scope answers.
+    """
+
+    def __init__(self, embedder=None, threshold: float = SEMANTIC_CACHE_THRESHOLD, ttl: float = SEMANTIC_CACHE_TTL,
+                 max_per_scope: int = SEMANTIC_CACHE_MAX_PER_SCOPE, use_global: bool = SEMANTIC_CACHE_GLOBAL):
+        self.embedder = embedder or get_embedder(SEMANTIC_CACHE_EMBEDDER)
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_per_scope = max_per_scope
+        self.use_global = use_global
+        self.scopes = OrderedDict()
+        self.vectors = {}  # (scope, query) -> embedding
+        self.counters = {"hits": 0, "misses": 0, "stores": 0}
+
+    def embed(self, query: str) -> np.ndarray:
+        return normalize_rows(self.embedder.embed([query]))[0]
+
+    def _scope(self, name: str, create: bool = False):
+        scope = self.scopes.get(name)
+        if scope is None and create:
+            scope = self.scopes[name] = _Scope()
+            while len(self.scopes) > SEMANTIC_CACHE_MAX_SCOPES:
+                evicted, old = self.scopes.popitem(last=False)
+                for query in old.entries:
+                    self.vectors.pop((evicted, query), None)
+        if scope is not None:
+            self.scopes.move_to_end(name)
+        return scope
+
+    def _expire(self, name: str, scope: _Scope):
+        now = time.time()
+        expired = [q for q, (_, created_at) in scope.entries.items() if now - created_at > self.ttl]
+        for query in expired:
+            del scope.entries[query]
+            self.vectors.pop((name, query), None)
+        if expired:
+            scope.rebuild()
+
+    def _search(self, name: str, vector: np.ndarray):
+        scope = self._scope(name)
+        if scope is None:
+            return None
+        self._expire(name, scope)
+        if not scope.queries:
+            return None
+        matrix = scope.matrix({q: self.vectors[(name, q)] for q in scope.queries})
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        query = scope.queries[best]
+        scope.entries.move_to_end(query)
+        return {"answer": scope.entries[query][0], "query": query, "similarity": float(scores[best]), "scope": name}
+
+    def lookup_vector(self, vector: np.ndarray, actor_id: str):
+        hit = self._search(actor_id, vector)
+        if hit is None and self.use_global:
+            hit = self._search(GLOBAL_SCOPE, vector)
+        self.counters["hits" if hit else "misses"] += 1
+        return hit
+
+    def store_vector(self, vector: np.ndarray, query: str, answer: str, actor_id: str):
+        for name in [actor_id] + ([GLOBAL_SCOPE] if self.use_global else []):
+            scope = self._scope(name, create=True)
+            scope.entries[query] = (answer, time.time())
+            scope.entries.move_to_end(query)
+            self.vectors[(name, query)] = vector
+            while len(scope.entries) > self.max_per_scope:
+                evicted, _ = scope.entries.popitem(last=False)
+                self.vectors.pop((name, evicted), None)
+            scope.rebuild()
+        self.counters["stores"] += 1
+
+    def stats(self):
+        total = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": self.counters["hits"] / total if total else 0.0,
+            "scopes": len(self.scopes),
+        }
+
+
+answer_cache = SemanticAnswerCache() if SEMANTIC_CACHE_ENABLED else None
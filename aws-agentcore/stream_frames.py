@@ -0,0 +1,97 @@
+import json
+import time
+
+from langchain_core.messages import AIMessage
+
+from metrics import role_tag
+
+# Values of the "stream_mode" request field accepted by /invocations
+STREAM_MODE_LEGACY = "legacy"
+STREAM_MODE_NDJSON = "ndjson"
+STREAM_MODE_SSE = "sse"
+STREAM_MODES = (STREAM_MODE_LEGACY, STREAM_MODE_NDJSON, STREAM_MODE_SSE)
+
+MEDIA_TYPES = {
+    STREAM_MODE_LEGACY: "text/plain",
+    STREAM_MODE_NDJSON: "application/x-ndjson",
+    STREAM_MODE_SSE: "text/event-stream",
+}
+
+# Only the answer generating chain streams tokens, guardrail/classifier output is JSON. Matched
+# on the chain's role tag, not the node: the context summarizer also runs inside main_tool_llm.
+TOKEN_STREAMING_NODES = {"main_tool_llm"}
+TOKEN_STREAMING_TAGS = {role_tag(node) for node in TOKEN_STREAMING_NODES}
+# Nodes whose AIMessage is a direct answer (block or off-topic reply). assembler passes the
+# whole state through, its messages were already sent by the node that produced them.
+DIRECT_ANSWER_NODES = {"llm_guardrail", "no_guardrail", "speculative_guardrail"}
+USAGE_FIELDS = ("input_tokens", "output_tokens", "total_tokens")
+
+
+def encode_frame(frame: dict, stream_mode: str) -> str:
+    """
+    Frames are one JSON object per line (NDJSON) or one SSE event whose name is the
+    frame type. Frame types: token, tool_start, tool_end, node_end, message, error, end.
+    """
+    payload = json.dumps(frame, ensure_ascii=False, default=str)
+    if stream_mode == STREAM_MODE_SSE:
+        return f"event: {frame['type']}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+
+def message_text(content) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            part if isinstance(part, str) else part.get("text", "")
+            for part in content
+            if isinstance(part, (str, dict))
+        )
+    return ""
+
+
+async def agent_frames(graph_app, inputs: dict, config: dict):
+    """
+    Runs the graph in messages + updates + custom stream modes and turns the output
+    into structured frames: token deltas of the answer, tool lifecycle events emitted
+    by the tool node, node completion, and a final frame with usage and latency.
+    """
+    start = time.perf_counter()
+    usage = {field: 0 for field in USAGE_FIELDS}
+    first_token_ms = None
+
+    try:
+        async for mode, chunk in graph_app.astream(
+            inputs,
+            config=config,
+            stream_mode=["messages", "updates", "custom"],
+        ):
+            if mode == "messages":
+                message_chunk, metadata = chunk
+                for field in USAGE_FIELDS:
+                    usage[field] += (getattr(message_chunk, "usage_metadata", None) or {}).get(field, 0)
+                node = metadata.get("langgraph_node")
+                text = message_text(message_chunk.content)
+                if TOKEN_STREAMING_TAGS.intersection(metadata.get("tags") or ()) and text:
+                    if first_token_ms is None:
+                        first_token_ms = round((time.perf_counter() - start) * 1000, 1)
+                    yield {"type": "token", "node": node, "text": text}
+            elif mode == "custom":
+                yield chunk
+            elif mode == "updates":
+                for step, data in chunk.items():
+                    yield {"type": "node_end", "node": step}
+                    messages = (data or {}).get("messages") or []
+                    last = messages[-1] if messages else None
+                    # Direct answers from the guardrail/classifier nodes are not token streamed
+                    if isinstance(last, AIMessage) and step in DIRECT_ANSWER_NODES:
+                        yield {"type": "message", "node": step, "text": message_text(last.content)}
+    except Exception as e:
+        yield {"type": "error", "message": str(e)}
+
+    yield {
+        "type": "end",
+        "usage": usage,
+        "ttft_ms": first_token_ms,
+        "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Module level caches stay in memory, nothing is written to ~/.cache
+os.environ.setdefault("TOOL_CACHE_PATH", "")
+
+# The agent modules live next to the Dockerfile, not in a package
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AGENT_DIR)
+# Modules shared with the mediator
+sys.path.append(os.path.join(os.path.dirname(AGENT_DIR), "common"))
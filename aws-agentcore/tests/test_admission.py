@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def test_rate_limit_is_off_by_default():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=4, max_queue=0, metrics_prefix="test")
+        for _ in range(20):
+            (await controller.acquire("actor")).release()
+        assert controller.counters["rejected"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_actor_rate_and_concurrency():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=4, max_queue=0, metrics_prefix="test",
+                                         actor_max_in_flight=1, rate=0.01, burst=2)
+        ticket = await controller.acquire("actor")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("actor")
+        assert rejected.value.reason == "actor_concurrency"
+        ticket.release()
+        (await controller.acquire("actor")).release()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("actor")
+        assert rejected.value.reason == "actor_rate"
+
+    asyncio.run(scenario())
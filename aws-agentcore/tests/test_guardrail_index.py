@@ -0,0 +1,36 @@
+import json
+
+import numpy as np
+
+import guardrail_index
+from guardrail_index import GuardrailIndex, HashingEmbedder, build_index
+
+
+def write_corpus(tmp_path):
+    corpus = tmp_path / "corpus.txt"
+    corpus.write_text("find recent papers on transformer architectures\nsummarize a paper on speculative decoding\n")
+    return str(corpus)
+
+
+def test_threshold_defaults_to_the_embedder(tmp_path):
+    build_index(write_corpus(tmp_path), str(tmp_path / "index"), "hashing")
+    index = GuardrailIndex.load(str(tmp_path / "index"))
+    assert index.threshold == guardrail_index.INDEX_THRESHOLD_DEFAULTS["hashing"]
+    assert index.matches(index.query_vector("recent papers about transformer architectures"))
+    assert not index.matches(index.query_vector("what is the weather in paris today"))
+
+
+def test_threshold_from_build_and_environment(tmp_path, monkeypatch):
+    build_index(write_corpus(tmp_path), str(tmp_path / "index"), "hashing", threshold=0.9)
+    with open(tmp_path / "index" / "meta.json") as f:
+        assert json.load(f)["threshold"] == 0.9
+    assert GuardrailIndex.load(str(tmp_path / "index")).threshold == 0.9
+    monkeypatch.setattr(guardrail_index, "GUARDRAIL_INDEX_THRESHOLD", "0.4")
+    assert GuardrailIndex.load(str(tmp_path / "index")).threshold == 0.4
+
+
+def test_query_vectors_are_cached():
+    index = GuardrailIndex(np.zeros((1, 1024), dtype=np.float32), [""], HashingEmbedder())
+    index.query_vector("Speculative decoding")
+    index.query_vector("speculative  decoding")
+    assert index.stats()["hits"] == 1 and index.stats()["misses"] == 1
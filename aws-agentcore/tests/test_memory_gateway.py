@@ -0,0 +1,114 @@
+import asyncio
+import threading
+
+from langgraph.store.memory import InMemoryStore
+
+from memory_gateway import MemoryGateway
+
+
+class FlakyStore(InMemoryStore):
+    """InMemoryStore which records every batch and fails the first `failures` of them"""
+
+    def __init__(self, failures: int = 0):
+        super().__init__()
+        self.failures = failures
+        self.batches = []
+        self.searches = 0
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def batch(self, ops):
+        self.gate.wait()
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("store unavailable")
+        self.batches.append(list(ops))
+        return super().batch(ops)
+
+    def search(self, namespace_prefix, /, **kwargs):
+        self.searches += 1
+        return super().search(namespace_prefix, **kwargs)
+
+
+def gateway(store, **kwargs):
+    return MemoryGateway(store, flush_interval=0, **kwargs)
+
+
+def test_puts_are_flushed_in_order_and_in_batches():
+    async def scenario():
+        store = FlakyStore()
+        memory = gateway(store, batch_size=2)
+        for i in range(5):
+            await memory.aput(("actor", "thread"), f"key-{i}", {"message": i})
+        await memory.aclose()
+        keys = [[op.key for op in batch] for batch in store.batches]
+        assert [key for batch in keys for key in batch] == [f"key-{i}" for i in range(5)]
+        assert all(len(batch) <= 2 for batch in keys)
+        assert memory.stats()["flushed"] == 5
+
+    asyncio.run(scenario())
+
+
+def test_queued_puts_are_visible_once_flushed():
+    async def scenario():
+        store = FlakyStore()
+        memory = gateway(store)
+        memory.start()
+        assert await memory.asearch(("preferences", "actor")) == []
+        await memory.aput(("preferences", "actor"), "likes", {"topic": "rag"})
+        # Eventually consistent: the cached empty result is kept until the put is flushed
+        assert await memory.asearch(("preferences", "actor")) == []
+        await memory.aflush()
+        assert [item.key for item in await memory.asearch(("preferences", "actor"))] == ["likes"]
+        await memory.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_search_cache_uses_the_normalized_query():
+    async def scenario():
+        store = FlakyStore()
+        memory = gateway(store)
+        await memory.asearch(("preferences", "actor"), query="Speculative  decoding", limit=5)
+        await memory.asearch(("preferences", "actor"), query="speculative decoding ", limit=5)
+        assert store.searches == 1
+        assert memory.stats()["hits"] == 1
+        # Puts under another namespace keep the cached result
+        await memory.aput(("actor", "thread"), "query", {"message": "hi"})
+        await memory.aflush()
+        await memory.asearch(("preferences", "actor"), query="speculative decoding", limit=5)
+        assert store.searches == 1
+        await memory.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_failed_flush_is_retried():
+    async def scenario():
+        store = FlakyStore(failures=2)
+        memory = gateway(store)
+        await memory.aput(("actor", "thread"), "key", {"message": 1})
+        await memory.aclose()
+        assert memory.stats()["flushed"] == 1 and memory.stats()["flush_failures"] == 0
+        assert store.get(("actor", "thread"), "key").value == {"message": 1}
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_blocks_aput():
+    async def scenario():
+        store = FlakyStore()
+        store.gate.clear()
+        memory = gateway(store, max_pending=1)
+        await memory.aput(("actor", "thread"), "first", {})
+        await asyncio.sleep(0.05)  # the worker is stuck writing the first put
+        await memory.aput(("actor", "thread"), "second", {})
+        blocked = asyncio.create_task(memory.aput(("actor", "thread"), "third", {}))
+        await asyncio.sleep(0.05)
+        assert not blocked.done()
+        store.gate.set()
+        await asyncio.wait_for(blocked, 1)
+        await memory.aclose()
+        assert memory.stats()["flushed"] == 3
+
+    asyncio.run(scenario())
@@ -0,0 +1,10 @@
+from memory_prefix import add_memory_prefix, strip_memory_prefix
+
+
+def test_strip_undoes_repeated_prefixes():
+    content = add_memory_prefix(add_memory_prefix("What is RAG?", "likes papers"), "asked about LLMs")
+    assert strip_memory_prefix(content) == "What is RAG?"
+
+
+def test_strip_leaves_unterminated_prefix_alone():
+    assert strip_memory_prefix("Some Previous Info: no blank line") == "Some Previous Info: no blank line"
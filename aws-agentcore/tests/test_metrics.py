@@ -0,0 +1,16 @@
+from prometheus_client import REGISTRY
+
+from metrics import RunMetrics
+
+
+def run_count(status):
+    return REGISTRY.get_sample_value("agent_run_duration_seconds_count", {"status": status}) or 0
+
+
+def test_finish_records_the_run_by_status():
+    before = run_count("cancelled")
+    run_metrics = RunMetrics()
+    run_metrics.tool_loops = 2
+    run_metrics.finish("cancelled")
+    assert run_count("cancelled") == before + 1
+    assert REGISTRY.get_sample_value("agent_tool_loop_depth_count", {"status": "cancelled"}) >= 1
@@ -0,0 +1,59 @@
+import math
+
+import numpy as np
+
+import paper_index
+from paper_index import PaperIndex, tokenize
+
+PAPERS = [
+    ("Speculative decoding for large language models", "Draft models propose tokens that a target model verifies."),
+    ("Retrieval augmented generation", "Language models read retrieved passages before they answer."),
+    ("Mixture of experts routing", "Tokens are routed to a few experts of a sparse model."),
+    ("Quantization of language models", "Weights are stored in four bits with little loss."),
+]
+
+
+def build(directory, embedder_name=None):
+    index = PaperIndex(str(directory))
+    papers = [{"arxiv_id": f"2401.{i:05d}", "title": title, "authors": "", "abstract": abstract,
+               "categories": "cs.CL", "published": "", "pdf_url": ""} for i, (title, abstract) in enumerate(PAPERS)]
+    index.add_papers(papers, embedder_name)
+    return index
+
+
+def reference_bm25(query):
+    docs = [tokenize(f"{title}\n{abstract}") for title, abstract in PAPERS]
+    avg = sum(map(len, docs)) / len(docs)
+    scores = {}
+    for term in dict.fromkeys(tokenize(query)):
+        df = sum(term in doc for doc in docs)
+        idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        for i, doc in enumerate(docs):
+            tf = doc.count(term)
+            if tf:
+                norm = paper_index.BM25_K1 * (1 - paper_index.BM25_B + paper_index.BM25_B * len(doc) / avg)
+                scores[i + 1] = scores.get(i + 1, 0) + idf * tf * (paper_index.BM25_K1 + 1) / (tf + norm)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+def test_bm25_matches_the_reference_scores(tmp_path):
+    index = build(tmp_path)
+    for query in ("language models", "sparse experts tokens", "unknown words"):
+        ranking = index.bm25(query)
+        expected = reference_bm25(query)
+        assert [doc for doc, _ in ranking] == [doc for doc, _ in expected]
+        assert np.allclose([score for _, score in ranking], [score for _, score in expected], rtol=1e-5)
+
+
+def test_ivf_lists_are_used_and_extended(tmp_path, monkeypatch):
+    index = build(tmp_path, "hashing")
+    exact = index.dense("speculative decoding", 2)
+    index.build_ivf(lists=2)
+    index.reload()
+    # Every list probed, so the IVF search is exact
+    monkeypatch.setattr(paper_index, "PAPER_INDEX_IVF_PROBES", 2)
+    assert index.ivf is not None and index.dense("speculative decoding", 2) == exact
+    index.add_papers([{"arxiv_id": "2401.99999", "title": "Speculative decoding with tree drafts",
+                       "authors": "", "abstract": "", "categories": "", "published": "", "pdf_url": ""}])
+    assert len(index.ivf[1]) == index.embeddings.shape[0]
+    assert index.dense("speculative decoding tree drafts", 1)[0][0] == len(PAPERS) + 1
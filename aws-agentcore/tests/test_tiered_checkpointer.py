@@ -0,0 +1,198 @@
+import asyncio
+import operator
+from typing import Annotated, TypedDict
+
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.types import ERROR
+from langgraph.graph import END, START, StateGraph
+
+import tiered_checkpointer
+from tiered_checkpointer import TieredCheckpointSaver
+
+CONFIG = {"configurable": {"thread_id": "t1", "checkpoint_ns": ""}}
+
+
+class RecordingSaver(InMemorySaver):
+    """InMemorySaver which records the order of operations and fails the first `failures` of them"""
+
+    def __init__(self, failures: int = 0):
+        super().__init__()
+        self.failures = failures
+        self.calls = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def _record(self, name):
+        await self.gate.wait()
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("durable saver unavailable")
+        self.calls.append(name)
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        await self._record(("put", checkpoint["id"]))
+        return await super().aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await self._record(("writes", config["configurable"]["checkpoint_id"], task_id))
+        return await super().aput_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id, actor_id=""):
+        self.calls.append(("delete", thread_id, actor_id))
+        return await super().adelete_thread(thread_id)
+
+
+def tiered(durable, **kwargs):
+    return TieredCheckpointSaver(durable, flush_interval=0, **kwargs)
+
+
+def test_flush_applies_puts_and_writes_in_order():
+    async def scenario():
+        durable = RecordingSaver()
+        saver = tiered(durable)
+        first, second = empty_checkpoint(), empty_checkpoint()
+        first_config = await saver.aput(CONFIG, first, {}, {})
+        await saver.aput_writes(first_config, [("a", 1)], "task-1")
+        second_config = await saver.aput(first_config, second, {}, {})
+        await saver.aput_writes(second_config, [("b", 2)], "task-2")
+        # Served from memory before the flush
+        assert (await saver.aget_tuple(CONFIG)).checkpoint["id"] == second["id"]
+        await saver.aclose()
+        assert durable.calls == [
+            ("put", first["id"]), ("writes", first["id"], "task-1"),
+            ("put", second["id"]), ("writes", second["id"], "task-2"),
+        ]
+        assert durable.get_tuple(second_config).pending_writes == [("task-2", "b", 2)]
+        assert saver.stats()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_failing_flush_is_retried_not_dropped(monkeypatch):
+    monkeypatch.setattr(tiered_checkpointer, "TIERED_FLUSH_RETRIES", 2)
+    monkeypatch.setattr(tiered_checkpointer, "TIERED_FLUSH_MAX_BACKOFF", 0.01)
+
+    async def scenario():
+        durable = RecordingSaver(failures=4)
+        saver = tiered(durable)
+        checkpoint = empty_checkpoint()
+        config = await saver.aput(CONFIG, checkpoint, {}, {})
+        await saver.aput_writes(config, [("a", 1)], "task-1")
+        while durable.failures:
+            await asyncio.sleep(0.01)
+        await saver.aflush()
+        stats = saver.stats()
+        assert stats["flush_retries"] == 4 and stats["flushed"] == 2
+        assert not stats["failing"]
+        assert durable.calls == [("put", checkpoint["id"]), ("writes", checkpoint["id"], "task-1")]
+        await saver.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_failing_flush_reports_failing_and_keeps_checkpoints(monkeypatch):
+    monkeypatch.setattr(tiered_checkpointer, "TIERED_FLUSH_RETRIES", 1)
+    monkeypatch.setattr(tiered_checkpointer, "TIERED_FLUSH_MAX_BACKOFF", 0.01)
+
+    async def scenario():
+        durable = RecordingSaver(failures=10 ** 6)
+        saver = tiered(durable, checkpoints_per_thread=1, max_threads=0)
+        config = CONFIG
+        for _ in range(3):
+            config = await saver.aput(config, empty_checkpoint(), {}, {})
+        await asyncio.sleep(0.05)
+        assert saver.stats()["failing"]
+        # Unflushed checkpoints are neither trimmed nor evicted
+        assert len(saver.threads[("", "t1", "")].checkpoints) == 3
+        await saver.aclose(timeout=0.05)
+        assert durable.calls == []
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_blocks_aput():
+    async def scenario():
+        durable = RecordingSaver()
+        durable.gate.clear()
+        saver = tiered(durable, max_pending=1)
+        config = await saver.aput(CONFIG, empty_checkpoint(), {}, {})
+        await asyncio.sleep(0.01)  # the worker is stuck on the first put
+        config = await saver.aput(config, empty_checkpoint(), {}, {})
+        blocked = asyncio.create_task(saver.aput(config, empty_checkpoint(), {}, {}))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        durable.gate.set()
+        await asyncio.wait_for(blocked, 1)
+        await saver.aclose()
+        assert len(durable.calls) == 3
+
+    asyncio.run(scenario())
+
+
+def test_actors_sharing_a_thread_id_are_kept_apart():
+    async def scenario():
+        durable = RecordingSaver()
+        durable.gate.clear()
+        saver = tiered(durable)
+        alice = {"configurable": {"thread_id": "session_1", "checkpoint_ns": "", "actor_id": "alice"}}
+        bob = {"configurable": {"thread_id": "session_1", "checkpoint_ns": "", "actor_id": "bob"}}
+        checkpoint = empty_checkpoint()
+        await saver.aput(alice, checkpoint, {}, {})
+        assert (await saver.aget_tuple(alice)).checkpoint["id"] == checkpoint["id"]
+        # Not flushed yet, so bob can only have been served from alice's cache entry
+        assert await saver.aget_tuple(bob) is None
+        assert saver.stats()["misses"] == 1
+
+        await saver.aput(bob, empty_checkpoint(), {}, {})
+        durable.gate.set()
+        await saver.adelete_thread("session_1", "bob")
+        assert durable.calls[-1] == ("delete", "session_1", "bob")
+        assert list(saver.threads) == [("alice", "session_1", "")]
+        await saver.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_pending_writes_use_task_and_index_identity():
+    async def scenario():
+        saver = tiered(InMemorySaver())
+        config = await saver.aput(CONFIG, empty_checkpoint(), {}, {})
+        await saver.aput_writes(config, [("a", 1), ("a", 2)], "task-1")
+        # A retried task writes the same indexes again, those are kept once
+        await saver.aput_writes(config, [("a", 1), ("a", 2)], "task-1")
+        await saver.aput_writes(config, [(ERROR, "first")], "task-2")
+        await saver.aput_writes(config, [(ERROR, "second")], "task-2")
+        expected = [("task-1", "a", 1), ("task-1", "a", 2), ("task-2", ERROR, "second")]
+        assert (await saver.aget_tuple(config)).pending_writes == expected
+        await saver.aclose()
+        assert sorted(saver.durable.get_tuple(config).pending_writes) == sorted(expected)
+
+    asyncio.run(scenario())
+
+
+class CounterState(TypedDict):
+    steps: Annotated[list, operator.add]
+
+
+def test_graph_state_reaches_the_durable_saver():
+    graph = StateGraph(CounterState)
+    graph.add_node("first", lambda state: {"steps": ["first"]})
+    graph.add_node("second", lambda state: {"steps": ["second"]})
+    graph.add_edge(START, "first")
+    graph.add_edge("first", "second")
+    graph.add_edge("second", END)
+
+    async def scenario():
+        durable = InMemorySaver()
+        saver = tiered(durable)
+        app = graph.compile(checkpointer=saver)
+        config = {"configurable": {"thread_id": "t1"}}
+        await app.ainvoke({"steps": []}, config)
+        await app.ainvoke({"steps": []}, config)
+        await saver.aclose()
+        durable_app = graph.compile(checkpointer=durable)
+        assert (await durable_app.aget_state(config)).values == (await app.aget_state(config)).values
+        assert (await durable_app.aget_state(config)).values["steps"] == ["first", "second"] * 2
+
+    asyncio.run(scenario())
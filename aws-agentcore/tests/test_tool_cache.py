@@ -0,0 +1,79 @@
+import asyncio
+
+from tool_cache import SingleFlight, ToolResultCache
+from tool_executor import execute_tool_calls
+
+
+def test_caller_after_abandon_starts_a_new_call():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def make_call():
+            calls.append(len(calls))
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                await asyncio.sleep(0.01)  # e.g. closing the MCP session
+                raise
+            return len(calls)
+
+        waiter = asyncio.create_task(flight.run("key", make_call))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        # The abandoned call may still be winding down, the next caller must not join it
+        assert await flight.run("key", make_call) == 2
+        assert flight.stats() == {"calls": 2, "coalesced": 0, "abandoned": 1, "in_flight": 0}
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def make_call():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flight.run("key", make_call) for _ in range(3)))
+        assert results == ["result"] * 3 and len(calls) == 1
+
+    asyncio.run(scenario())
+
+
+class CancelledTool:
+    name = "cancelled"
+
+    async def ainvoke(self, args):
+        raise asyncio.CancelledError()
+
+
+def test_cancelled_tool_becomes_an_error_message():
+    async def scenario():
+        tool_calls = [{"name": "cancelled", "args": {}, "id": "call-1"}]
+        messages = await execute_tool_calls(tool_calls, {"cancelled": CancelledTool()})
+        assert messages[0].status == "error" and "cancelled" in messages[0].content
+
+    asyncio.run(scenario())
+
+
+def test_disk_tier_is_trimmed_to_max_rows(tmp_path):
+    async def scenario():
+        cache = ToolResultCache(path=str(tmp_path / "tool_cache.sqlite3"), max_entries=1,
+                                ttls={}, max_rows=3, purge_interval=0)
+        for i in range(5):
+            cache.default_ttl = 100 + i
+            await cache.set("search", {"q": i}, f"result {i}")
+
+        rows = cache._db.execute("SELECT COUNT(*) FROM tool_results").fetchone()[0]
+        assert rows == 3
+        assert cache.counters["evicted"] == 2
+        # The rows closest to expiry went first, the newest ones are still on disk
+        assert await cache.get("search", {"q": 0}) == (False, None)
+        assert await cache.get("search", {"q": 3}) == (True, "result 3")
+
+    asyncio.run(scenario())
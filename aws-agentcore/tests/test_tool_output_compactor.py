@@ -0,0 +1,105 @@
+import threading
+
+import tool_output_compactor
+from tool_output_compactor import CompactedDocument, ToolOutputCompactor, split_chunks, split_sections
+
+TOPICS = ["attention heads", "dropout rates", "learning schedules", "tokenizer merges",
+          "gradient clipping", "batch sizes", "weight decay", "quantization bits",
+          "speculative decoding", "retrieval passages"]
+
+
+def paper():
+    sections = ["# Abstract\nWe study transformers."]
+    for number, topic in enumerate(TOPICS, 1):
+        paragraphs = [f"Paragraph {i} on {topic}: " + "filler words repeated here. " * 8 for i in range(3)]
+        sections.append(f"{number} {topic.title()}\n" + "\n\n".join(paragraphs))
+    return "Preprint, do not cite.\n\n" + "\n\n".join(sections)
+
+
+def test_sections_split_on_headings_and_keep_the_preamble():
+    sections = split_sections(paper())
+    titles = [title for title, _ in sections]
+    assert titles[:3] == ["Preamble", "Abstract", "1 Attention Heads"]
+    assert len(sections) == 2 + len(TOPICS)
+    # A sentence ending in a period is body text, not a heading
+    assert split_sections("INTRODUCTION\nTransformers work.\nSee below.") == [("INTRODUCTION", "Transformers work.\nSee below.")]
+
+
+def test_chunks_pack_paragraphs_and_cut_oversized_ones():
+    body = "aaa\n\nbbb\n\n" + "c" * 25
+    assert split_chunks(body, 10) == ["aaa\n\nbbb", "c" * 10, "c" * 10, "c" * 5]
+    assert split_chunks("one\n\n\n\ntwo", 100) == ["one\n\ntwo"]
+
+
+def test_document_maps_chunks_back_to_their_sections():
+    document = CompactedDocument("doc", "pdf", paper(), chunk_chars=300)
+    assert len(document.chunks) == len(document.chunk_sections)
+    for index, (title, first, last) in enumerate(document.sections):
+        assert all(document.chunk_sections[i] == index for i in range(first, last + 1))
+    assert document.sections[-1][2] == len(document.chunks) - 1
+
+
+def test_bm25_top_k_picks_the_matching_section_in_document_order():
+    document = CompactedDocument("doc", "pdf", paper(), chunk_chars=300)
+    _, first, last = next(section for section in document.sections if section[0] == "9 Speculative Decoding")
+    top = document.top_chunks("How does speculative decoding work?", 3)
+    assert top == list(range(first, last + 1))
+    assert document.top_chunks("speculative", 100) == list(range(len(document.chunks)))
+    assert document.top_chunks("the of and", 2) and not document.bm25("the of and").any()
+
+
+def test_compact_passes_small_outputs_through():
+    compactor = ToolOutputCompactor(min_chars=10_000)
+    assert compactor.compact("pdf", "short", "question") is None
+    assert compactor.stats()["compacted"] == 0
+
+
+def test_compact_shows_top_chunks_and_read_serves_the_rest():
+    compactor = ToolOutputCompactor(min_chars=100, top_k=2, chunk_chars=300)
+    text = paper()
+    compacted = compactor.compact("pdf", text, "gradient clipping")
+    document = next(iter(compactor.documents.values()))
+    assert f'doc_id="{document.doc_id}"' in compacted
+    assert "Paragraph 0 on gradient clipping" in compacted and "tokenizer merges:" not in compacted
+
+    section = next(i for i, s in enumerate(document.sections) if s[0] == "4 Tokenizer Merges")
+    assert "Paragraph 2 on tokenizer merges" in compactor.read(document.doc_id, section=section)
+    assert "Paragraph 1 on weight decay" in compactor.read(document.doc_id, query="weight decay")
+    assert compactor.read(document.doc_id, chunk_ids=[999]).startswith("No matching chunks")
+    assert "no longer available" in compactor.read("missing", chunk_ids=[0])
+    stats = compactor.stats()
+    assert (stats["compacted"], stats["reads"], stats["read_misses"]) == (1, 3, 1)
+    assert 0 < stats["reduction"] < 1
+
+
+def test_read_pages_through_long_requests(monkeypatch):
+    monkeypatch.setattr(tool_output_compactor, "TOOL_COMPACT_MAX_READ", 3)
+    compactor = ToolOutputCompactor(min_chars=100, top_k=2, chunk_chars=300)
+    compactor.compact("pdf", paper(), "dropout")
+    doc_id = next(iter(compactor.documents))
+
+    first_page = compactor.read(doc_id, chunk_ids=[5, 1, 5, 2, 7, 9])
+    assert [line for line in first_page.splitlines() if line.startswith("--- chunk")] == [
+        "--- chunk 5 (2 Dropout Rates) ---", "--- chunk 1 (Abstract) ---", "--- chunk 2 (1 Attention Heads) ---"]
+    assert first_page.endswith("[2 more chunks requested, call again with chunk_ids=[7, 9] for the rest]")
+    second_page = compactor.read(doc_id, chunk_ids=[7, 9])
+    assert "--- chunk 9 " in second_page and "more chunks requested" not in second_page
+
+
+def test_concurrent_reads_keep_counts():
+    compactor = ToolOutputCompactor(min_chars=100, top_k=2, chunk_chars=300)
+    compactor.compact("pdf", paper(), "dropout")
+    doc_id = next(iter(compactor.documents))
+
+    def reader():
+        for _ in range(200):
+            compactor.read(doc_id, chunk_ids=[0])
+            compactor.read("missing", chunk_ids=[0])
+
+    threads = [threading.Thread(target=reader) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = compactor.stats()
+    assert (stats["reads"], stats["read_misses"]) == (1600, 1600)
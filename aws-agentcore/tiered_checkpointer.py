@@ -0,0 +1,308 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    WRITES_IDX_MAP,
+    copy_checkpoint,
+    get_checkpoint_id,
+)
+
+logger = logging.getLogger(__name__)
+
+TIERED_MAX_THREADS = int(os.getenv("TIERED_MAX_THREADS", "256"))
+TIERED_CHECKPOINTS_PER_THREAD = int(os.getenv("TIERED_CHECKPOINTS_PER_THREAD", "4"))
+TIERED_FLUSH_INTERVAL = float(os.getenv("TIERED_FLUSH_INTERVAL", "0.05"))
+TIERED_FLUSH_BATCH_SIZE = int(os.getenv("TIERED_FLUSH_BATCH_SIZE", "64"))
+# Failed attempts before a flush is reported as failing, it keeps being retried either way
+TIERED_FLUSH_RETRIES = int(os.getenv("TIERED_FLUSH_RETRIES", "3"))
+TIERED_FLUSH_MAX_BACKOFF = float(os.getenv("TIERED_FLUSH_MAX_BACKOFF", "30"))
+# Operations waiting for the durable saver, aput() waits for room once this many are queued
+TIERED_MAX_PENDING = int(os.getenv("TIERED_MAX_PENDING", "1024"))
+# Seconds aclose() waits for the queue to drain before giving up on it
+TIERED_CLOSE_TIMEOUT = float(os.getenv("TIERED_CLOSE_TIMEOUT", "30"))
+
+
+class _ThreadCache:
+    def __init__(self):
+        self.checkpoints = OrderedDict()  # checkpoint_id -> CheckpointTuple, oldest first
+        self.pending = {}  # checkpoint_id -> number of operations not yet flushed
+        self.writes = {}  # checkpoint_id -> {(task_id, idx): pending write}, the durable saver's write identity
+
+
+class TieredCheckpointSaver(BaseCheckpointSaver):
+    """
+    Write-behind checkpointer in front of a durable saver (AgentCoreMemorySaver).
+    - recent checkpoints of each thread are kept in an in-memory LRU and served from it
+    - puts and writes are acknowledged once queued and flushed to the durable saver in
+      order, in batches, by a background task; the queue is bounded, aput() waits for
+      room when it is full
+    - a failing flush is retried with capped backoff until it succeeds, it is never
+      dropped; stats() reports "failing" meanwhile
+    - the durable saver is only read on a cache miss
+    - threads are keyed on (actor_id, thread_id, checkpoint_ns) like AgentCoreMemorySaver,
+      so actors sending the same client supplied thread id never share an entry
+    - aclose() flushes everything that is still queued, call it on shutdown
+    Threads or checkpoints with unflushed operations are never evicted, so reads can't
+    fall through to a durable saver which doesn't have them yet.
+    """
+
+    def __init__(self, durable: BaseCheckpointSaver, max_threads: int = TIERED_MAX_THREADS,
+                 checkpoints_per_thread: int = TIERED_CHECKPOINTS_PER_THREAD,
+                 flush_interval: float = TIERED_FLUSH_INTERVAL, batch_size: int = TIERED_FLUSH_BATCH_SIZE,
+                 max_pending: int = TIERED_MAX_PENDING):
+        super().__init__(serde=durable.serde)
+        self.durable = durable
+        self.max_threads = max_threads
+        self.checkpoints_per_thread = checkpoints_per_thread
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.failing = False
+        self.threads = OrderedDict()  # (actor_id, thread_id, checkpoint_ns) -> _ThreadCache
+        self.counters = {"hits": 0, "misses": 0, "flushed": 0, "flush_retries": 0}
+        self._queue = None
+        self._worker = None
+
+    # -- memory tier -------------------------------------------------------
+
+    @staticmethod
+    def _thread_key(config: RunnableConfig):
+        configurable = config["configurable"]
+        # Thread ids are client supplied, the durable saver scopes them by actor
+        return configurable.get("actor_id", ""), configurable["thread_id"], configurable.get("checkpoint_ns", "")
+
+    def _thread(self, key, create: bool = False):
+        cache = self.threads.get(key)
+        if cache is None and create:
+            cache = self.threads[key] = _ThreadCache()
+        if cache is not None:
+            self.threads.move_to_end(key)
+        return cache
+
+    def _evict(self):
+        for key in list(self.threads):
+            if len(self.threads) <= self.max_threads:
+                break
+            if not self.threads[key].pending:
+                del self.threads[key]
+
+    def _trim(self, cache: _ThreadCache):
+        for checkpoint_id in list(cache.checkpoints):
+            if len(cache.checkpoints) <= self.checkpoints_per_thread:
+                break
+            if checkpoint_id not in cache.pending:
+                del cache.checkpoints[checkpoint_id]
+                cache.writes.pop(checkpoint_id, None)
+
+    def _remember(self, key, checkpoint_tuple: CheckpointTuple):
+        cache = self._thread(key, create=True)
+        checkpoint_id = checkpoint_tuple.checkpoint["id"]
+        cache.checkpoints[checkpoint_id] = checkpoint_tuple
+        cache.writes.pop(checkpoint_id, None)
+        cache.checkpoints.move_to_end(checkpoint_id)
+        self._trim(cache)
+        self._evict()
+
+    def _cached_tuple(self, config: RunnableConfig):
+        cache = self._thread(self._thread_key(config))
+        if cache is None or not cache.checkpoints:
+            return None
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id:
+            return cache.checkpoints.get(checkpoint_id)
+        return next(reversed(cache.checkpoints.values()))
+
+    # -- write-behind queue ------------------------------------------------
+
+    async def _enqueue(self, key, checkpoint_id, operation):
+        cache = self._thread(key, create=True)
+        cache.pending[checkpoint_id] = cache.pending.get(checkpoint_id, 0) + 1
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._flush_loop())
+        try:
+            await self._queue.put((key, checkpoint_id, operation))
+        except BaseException:
+            self._mark_flushed(key, checkpoint_id)  # cancelled while waiting for room, never queued
+            raise
+
+    async def _apply(self, operation):
+        # Later operations of the thread depend on this one, so it's retried in place
+        attempt = 0
+        while True:
+            try:
+                await operation()
+                self.counters["flushed"] += 1
+                if self.failing:
+                    logger.info("Checkpoint flush recovered")
+                    self.failing = False
+                return
+            except Exception as e:
+                attempt += 1
+                self.counters["flush_retries"] += 1
+                if attempt == TIERED_FLUSH_RETRIES:
+                    self.failing = True
+                    logger.error(f"Checkpoint flush keeps failing, {self.stats()['queued']} operations held in memory: {e}")
+                else:
+                    logger.info(f"Checkpoint flush failed (attempt {attempt}): {e}")
+                await asyncio.sleep(min(0.2 * 2 ** attempt, TIERED_FLUSH_MAX_BACKOFF))
+
+    def _mark_flushed(self, key, checkpoint_id):
+        cache = self.threads.get(key)
+        if cache is None:
+            return
+        cache.pending[checkpoint_id] -= 1
+        if cache.pending[checkpoint_id] <= 0:
+            del cache.pending[checkpoint_id]
+
+    async def _flush_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(self.flush_interval)
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            # Operations are applied in order, a checkpoint's writes follow its put
+            for key, checkpoint_id, operation in batch:
+                try:
+                    await self._apply(operation)
+                finally:
+                    self._mark_flushed(key, checkpoint_id)
+                    self._queue.task_done()
+
+    async def aflush(self):
+        """Wait until every queued operation reached the durable saver"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def aclose(self, timeout: float = TIERED_CLOSE_TIMEOUT):
+        try:
+            await asyncio.wait_for(self.aflush(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Closing with {self.stats()['queued']} checkpoint operations not flushed to the durable saver")
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+    def stats(self):
+        return {
+            **self.counters,
+            "threads": len(self.threads),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "failing": self.failing,
+        }
+
+    # -- async checkpointer interface ---------------------------------------
+
+    async def aget_tuple(self, config: RunnableConfig):
+        checkpoint_tuple = self._cached_tuple(config)
+        if checkpoint_tuple is not None:
+            self.counters["hits"] += 1
+            return checkpoint_tuple
+        self.counters["misses"] += 1
+        checkpoint_tuple = await self.durable.aget_tuple(config)
+        if checkpoint_tuple is not None:
+            self._remember(self._thread_key(config), checkpoint_tuple)
+        return checkpoint_tuple
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        # Listing needs the full history, which only the durable saver has
+        await self.aflush()
+        async for checkpoint_tuple in self.durable.alist(config, filter=filter, before=before, limit=limit):
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        key = self._thread_key(config)
+        checkpoint = copy_checkpoint(checkpoint)
+        next_config = {
+            "configurable": {
+                **config["configurable"],
+                "checkpoint_ns": key[2],
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+        parent_config = config if get_checkpoint_id(config) else None
+        await self._enqueue(key, checkpoint["id"], lambda: self.durable.aput(config, checkpoint, metadata, new_versions))
+        self._remember(key, CheckpointTuple(next_config, checkpoint, metadata, parent_config, []))
+        return next_config
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        key = self._thread_key(config)
+        checkpoint_id = get_checkpoint_id(config)
+        cache = self._thread(key)
+        checkpoint_tuple = cache.checkpoints.get(checkpoint_id) if cache is not None else None
+        if checkpoint_tuple is not None:
+            pending_writes = self._merge_writes(cache, checkpoint_tuple, writes, task_id)
+            cache.checkpoints[checkpoint_id] = checkpoint_tuple._replace(pending_writes=pending_writes)
+        writes = list(writes)
+        await self._enqueue(key, checkpoint_id, lambda: self.durable.aput_writes(config, writes, task_id, task_path))
+
+    @staticmethod
+    def _merge_writes(cache: _ThreadCache, checkpoint_tuple: CheckpointTuple, writes, task_id: str):
+        # Same identity as the durable savers: (task_id, index of the write), special
+        # channels have a fixed negative index and replace the previous write
+        checkpoint_id = checkpoint_tuple.checkpoint["id"]
+        keyed = cache.writes.get(checkpoint_id)
+        if keyed is None:
+            # Writes read back from the durable saver, indexed in order per task
+            keyed, counts = {}, {}
+            for write in checkpoint_tuple.pending_writes or []:
+                idx = counts[write[0]] = counts.get(write[0], -1) + 1
+                keyed[(write[0], WRITES_IDX_MAP.get(write[1], idx))] = write
+            cache.writes[checkpoint_id] = keyed
+        for idx, (channel, value) in enumerate(writes):
+            write_key = (task_id, WRITES_IDX_MAP.get(channel, idx))
+            if write_key[1] >= 0 and write_key in keyed:
+                continue
+            keyed[write_key] = (task_id, channel, value)
+        return list(keyed.values())
+
+    def _forget_thread(self, thread_id: str, actor_id: str):
+        for key in [key for key in self.threads if key[:2] == (actor_id, thread_id)]:
+            del self.threads[key]
+
+    async def adelete_thread(self, thread_id: str, actor_id: str = ""):
+        await self.aflush()
+        self._forget_thread(thread_id, actor_id)
+        if actor_id:
+            await self.durable.adelete_thread(thread_id, actor_id)
+        else:
+            await self.durable.adelete_thread(thread_id)
+
+    # -- sync interface: reads use the memory tier, writes go straight through --
+
+    def get_tuple(self, config: RunnableConfig):
+        checkpoint_tuple = self._cached_tuple(config)
+        if checkpoint_tuple is not None:
+            return checkpoint_tuple
+        return self.durable.get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        return self.durable.list(config, filter=filter, before=before, limit=limit)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = self.durable.put(config, checkpoint, metadata, new_versions)
+        self._remember(self._thread_key(config), CheckpointTuple(next_config, copy_checkpoint(checkpoint), metadata, config, []))
+        return next_config
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        cache = self._thread(self._thread_key(config))
+        if cache is not None:
+            cache.checkpoints.pop(get_checkpoint_id(config), None)
+        self.durable.put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str, actor_id: str = ""):
+        self._forget_thread(thread_id, actor_id)
+        if actor_id:
+            self.durable.delete_thread(thread_id, actor_id)
+        else:
+            self.durable.delete_thread(thread_id)
+
+    def get_next_version(self, current, channel):
+        return self.durable.get_next_version(current, channel)
@@ -0,0 +1,252 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# ~/.cache lives in the container's writable layer and goes away with it, point this at a
+# mounted volume to keep results across containers (see the readme)
+TOOL_CACHE_PATH = os.getenv("TOOL_CACHE_PATH", os.path.join(
+    os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "research-agent", "tool_cache.sqlite3"))
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "512"))
+TOOL_CACHE_DEFAULT_TTL = float(os.getenv("TOOL_CACHE_DEFAULT_TTL", "3600"))
+# Expired rows are deleted at most this often, on a write
+TOOL_CACHE_PURGE_INTERVAL = float(os.getenv("TOOL_CACHE_PURGE_INTERVAL", "600"))
+# Cap on rows kept in the sqlite file, enforced on the same purge by dropping the rows closest
+# to expiry. 0 disables the cap.
+TOOL_CACHE_MAX_ROWS = int(os.getenv("TOOL_CACHE_MAX_ROWS", "50000"))
+
+# TTL (seconds) per tool, matched as a substring of the MCP tool name since the gateway
+# prefixes tool names with its target. PDF extractions are immutable per URL.
+DEFAULT_TOOL_TTLS = {
+    "get_retrievals": 6 * 3600,
+    "pdf": 30 * 24 * 3600,
+    "extract": 30 * 24 * 3600,
+}
+
+
+def load_tool_ttls():
+    """DEFAULT_TOOL_TTLS, overridden by the TOOL_CACHE_TTLS env var (JSON object)"""
+    ttls = dict(DEFAULT_TOOL_TTLS)
+    raw = os.getenv("TOOL_CACHE_TTLS")
+    if raw:
+        try:
+            ttls.update({k: float(v) for k, v in json.loads(raw).items()})
+        except Exception as e:
+            logger.info(f"Ignoring invalid TOOL_CACHE_TTLS: {e}")
+    return ttls
+
+
+def canonical_args(args) -> str:
+    return json.dumps(args, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def cache_key(tool_name: str, args) -> str:
+    return hashlib.sha256(f"{tool_name}\x00{canonical_args(args)}".encode()).hexdigest()
+
+
+class ToolResultCache:
+    """
+    Two level cache for MCP tool results: an in-memory LRU in front of a sqlite file
+    which survives container restarts. Entries expire after a per-tool TTL, and the file is
+    trimmed to max_rows on every purge.
+    """
+
+    def __init__(self, path: str = TOOL_CACHE_PATH, max_entries: int = TOOL_CACHE_MAX_ENTRIES,
+                 default_ttl: float = TOOL_CACHE_DEFAULT_TTL, ttls: dict = None,
+                 max_rows: int = TOOL_CACHE_MAX_ROWS, purge_interval: float = TOOL_CACHE_PURGE_INTERVAL):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.purge_interval = purge_interval
+        self.default_ttl = default_ttl
+        self.ttls = load_tool_ttls() if ttls is None else ttls
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._next_purge = 0.0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "purged": 0, "evicted": 0}
+        self._open_db()
+
+    def _open_db(self):
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tool_results (key TEXT PRIMARY KEY, tool TEXT, value TEXT, expires_at REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS tool_results_expires_at ON tool_results (expires_at)")
+            self._db.commit()
+        except Exception as e:
+            logger.info(f"Tool cache disk store unavailable, using memory only: {e}")
+            self._db = None
+
+    def ttl_for(self, tool_name: str) -> float:
+        for pattern, ttl in self.ttls.items():
+            if pattern in tool_name:
+                return ttl
+        return self.default_ttl
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return True, entry[0]
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM tool_results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.counters["disk_hits"] += 1
+                    return True, value
+
+            self.counters["misses"] += 1
+            return False, None
+
+    def _set(self, key, tool_name, value):
+        expires_at = time.time() + self.ttl_for(tool_name)
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self.counters["writes"] += 1
+            if self._db is None:
+                return
+            try:
+                payload = json.dumps(value)
+            except (TypeError, ValueError):
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO tool_results (key, tool, value, expires_at) VALUES (?, ?, ?, ?)",
+                (key, tool_name, payload, expires_at),
+            )
+            now = time.time()
+            if now >= self._next_purge:
+                self._next_purge = now + self.purge_interval
+                self._purge(now)
+            self._db.commit()
+
+    def _purge(self, now):
+        self.counters["purged"] += self._db.execute(
+            "DELETE FROM tool_results WHERE expires_at <= ?", (now,)
+        ).rowcount
+        if self.max_rows <= 0:
+            return
+        excess = self._db.execute("SELECT COUNT(*) FROM tool_results").fetchone()[0] - self.max_rows
+        if excess > 0:
+            self.counters["evicted"] += self._db.execute(
+                "DELETE FROM tool_results WHERE key IN "
+                "(SELECT key FROM tool_results ORDER BY expires_at LIMIT ?)", (excess,)
+            ).rowcount
+
+    async def get(self, tool_name: str, args):
+        return await asyncio.to_thread(self._get, cache_key(tool_name, args))
+
+    async def set(self, tool_name: str, args, value):
+        await asyncio.to_thread(self._set, cache_key(tool_name, args), tool_name, value)
+
+    def stats(self):
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        total = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls across sessions: the first caller of a key
+    starts the call as its own task, later callers await the same task and get the same
+    result or error. A waiter that is cancelled (timeout, dropped stream) only stops
+    waiting; the shared call is cancelled once its last waiter is gone.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> [task, waiter count]
+        self.counters = {"calls": 0, "coalesced": 0, "abandoned": 0}
+
+    async def run(self, key: str, make_call):
+        entry = self._calls.get(key)
+        if entry is None:
+            task = asyncio.create_task(make_call())
+            entry = self._calls[key] = [task, 0]
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+            self.counters["calls"] += 1
+        else:
+            self.counters["coalesced"] += 1
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not entry[0].done():
+                self.counters["abandoned"] += 1
+                # Forgotten right away, a new caller of the key starts a fresh call instead of joining this one
+                if self._calls.get(key) is entry:
+                    del self._calls[key]
+                entry[0].cancel()
+
+    def _forget(self, key: str, task):
+        entry = self._calls.get(key)
+        if entry is not None and entry[0] is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Retrieved so a failure nobody waits for anymore is not logged as unhandled
+            task.exception()
+
+    def stats(self):
+        return {**self.counters, "in_flight": len(self._calls)}
+
+
+class CachedTool:
+    """Wraps an MCP tool so that ainvoke goes through the ToolResultCache, concurrent misses share one call"""
+
+    def __init__(self, tool, cache: ToolResultCache, inflight: SingleFlight):
+        self.tool = tool
+        self.name = tool.name
+        self.cache = cache
+        self.inflight = inflight
+
+    async def _call(self, args):
+        value = await self.tool.ainvoke(args)
+        await self.cache.set(self.name, args, value)
+        return value
+
+    async def ainvoke(self, args):
+        hit, value = await self.cache.get(self.name, args)
+        if hit:
+            logger.info(f"Tool cache hit for {self.name}")
+            return value
+        return await self.inflight.run(cache_key(self.name, args), lambda: self._call(args))
+
+
+tool_cache = ToolResultCache()
+tool_calls_inflight = SingleFlight()
+
+
+def wrap_tools_with_cache(tools_by_name, cache: ToolResultCache = tool_cache, inflight: SingleFlight = tool_calls_inflight):
+    return {name: CachedTool(tool, cache, inflight) for name, tool in tools_by_name.items()}
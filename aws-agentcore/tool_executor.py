@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import time
+
+from langchain_core.messages import ToolMessage
+
+from metrics import observe_tool_call
+
+logger = logging.getLogger(__name__)
+
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "60"))
+TOOL_TOTAL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TOTAL_TIMEOUT_SECONDS", "120"))
+
+
+def build_tools_by_name(tools):
+    """Build the name -> tool lookup used by the tool node"""
+    return {tool.name: tool for tool in (tools or [])}
+
+
+def error_tool_message(tool_call, content):
+    return ToolMessage(content=content, tool_call_id=tool_call["id"], name=tool_call["name"], status="error")
+
+
+async def _invoke_tool(tool_call, tool, tool_timeout):
+    tool_name = tool_call["name"]
+    try:
+        observation = await asyncio.wait_for(tool.ainvoke(tool_call["args"]), timeout=tool_timeout)
+    except asyncio.TimeoutError:
+        logger.info(f"Tool {tool_name} timed out after {tool_timeout}s")
+        return error_tool_message(tool_call, f"Tool {tool_name} timed out after {tool_timeout} seconds")
+    except Exception as e:
+        logger.info(f"Tool {tool_name} failed: {e}")
+        return error_tool_message(tool_call, f"Tool {tool_name} failed: {e}")
+    return ToolMessage(content=observation, tool_call_id=tool_call["id"], name=tool_name)
+
+
+async def _run_tool_call(tool_call, tools_by_name, semaphore, tool_timeout, emit=None):
+    tool_name = tool_call["name"]
+    tool = tools_by_name.get(tool_name)
+    if tool is None:
+        return error_tool_message(tool_call, f"Tool {tool_name} not found")
+
+    async with semaphore:
+        if emit:
+            emit({"type": "tool_start", "tool": tool_name, "tool_call_id": tool_call["id"]})
+        start = time.perf_counter()
+        message = await _invoke_tool(tool_call, tool, tool_timeout)
+        elapsed = time.perf_counter() - start
+        observe_tool_call(tool_name, message.status, elapsed)
+        if emit:
+            emit({
+                "type": "tool_end",
+                "tool": tool_name,
+                "tool_call_id": tool_call["id"],
+                "status": message.status,
+                "latency_ms": round(elapsed * 1000, 1),
+            })
+    return message
+
+
+async def execute_tool_calls(
+    tool_calls,
+    tools_by_name,
+    max_concurrency: int = TOOL_MAX_CONCURRENCY,
+    tool_timeout: float = TOOL_TIMEOUT_SECONDS,
+    total_timeout: float = TOOL_TOTAL_TIMEOUT_SECONDS,
+    emit=None,
+):
+    """
+    Run all tool calls of one AIMessage concurrently.
+    At most max_concurrency tools run at once, each one is bounded by tool_timeout and
+    the whole batch by total_timeout. Failures become error ToolMessages and the result
+    list keeps the same order as tool_calls. If the caller is cancelled, every running
+    tool call is cancelled as well.
+    emit, when given, is called with tool_start / tool_end lifecycle events.
+    """
+    if not tool_calls:
+        return []
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    tasks = [
+        asyncio.create_task(_run_tool_call(tool_call, tools_by_name, semaphore, tool_timeout, emit))
+        for tool_call in tool_calls
+    ]
+
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=total_timeout)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+        logger.info(f"{len(pending)} tool call(s) cancelled after the overall timeout of {total_timeout}s")
+
+    result = []
+    for tool_call, task in zip(tool_calls, tasks):
+        if task in pending:
+            result.append(error_tool_message(
+                tool_call,
+                f"Tool {tool_call['name']} cancelled, the tool step exceeded {total_timeout} seconds"
+            ))
+        elif task.cancelled():
+            result.append(error_tool_message(tool_call, f"Tool {tool_call['name']} was cancelled"))
+        elif task.exception() is not None:
+            result.append(error_tool_message(tool_call, f"Tool {tool_call['name']} failed: {task.exception()}"))
+        else:
+            result.append(task.result())
+    return result
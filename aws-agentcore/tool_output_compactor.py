@@ -0,0 +1,281 @@
+"""
+Relevance-based compaction of large tool outputs.
+
+A tool result longer than TOOL_COMPACT_MIN_CHARS (typically a full-PDF extraction) is
+split into sections and chunks, the chunks are ranked against the user's question with
+BM25 (optionally blended with embedding cosine similarity) and only a table of contents
+plus the top-k chunks reach the LLM. The full chunk list is kept in-process so the model
+can fetch more through the built-in read_tool_output tool.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.tools import tool
+
+from async_io import run_blocking
+from guardrail_index import get_embedder
+from stream_frames import message_text
+
+logger = logging.getLogger(__name__)
+
+TOOL_COMPACT_ENABLED = os.getenv("TOOL_COMPACT_ENABLED", "true").lower() == "true"
+TOOL_COMPACT_MIN_CHARS = int(os.getenv("TOOL_COMPACT_MIN_CHARS", "12000"))
+TOOL_COMPACT_CHUNK_CHARS = int(os.getenv("TOOL_COMPACT_CHUNK_CHARS", "1500"))
+TOOL_COMPACT_TOP_K = int(os.getenv("TOOL_COMPACT_TOP_K", "6"))
+# Optional embedder ("hashing" or "openai") blended with BM25, empty for BM25 only
+TOOL_COMPACT_EMBEDDER = os.getenv("TOOL_COMPACT_EMBEDDER", "")
+TOOL_COMPACT_EMBEDDING_WEIGHT = float(os.getenv("TOOL_COMPACT_EMBEDDING_WEIGHT", "0.5"))
+TOOL_COMPACT_MAX_DOCUMENTS = int(os.getenv("TOOL_COMPACT_MAX_DOCUMENTS", "256"))
+# Upper bound of chunks returned by one read_tool_output call
+TOOL_COMPACT_MAX_READ = int(os.getenv("TOOL_COMPACT_MAX_READ", "8"))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+READ_TOOL_NAME = "read_tool_output"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Markdown headings, numbered headings ("3.2 Results") and short all-caps lines
+_HEADING_RE = re.compile(r"^(#{1,6}\s+.+|(\d+(\.\d+)*\.?)\s+[A-Z][^\n]{0,80}|[A-Z][A-Z0-9 \-:]{3,60})$")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it of on or that the this to was were what when "
+    "where which who why will with does do did about can".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def split_sections(text: str):
+    """[(title, body)] split on heading-like lines, text before the first heading is the preamble"""
+    sections = []
+    title, lines = "Preamble", []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped and len(stripped) <= 90 and not stripped.endswith(".") and _HEADING_RE.match(stripped):
+            if any(part.strip() for part in lines):
+                sections.append((title, "\n".join(lines)))
+            title, lines = stripped.lstrip("#").strip(), []
+        else:
+            lines.append(line)
+    if any(part.strip() for part in lines):
+        sections.append((title, "\n".join(lines)))
+    return sections
+
+
+def split_chunks(body: str, chunk_chars: int) -> List[str]:
+    """Paragraph-packed chunks of about chunk_chars, oversized paragraphs are cut"""
+    chunks, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", body):
+        paragraph = paragraph.strip()
+        while len(paragraph) > chunk_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(paragraph[:chunk_chars])
+            paragraph = paragraph[chunk_chars:]
+        if current and len(current) + len(paragraph) + 2 > chunk_chars:
+            chunks.append(current)
+            current = ""
+        if paragraph:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class CompactedDocument:
+    """Chunks of one tool output with their section titles and BM25 statistics"""
+
+    def __init__(self, doc_id: str, tool_name: str, text: str, chunk_chars: int = TOOL_COMPACT_CHUNK_CHARS):
+        self.doc_id = doc_id
+        self.tool_name = tool_name
+        self.chars = len(text)
+        self.chunks = []
+        self.chunk_sections = []
+        self.sections = []  # (title, first chunk, last chunk)
+        for title, body in split_sections(text):
+            first = len(self.chunks)
+            for chunk in split_chunks(body, chunk_chars):
+                self.chunks.append(chunk)
+                self.chunk_sections.append(len(self.sections))
+            if len(self.chunks) > first:
+                self.sections.append((title, first, len(self.chunks) - 1))
+        self.term_counts = [Counter(tokenize(chunk)) for chunk in self.chunks]
+        self.lengths = np.array([sum(counts.values()) for counts in self.term_counts], dtype=np.float32)
+        self._vectors = None
+
+    def bm25(self, query: str) -> np.ndarray:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.chunks:
+            return np.zeros(len(self.chunks), dtype=np.float32)
+        tf = np.array([[counts.get(term, 0) for term in terms] for counts in self.term_counts], dtype=np.float32)
+        df = (tf > 0).sum(axis=0)
+        idf = np.log(1 + (len(self.chunks) - df + 0.5) / (df + 0.5))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / max(float(self.lengths.mean()), 1.0))
+        return (idf * tf * (BM25_K1 + 1) / (tf + norm[:, None])).sum(axis=1)
+
+    def scores(self, query: str, embedder=None, embedding_weight: float = TOOL_COMPACT_EMBEDDING_WEIGHT) -> np.ndarray:
+        scores = self.bm25(query)
+        if scores.size and scores.max() > 0:
+            scores = scores / scores.max()
+        if embedder is not None and self.chunks:
+            if self._vectors is None:
+                self._vectors = embedder.embed(self.chunks)
+            cosine = self._vectors @ embedder.embed([query])[0]
+            scores = (1 - embedding_weight) * scores + embedding_weight * np.clip(cosine, 0, None)
+        return scores
+
+    def top_chunks(self, query: str, k: int, embedder=None) -> List[int]:
+        """Ids of the k best scoring chunks, in document order"""
+        k = min(k, len(self.chunks))
+        if k <= 0:
+            return []
+        scores = self.scores(query, embedder)
+        return sorted(int(i) for i in np.argpartition(-scores, k - 1)[:k])
+
+    def table_of_contents(self) -> str:
+        return "\n".join(
+            f"  [{index}] {title} (chunks {first}-{last})" for index, (title, first, last) in enumerate(self.sections)
+        )
+
+    def render_chunks(self, chunk_ids) -> str:
+        parts = []
+        for chunk_id in chunk_ids:
+            title = self.sections[self.chunk_sections[chunk_id]][0]
+            parts.append(f"--- chunk {chunk_id} ({title}) ---\n{self.chunks[chunk_id]}")
+        return "\n\n".join(parts)
+
+
+class ToolOutputCompactor:
+    """Compacts large tool outputs and keeps the documents for read_tool_output (bounded LRU)"""
+
+    def __init__(self, min_chars: int = TOOL_COMPACT_MIN_CHARS, top_k: int = TOOL_COMPACT_TOP_K,
+                 chunk_chars: int = TOOL_COMPACT_CHUNK_CHARS, embedder=None,
+                 max_documents: int = TOOL_COMPACT_MAX_DOCUMENTS):
+        self.min_chars = min_chars
+        self.top_k = top_k
+        self.chunk_chars = chunk_chars
+        self.embedder = embedder
+        self.max_documents = max_documents
+        self.documents = OrderedDict()
+        self.counters = {"compacted": 0, "chars_in": 0, "chars_out": 0, "reads": 0, "read_misses": 0}
+        # compact() runs on the IO thread pool, read() on the tool executor, both go through the
+        # lock for the documents and the counters
+        self._lock = threading.Lock()
+
+    def _document(self, tool_name: str, text: str) -> CompactedDocument:
+        # Identical outputs (cached tool results, popular papers) share one document
+        doc_id = hashlib.sha256(text.encode()).hexdigest()[:12]
+        with self._lock:
+            document = self.documents.get(doc_id)
+            if document is not None:
+                self.documents.move_to_end(doc_id)
+                return document
+        document = CompactedDocument(doc_id, tool_name, text, self.chunk_chars)
+        with self._lock:
+            document = self.documents.setdefault(doc_id, document)
+            self.documents.move_to_end(doc_id)
+            while len(self.documents) > self.max_documents:
+                self.documents.popitem(last=False)
+        return document
+
+    def compact(self, tool_name: str, text: str, question: str) -> Optional[str]:
+        """Compacted replacement of text, None when it is small enough to pass through"""
+        if len(text) < self.min_chars:
+            return None
+        document = self._document(tool_name, text)
+        if len(document.chunks) <= self.top_k:
+            return None
+        chunk_ids = document.top_chunks(question, self.top_k, self.embedder)
+        compacted = (
+            f"[Compacted output of {tool_name}: {document.chars} chars in {len(document.chunks)} chunks and "
+            f"{len(document.sections)} sections. Showing the {len(chunk_ids)} chunks most relevant to the question. "
+            f"Call {READ_TOOL_NAME} with doc_id=\"{document.doc_id}\" and chunk_ids, a section index or a query "
+            f"to read more.]\n\nTable of contents:\n{document.table_of_contents()}\n\n{document.render_chunks(chunk_ids)}"
+        )
+        with self._lock:
+            self.counters["compacted"] += 1
+            self.counters["chars_in"] += len(text)
+            self.counters["chars_out"] += len(compacted)
+        logger.info(f"Compacted {tool_name} output from {len(text)} to {len(compacted)} chars")
+        return compacted
+
+    def read(self, doc_id: str, chunk_ids: List[int] = None, section: int = None, query: str = None) -> str:
+        with self._lock:
+            document = self.documents.get(doc_id)
+            self.counters["reads" if document is not None else "read_misses"] += 1
+        if document is None:
+            return f"Document {doc_id} is no longer available, call the original tool again to fetch it."
+        if chunk_ids:
+            selected = [i for i in dict.fromkeys(chunk_ids) if 0 <= i < len(document.chunks)]
+        elif section is not None and 0 <= section < len(document.sections):
+            _, first, last = document.sections[section]
+            selected = list(range(first, last + 1))
+        elif query:
+            selected = document.top_chunks(query, TOOL_COMPACT_MAX_READ, self.embedder)
+        else:
+            return f"Pass chunk_ids, a section index or a query. Table of contents:\n{document.table_of_contents()}"
+        if not selected:
+            return f"No matching chunks. Table of contents:\n{document.table_of_contents()}"
+        shown, rest = selected[:TOOL_COMPACT_MAX_READ], selected[TOOL_COMPACT_MAX_READ:]
+        more = f"\n\n[{len(rest)} more chunks requested, call again with chunk_ids={rest} for the rest]" if rest else ""
+        return document.render_chunks(shown) + more
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            documents = len(self.documents)
+        chars_in = counters["chars_in"]
+        return {
+            **counters,
+            "documents": documents,
+            "reduction": round(1 - counters["chars_out"] / chars_in, 3) if chars_in else None,
+        }
+
+
+tool_output_compactor = ToolOutputCompactor(
+    embedder=get_embedder(TOOL_COMPACT_EMBEDDER) if TOOL_COMPACT_EMBEDDER else None
+) if TOOL_COMPACT_ENABLED else None
+
+
+async def compact_tool_messages(messages, question: str):
+    """Replaces large ToolMessage contents by their compacted form, failures keep the original"""
+    if tool_output_compactor is None:
+        return messages
+    result = []
+    for message in messages:
+        text = message_text(message.content) if message.status != "error" and message.name != READ_TOOL_NAME else ""
+        if len(text) >= tool_output_compactor.min_chars:
+            try:
+                compacted = await run_blocking("tool_compaction", tool_output_compactor.compact, message.name, text, question)
+            except Exception as e:
+                logger.info(f"Compacting the {message.name} output failed, passing it through: {e}")
+                compacted = None
+            if compacted is not None:
+                message = message.model_copy(update={"content": compacted})
+        result.append(message)
+    return result
+
+
+@tool(READ_TOOL_NAME)
+def read_tool_output(doc_id: str, chunk_ids: Optional[List[int]] = None, section: Optional[int] = None,
+                     query: Optional[str] = None) -> str:
+    """
+    Read more of a compacted tool output. Pass the doc_id shown in the compacted output and
+    either chunk_ids, a section index from its table of contents, or a query to get the
+    chunks most relevant to it.
+    """
+    if tool_output_compactor is None:
+        return "Tool output compaction is disabled, nothing to read."
+    return tool_output_compactor.read(doc_id, chunk_ids, section, query)
+
+
+BUILTIN_TOOLS = [read_tool_output] if TOOL_COMPACT_ENABLED else []
@@ -0,0 +1,101 @@
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+
+from langchain_core.messages import HumanMessage
+
+from stream_frames import message_text
+
+logger = logging.getLogger(__name__)
+
+VERDICT_CACHE_ENABLED = os.getenv("VERDICT_CACHE_ENABLED", "true").lower() == "true"
+VERDICT_CACHE_MAX_ENTRIES = int(os.getenv("VERDICT_CACHE_MAX_ENTRIES", "4096"))
+VERDICT_ALLOW_TTL = float(os.getenv("VERDICT_ALLOW_TTL", "3600"))
+VERDICT_BLOCK_TTL = float(os.getenv("VERDICT_BLOCK_TTL", "600"))
+# Number of messages before the latest query that are part of the cache key
+VERDICT_CONTEXT_MESSAGES = int(os.getenv("VERDICT_CONTEXT_MESSAGES", "4"))
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode()).hexdigest()[:16]
+
+
+def normalize_query(text: str) -> str:
+    return _SPACE_RE.sub(" ", _PUNCTUATION_RE.sub(" ", text.lower())).strip()
+
+
+def verdict_key(node: str, system_prompt_hash: str, messages) -> str:
+    """node + prompt hash + normalized latest query + hash of the recent context window"""
+    latest = next((i for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)), None)
+    query = normalize_query(message_text(messages[latest].content)) if latest is not None else ""
+    window = messages[max(0, (latest or 0) - VERDICT_CONTEXT_MESSAGES):latest or 0]
+    context = hashlib.sha256("\x00".join(f"{m.type}:{message_text(m.content)}" for m in window).encode()).hexdigest()
+    return hashlib.sha256(f"{node}\x00{system_prompt_hash}\x00{query}\x00{context}".encode()).hexdigest()
+
+
+class VerdictCache:
+    """Bounded LRU of guardrail / classifier verdicts with separate TTLs for block and allow"""
+
+    def __init__(self, max_entries: int = VERDICT_CACHE_MAX_ENTRIES,
+                 allow_ttl: float = VERDICT_ALLOW_TTL, block_ttl: float = VERDICT_BLOCK_TTL):
+        self.max_entries = max_entries
+        self.allow_ttl = allow_ttl
+        self.block_ttl = block_ttl
+        self.entries = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0}
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] > time.time():
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry[0]
+        if entry is not None:
+            del self.entries[key]
+        self.counters["misses"] += 1
+        return None
+
+    def put(self, key: str, verdict, blocked: bool):
+        expires_at = time.time() + (self.block_ttl if blocked else self.allow_ttl)
+        self.entries[key] = (verdict, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        total = self.counters["hits"] + self.counters["misses"]
+        return {**self.counters, "hit_ratio": self.counters["hits"] / total if total else 0.0, "entries": len(self.entries)}
+
+
+class VerdictCachedChain:
+    """
+    Wraps a verdict chain (or cascade) so that repeated queries in the same context skip
+    the LLM round-trip. The system prompt hash is part of every key, so editing the
+    prompt invalidates all of its cached verdicts.
+    """
+
+    def __init__(self, node: str, system_prompt: str, chain, cache: VerdictCache, is_block):
+        self.node = node
+        self.prompt_hash = prompt_hash(system_prompt)
+        self.chain = chain
+        self.cache = cache
+        self.is_block = is_block
+
+    async def ainvoke(self, inputs, config=None):
+        key = verdict_key(self.node, self.prompt_hash, inputs["messages"])
+        verdict = self.cache.get(key)
+        if verdict is not None:
+            logger.info(f"Verdict cache hit for {self.node}")
+            return verdict
+        verdict = await self.chain.ainvoke(inputs, config)
+        self.cache.put(key, verdict, blocked=self.is_block(verdict))
+        return verdict
+
+
+verdict_cache = VerdictCache() if VERDICT_CACHE_ENABLED else None
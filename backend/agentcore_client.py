@@ -0,0 +1,87 @@
+import os
+import json
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Dict, Any
+import aioboto3
+from botocore.config import Config
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+AGENTCORE_REGION = os.getenv("AGENTCORE_REGION", "us-east-1")
+AGENTCORE_MAX_CONNECTIONS = int(os.getenv("AGENTCORE_MAX_CONNECTIONS", "50"))
+AGENTCORE_MAX_ATTEMPTS = int(os.getenv("AGENTCORE_MAX_ATTEMPTS", "3"))
+AGENTCORE_CONNECT_TIMEOUT = float(os.getenv("AGENTCORE_CONNECT_TIMEOUT", "5"))
+AGENTCORE_READ_TIMEOUT = float(os.getenv("AGENTCORE_READ_TIMEOUT", "300"))
+
+
+class AgentCorePool:
+    """
+    One long lived bedrock-agentcore client shared by every request. The underlying
+    connection pool keeps TLS connections alive, and botocore's "standard" retry mode
+    retries throttling/transient errors with exponential backoff and full jitter.
+    """
+
+    def __init__(self):
+        self.session = aioboto3.Session()
+        self.client = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_requests = 0
+        self._stack = None
+
+    async def start(self):
+        self._stack = AsyncExitStack()
+        self.client = await self._stack.enter_async_context(
+            self.session.client(
+                'bedrock-agentcore',
+                region_name=AGENTCORE_REGION,
+                config=Config(
+                    max_pool_connections=AGENTCORE_MAX_CONNECTIONS,
+                    retries={"max_attempts": AGENTCORE_MAX_ATTEMPTS, "mode": "standard"},
+                    connect_timeout=AGENTCORE_CONNECT_TIMEOUT,
+                    read_timeout=AGENTCORE_READ_TIMEOUT,
+                    tcp_keepalive=True,
+                ),
+            )
+        )
+
+    async def close(self):
+        if self._stack is not None:
+            await self._stack.aclose()
+        self._stack = None
+        self.client = None
+
+    @asynccontextmanager
+    async def invoke(self, input_payload: Dict[str, Any]):
+        """Invoke the agent runtime, the response body is released when the block exits"""
+        if self.client is None:
+            raise RuntimeError("AgentCore client pool is not started")
+        self.in_flight += 1
+        self.total_requests += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        response = None
+        try:
+            response = await self.client.invoke_agent_runtime(
+                agentRuntimeArn=os.getenv("AGENT_RUNTIME_ID"),
+                runtimeSessionId=os.getenv("RUNTIME_SESSION_ID"),
+                payload=json.dumps({"input": input_payload}).encode(),
+                qualifier="DEFAULT"
+            )
+            yield response
+        finally:
+            self.in_flight -= 1
+            if response is not None:
+                response['response'].close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "max_connections": AGENTCORE_MAX_CONNECTIONS,
+            "utilization": self.in_flight / AGENTCORE_MAX_CONNECTIONS,
+            "total_requests": self.total_requests,
+        }
+
+
+agentcore_pool = AgentCorePool()
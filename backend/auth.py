@@ -1,9 +1,14 @@
 import os
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import jwt
-from jwt import PyJWKClient
+from jwt import PyJWKClient, PyJWKSet
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
@@ -17,16 +22,105 @@ COGNITO_APP_CLIENT_ID = os.getenv("COGNITO_APP_CLIENT_ID")
 COGNITO_JWKS_URL = f"https://cognito-idp.{COGNITO_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}/.well-known/jwks.json"
 security = HTTPBearer()
 
+# Minimum seconds between two JWKS refetches triggered by an unknown kid
+JWKS_MIN_REFRESH_SECONDS = float(os.getenv("JWKS_MIN_REFRESH_SECONDS", "60"))
+VERIFIED_TOKEN_CACHE_SIZE = int(os.getenv("VERIFIED_TOKEN_CACHE_SIZE", "1024"))
+
+
+class JWKSCache:
+    """
+    Process wide cache of Cognito signing keys. The key set is fetched once and only
+    refetched when a token carries an unknown kid (key rotation), at most once per
+    JWKS_MIN_REFRESH_SECONDS so forged kids cannot hammer Cognito.
+    """
+
+    def __init__(self, jwks_url: str, min_refresh_seconds: float = JWKS_MIN_REFRESH_SECONDS):
+        self.client = PyJWKClient(jwks_url, cache_jwk_set=False, cache_keys=False)
+        self.min_refresh_seconds = min_refresh_seconds
+        self.keys = {}
+        self.last_fetch = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        jwk_set = PyJWKSet.from_dict(self.client.fetch_data())
+        self.keys = {key.key_id: key for key in jwk_set.keys}
+        self.last_fetch = time.monotonic()
+
+    def get_signing_key(self, kid: str):
+        key = self.keys.get(kid)
+        if key is not None:
+            return key
+        with self._lock:
+            key = self.keys.get(kid)
+            if key is not None:
+                return key
+            if self.last_fetch is None or time.monotonic() - self.last_fetch >= self.min_refresh_seconds:
+                self._refresh()
+                key = self.keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unable to find a signing key that matches: {kid}")
+        return key
+
+    def get_signing_key_from_jwt(self, token: str):
+        return self.get_signing_key(jwt.get_unverified_header(token).get("kid"))
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified token claims keyed by token hash, valid until the token's exp"""
+
+    def __init__(self, max_size: int = VERIFIED_TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str, record: bool = True) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        with self._lock:
+            claims = self.entries.get(key)
+            if claims is not None and claims.get("exp", 0) <= time.time():
+                del self.entries[key]
+                claims = None
+            if claims is not None:
+                self.entries.move_to_end(key)
+            if record:
+                self.counters["hits" if claims is not None else "misses"] += 1
+            return claims
+
+    def put(self, token: str, claims: Dict[str, Any]):
+        if "exp" not in claims:
+            return
+        with self._lock:
+            self.entries[self._key(token)] = claims
+            self.entries.move_to_end(self._key(token))
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.counters["hits"] + self.counters["misses"]
+        return {**self.counters, "hit_ratio": self.counters["hits"] / total if total else 0.0, "entries": len(self.entries)}
+
+
+jwks_cache = JWKSCache(COGNITO_JWKS_URL)
+verified_tokens = VerifiedTokenCache()
+
+
 def verify_cognito_token(token: str) -> Dict[str, Any]:
     """
     Verify JWT token from AWS Cognito
     """
+    # Already counted by get_current_user's warm path lookup
+    cached = verified_tokens.get(token, record=False)
+    if cached is not None:
+        return cached
+
     try:
-        # Get the JWKS from Cognito
-        jwks_client = PyJWKClient(COGNITO_JWKS_URL)
-        
-        # Get the signing key from the token
-        signing_key = jwks_client.get_signing_key_from_jwt(token)
+        # Get the signing key from the cached JWKS
+        signing_key = jwks_cache.get_signing_key_from_jwt(token)
         
         # Decode and verify the token
         decoded_token = jwt.decode(
@@ -37,6 +131,7 @@ def verify_cognito_token(token: str) -> Dict[str, Any]:
             options={"verify_exp": True}
         )
         
+        verified_tokens.put(token, decoded_token)
         return decoded_token
     
     except jwt.ExpiredSignatureError:
@@ -55,4 +150,9 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     Dependency to extract and verify the JWT token from Authorization header
     """
     token = credentials.credentials
-    return verify_cognito_token(token)
\ No newline at end of file
+    # Warm path: a dictionary lookup, no thread hop
+    cached = verified_tokens.get(token)
+    if cached is not None:
+        return cached
+    # Cold path may refetch the JWKS over HTTPS, keep it off the event loop
+    return await asyncio.to_thread(verify_cognito_token, token)
\ No newline at end of file
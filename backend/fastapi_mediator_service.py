@@ -1,19 +1,30 @@
-import aioboto3
-import boto3
 import json
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Response
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime
-from fastapi.responses import StreamingResponse
-import asyncio
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from auth import get_current_user
+from auth import get_current_user, verified_tokens
+from agentcore_client import agentcore_pool
+from metrics import instrument_stream, render_metrics, stats_collector
+from admission import controller_from_env, admitted_stream, AdmissionRejected
+from stream_relay import StreamRelay, negotiate_encoding, STREAM_MODE_LEGACY, STREAM_MODES
 
 
-app = FastAPI(title="Agent Local Server")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await agentcore_pool.start()
+    try:
+        yield
+    finally:
+        await agentcore_pool.close()
+
+
+app = FastAPI(title="Agent Local Server", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
@@ -23,28 +34,23 @@ app.add_middleware(
 )
 load_dotenv(override=True)
 
-session = aioboto3.Session()
-agent_core_client = boto3.client('bedrock-agentcore', region_name='us-east-1')
+stats_collector.caches["verified_tokens"] = verified_tokens.stats
+stats_collector.pool = lambda: agentcore_pool.stats()
+# The mediator relays the streams of every agent session, so it admits more than one agent server
+admission = controller_from_env("mediator", max_in_flight=64, max_queue=32)
 
 class InvocationRequest(BaseModel):
     input: Dict[str, Any]
 
 
-async def stream_agent_response(prompt: str, actor_id: str, thread_id: str):
-    
-    async with session.client('bedrock-agentcore', region_name='us-east-1') as client:
-        response = await client.invoke_agent_runtime(
-            agentRuntimeArn=os.getenv("AGENT_RUNTIME_ID"),
-            runtimeSessionId=os.getenv("RUNTIME_SESSION_ID"),
-            payload=json.dumps({"input": {"prompt": prompt, "actor_id": actor_id, "thread_id": thread_id}}).encode(),
-            qualifier="DEFAULT"
-        )
-        
+async def stream_agent_response(prompt: str, actor_id: str, thread_id: str, stream_mode: str = STREAM_MODE_LEGACY):
+    """Raw AgentCore response body chunks, StreamRelay does the framing and flushing"""
+    payload = {"prompt": prompt, "actor_id": actor_id, "thread_id": thread_id}
+    if stream_mode != STREAM_MODE_LEGACY:
+        payload["stream_mode"] = stream_mode
+    async with agentcore_pool.invoke(payload) as response:
         async for chunk in response['response']:
-            decoded = chunk.decode('utf-8')
-            print(f"Yielding chunk: {decoded}")
-            yield decoded + "\n"  # Add newline to help with buffering
-            await asyncio.sleep(0)  # Force immediate flush
+            yield chunk
 
 
 async def getHistory(actor_id: str, thread_id: str):
@@ -53,21 +59,58 @@ async def getHistory(actor_id: str, thread_id: str):
     print("actor_id: ", actor_id)
     print("thread_id: ", thread_id)
 
-    response = agent_core_client.invoke_agent_runtime(
-        agentRuntimeArn=os.getenv("AGENT_RUNTIME_ID"),
-        runtimeSessionId=os.getenv("RUNTIME_SESSION_ID"),
-        payload=json.dumps({"input": {"prompt": "#*HIST*#", "actor_id": actor_id, "thread_id": thread_id}}),
-        qualifier="DEFAULT"
-    )
-
-    response_body = response['response'].read()
+    async with agentcore_pool.invoke({"prompt": "#*HIST*#", "actor_id": actor_id, "thread_id": thread_id}) as response:
+        response_body = await response['response'].read()
     response_data = json.loads(response_body)
     return response_data
 
 
+async def getHistoryPage(actor_id: str, thread_id: str, cursor: Optional[str], limit: int, include_tools: bool, if_none_match: Optional[str]):
+    payload = {
+        "action": "history",
+        "actor_id": actor_id,
+        "thread_id": thread_id,
+        "cursor": cursor,
+        "limit": limit,
+        "include_tools": include_tools,
+        "if_none_match": if_none_match,
+    }
+    async with agentcore_pool.invoke(payload) as response:
+        response_body = await response['response'].read()
+    return json.loads(response_body)
+
+
+@app.get("/history")
+async def history(
+    actor_id: str,
+    thread_id: str,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    include_tools: bool = False,
+    if_none_match: Optional[str] = Header(default=None),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Paginated compact history (newest first). Send the ETag back in If-None-Match to get
+    a 304 when the thread did not change.
+    """
+    try:
+        page = await getHistoryPage(actor_id, thread_id, cursor, limit, include_tools, if_none_match)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"History retrieval failed: {str(e)}")
+
+    etag = page.pop("etag", None)
+    headers = {"ETag": etag} if etag else {}
+    if page.pop("not_modified", False):
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse(page, headers=headers)
+
+
 @app.post("/invocations")
 async def invoke_agent(
     request: InvocationRequest,
+    accept_encoding: Optional[str] = Header(default=None),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """
@@ -88,14 +131,23 @@ async def invoke_agent(
         if user_message == "":
             return ""
 
-        return StreamingResponse(
-            stream_agent_response(user_message, actor_id, thread_id),
-            media_type="text/plain",
-            headers={
-                "Cache-Control": "no-cache",
-                "X-Accel-Buffering": "no",
-            }
-        )
+        stream_mode = request.input.get("stream_mode", STREAM_MODE_LEGACY)
+        if stream_mode not in STREAM_MODES:
+            raise HTTPException(status_code=400, detail=f"Unknown stream_mode {stream_mode}, expected one of {list(STREAM_MODES)}")
+        relay = StreamRelay(stream_mode, negotiate_encoding(accept_encoding, stream_mode))
+        chunks = instrument_stream(relay.relay(stream_agent_response(user_message, actor_id, thread_id, stream_mode)))
+        if admission is not None:
+            # Limits are keyed on the verified Cognito user, not the client supplied actor_id
+            try:
+                ticket = await admission.acquire(current_user.get("sub"))
+            except AdmissionRejected as e:
+                raise HTTPException(status_code=429, detail=str(e), headers=e.headers())
+            chunks = admitted_stream(ticket, chunks)
+
+        return StreamingResponse(chunks, media_type=relay.media_type, headers=relay.headers())
+
+    except HTTPException:
+        raise
 
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -108,6 +160,19 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
 
+@app.get("/pool/stats")
+async def pool_stats():
+    """AgentCore client pool utilization gauge (no auth required)"""
+    return agentcore_pool.stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics (no auth required)"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
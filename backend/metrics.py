@@ -0,0 +1,59 @@
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+STREAM_TTFB = Histogram("mediator_stream_ttfb_seconds", "Time to the first chunk relayed to the client", buckets=LATENCY_BUCKETS)
+STREAM_DURATION = Histogram("mediator_stream_duration_seconds", "Total time of one relayed stream", buckets=LATENCY_BUCKETS)
+STREAM_BYTES = Histogram("mediator_stream_bytes", "Bytes relayed by one streamed response", buckets=BYTE_BUCKETS)
+STREAMS_IN_FLIGHT = Gauge("mediator_streams_in_flight", "Streams currently relayed to clients")
+RELAY_FLUSHES = Counter("mediator_relay_flushes_total", "Writes to the client by what triggered them", ["reason"])
+RELAY_CLIENT_DISCONNECTS = Counter("mediator_relay_client_disconnects_total", "Streams cut short by the client, upstream cancelled")
+
+
+class StatsCollector:
+    """Gauges read from stats() dicts at scrape time: cache hit ratios and pool utilization"""
+
+    def __init__(self):
+        self.caches = {}
+        self.pool = None
+
+    def collect(self):
+        ratios = GaugeMetricFamily("mediator_cache_hit_ratio", "Hit ratio of an in-process cache", labels=["cache"])
+        for name, stats in self.caches.items():
+            ratios.add_metric([name], stats().get("hit_ratio", 0.0))
+        yield ratios
+        if self.pool is not None:
+            stats = self.pool()
+            yield GaugeMetricFamily("mediator_agentcore_in_flight", "AgentCore invocations in flight", value=stats.get("in_flight", 0))
+            yield GaugeMetricFamily("mediator_agentcore_utilization", "AgentCore connection pool utilization", value=stats.get("utilization", 0.0))
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+async def instrument_stream(chunks):
+    """Passes the chunks through while recording TTFB, duration, size and the in-flight gauge"""
+    STREAMS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    first = True
+    size = 0
+    try:
+        async for chunk in chunks:
+            if first:
+                STREAM_TTFB.observe(time.perf_counter() - start)
+                first = False
+            size += len(chunk.encode() if isinstance(chunk, str) else chunk)
+            yield chunk
+    finally:
+        STREAMS_IN_FLIGHT.dec()
+        STREAM_DURATION.observe(time.perf_counter() - start)
+        STREAM_BYTES.observe(size)
+
+
+def render_metrics():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,193 @@
+import asyncio
+import codecs
+import os
+import zlib
+from typing import Optional
+
+from metrics import RELAY_CLIENT_DISCONNECTS, RELAY_FLUSHES
+
+try:
+    import brotli
+except ImportError:  # br is only offered when the brotli package is installed
+    brotli = None
+
+# Values of the "stream_mode" request field, passed through to the agent
+STREAM_MODE_LEGACY = "legacy"
+STREAM_MODE_NDJSON = "ndjson"
+STREAM_MODE_SSE = "sse"
+STREAM_MODES = (STREAM_MODE_LEGACY, STREAM_MODE_NDJSON, STREAM_MODE_SSE)
+
+MEDIA_TYPES = {
+    STREAM_MODE_LEGACY: "text/plain",
+    STREAM_MODE_NDJSON: "application/x-ndjson",
+    STREAM_MODE_SSE: "text/event-stream",
+}
+
+# Token modes are latency bound and never compressed
+TOKEN_STREAM_MODES = {STREAM_MODE_NDJSON, STREAM_MODE_SSE}
+
+# Buffered bytes are sent once there are this many, or this many seconds after the first one
+RELAY_FLUSH_BYTES = int(os.getenv("RELAY_FLUSH_BYTES", "16384"))
+RELAY_FLUSH_INTERVAL = float(os.getenv("RELAY_FLUSH_INTERVAL", "0.025"))
+# SSE comment sent after this many idle seconds, 0 disables heartbeats
+RELAY_HEARTBEAT_INTERVAL = float(os.getenv("RELAY_HEARTBEAT_INTERVAL", "15"))
+# Upstream chunks read ahead of a slow client before reading from AgentCore pauses
+RELAY_MAX_QUEUED_CHUNKS = int(os.getenv("RELAY_MAX_QUEUED_CHUNKS", "64"))
+# Comma separated encodings offered for non-token modes, e.g. "br,gzip"; empty disables compression
+RELAY_COMPRESSION = [name.strip() for name in os.getenv("RELAY_COMPRESSION", "").split(",") if name.strip()]
+
+SSE_HEARTBEAT = b": keepalive\n\n"
+_END = object()
+
+
+def negotiate_encoding(accept_encoding: Optional[str], stream_mode: str) -> Optional[str]:
+    """First configured encoding the client accepts, None for token modes"""
+    if not accept_encoding or stream_mode in TOKEN_STREAM_MODES:
+        return None
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    for name in RELAY_COMPRESSION:
+        if name in accepted and (name != "br" or brotli is not None):
+            return name
+    return None
+
+
+class _Compressor:
+    """Streaming gzip/br, every flush is a sync flush so the client can decode it right away"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor()
+        else:
+            self._gzip = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.flush()
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._br.finish()
+        return self._gzip.flush(zlib.Z_FINISH)
+
+
+async def _pump(upstream, queue: asyncio.Queue):
+    # put() waits while the queue is full, so a slow client stops the reads from AgentCore
+    try:
+        async for chunk in upstream:
+            await queue.put(chunk)
+        await queue.put(_END)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        await queue.put(e)
+
+
+class StreamRelay:
+    """
+    Relays the AgentCore response body to the client:
+    - bytes are passed through untouched; only legacy mode, which separates upstream
+      chunks with a newline, decodes them with an incremental UTF-8 decoder so a chunk
+      boundary inside a multibyte character is never split
+    - writes are coalesced, flushed at flush_bytes or flush_interval after the first
+      buffered byte
+    - SSE streams get a comment heartbeat after heartbeat_interval idle seconds, only
+      between events
+    - non-token modes are compressed when an encoding was negotiated
+    - upstream is read by a separate task into a bounded queue; when the client goes
+      away the task is cancelled and the upstream stream closed
+    """
+
+    def __init__(self, stream_mode: str = STREAM_MODE_LEGACY, encoding: Optional[str] = None,
+                 flush_bytes: int = RELAY_FLUSH_BYTES, flush_interval: float = RELAY_FLUSH_INTERVAL,
+                 heartbeat_interval: float = RELAY_HEARTBEAT_INTERVAL, max_queued_chunks: int = RELAY_MAX_QUEUED_CHUNKS):
+        self.stream_mode = stream_mode
+        self.encoding = encoding
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.heartbeat_interval = heartbeat_interval if stream_mode == STREAM_MODE_SSE else 0
+        self.max_queued_chunks = max_queued_chunks
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES[self.stream_mode]
+
+    def headers(self):
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        if self.encoding is not None:
+            headers["Content-Encoding"] = self.encoding
+            headers["Vary"] = "Accept-Encoding"
+        return headers
+
+    async def relay(self, upstream):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.max_queued_chunks)
+        reader = asyncio.create_task(_pump(upstream, queue))
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace") if self.stream_mode == STREAM_MODE_LEGACY else None
+        compressor = _Compressor(self.encoding) if self.encoding is not None else None
+        buffer = bytearray()
+        deadline = None  # flush time of the oldest buffered byte
+        last_write = loop.time()
+        between_events = True  # the last byte sent ended an SSE event
+
+        def emit(data, reason: str) -> bytes:
+            RELAY_FLUSHES.labels(reason).inc()
+            return compressor.compress(bytes(data)) if compressor is not None else bytes(data)
+
+        try:
+            while True:
+                wake = deadline
+                if self.heartbeat_interval > 0 and not buffer:
+                    wake = last_write + self.heartbeat_interval
+                if wake is None:
+                    item = await queue.get()
+                else:
+                    try:
+                        item = await asyncio.wait_for(queue.get(), max(0.0, wake - loop.time()))
+                    except asyncio.TimeoutError:
+                        item = None
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                now = loop.time()
+                if item:
+                    if decoder is not None:
+                        text = decoder.decode(item)
+                        item = (text + "\n").encode() if text else b""
+                    if item and not buffer:
+                        deadline = now + self.flush_interval
+                    buffer += item
+                if buffer and (len(buffer) >= self.flush_bytes or now >= deadline):
+                    data = emit(buffer, "size" if len(buffer) >= self.flush_bytes else "time")
+                    between_events = buffer.endswith(b"\n\n")
+                    buffer.clear()
+                    deadline = None
+                    last_write = now
+                    yield data
+                elif not buffer and self.heartbeat_interval > 0 and between_events and now - last_write >= self.heartbeat_interval:
+                    last_write = now
+                    yield emit(SSE_HEARTBEAT, "heartbeat")
+
+            if decoder is not None:
+                text = decoder.decode(b"", final=True)
+                if text:
+                    buffer += (text + "\n").encode()
+            tail = emit(buffer, "end") if buffer else b""
+            if compressor is not None:
+                tail += compressor.finish()
+            if tail:
+                yield tail
+        except (asyncio.CancelledError, GeneratorExit):
+            RELAY_CLIENT_DISCONNECTS.inc()
+            raise
+        finally:
+            reader.cancel()
+            try:
+                await reader
+            except (asyncio.CancelledError, Exception):
+                pass
+            # Closes the AgentCore response body instead of leaving it to stream to nobody
+            await upstream.aclose()
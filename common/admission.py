@@ -0,0 +1,226 @@
+# Shared by the agent server and the mediator. The agent image copies it in from the
+# "common" build context, local runs of either app put common/ on PYTHONPATH.
+import asyncio
+import logging
+import math
+import os
+import time
+import weakref
+from collections import OrderedDict
+
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+# Seconds a queued request waits for a stream slot
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))
+# Per actor: concurrent streams and a token bucket of requests per second with a burst,
+# the rate limit is off unless ADMISSION_ACTOR_RATE is set
+ADMISSION_ACTOR_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_ACTOR_MAX_IN_FLIGHT", "2"))
+ADMISSION_ACTOR_RATE = float(os.getenv("ADMISSION_ACTOR_RATE", "0"))
+ADMISSION_ACTOR_BURST = float(os.getenv("ADMISSION_ACTOR_BURST", "10"))
+ADMISSION_MAX_ACTORS = int(os.getenv("ADMISSION_MAX_ACTORS", "10000"))
+
+
+class _Metrics:
+    """Prometheus series of one app, named <prefix>_admission_*"""
+
+    def __init__(self, prefix: str):
+        self.queue_depth = Gauge(f"{prefix}_admission_queue_depth", "Requests waiting for a stream slot")
+        self.in_flight = Gauge(f"{prefix}_admission_in_flight", "Admitted streams holding a slot")
+        self.rejections = Counter(f"{prefix}_admission_rejections_total", "Requests rejected with 429", ["reason"])
+        self.queue_wait = Histogram(f"{prefix}_admission_queue_wait_seconds", "Time spent waiting for a stream slot",
+                                    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5))
+
+
+_metrics = {}
+
+
+def _metrics_for(prefix: str) -> _Metrics:
+    # Series can only be registered once per process
+    if prefix not in _metrics:
+        _metrics[prefix] = _Metrics(prefix)
+    return _metrics[prefix]
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Request rejected ({reason}), retry after {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def headers(self):
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class _Actor:
+    def __init__(self, burst: float):
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.in_flight = 0
+
+
+class AdmissionTicket:
+    """Held for the lifetime of one stream, release() is idempotent"""
+
+    def __init__(self, controller, actor_id: str):
+        self.controller = controller
+        self.actor_id = actor_id
+        self.admitted_at = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """
+    Admission control in front of a streaming endpoint:
+    - per actor: at most actor_max_in_flight streams and a token bucket of `rate`
+      requests per second (burst `burst`), checked first so one actor cannot fill the queue
+    - globally: max_in_flight streams, then up to max_queue requests wait at most
+      queue_timeout seconds for a slot in FIFO order
+    Everything else is rejected right away with a Retry-After estimate, so overload shows
+    up as fast 429s instead of every stream slowing down together.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, metrics_prefix: str,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT, actor_max_in_flight: int = ADMISSION_ACTOR_MAX_IN_FLIGHT,
+                 rate: float = ADMISSION_ACTOR_RATE, burst: float = ADMISSION_ACTOR_BURST):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.actor_max_in_flight = actor_max_in_flight
+        self.rate = rate
+        self.burst = burst
+        self.metrics = _metrics_for(metrics_prefix)
+        self.in_flight = 0
+        self.waiting = 0
+        self.actors = OrderedDict()
+        self.counters = {"admitted": 0, "queued": 0, "rejected": 0}
+        # Moving average of how long a stream holds its slot, used for Retry-After
+        self.avg_hold_seconds = 10.0
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    def _actor(self, actor_id: str) -> _Actor:
+        actor = self.actors.get(actor_id)
+        if actor is None:
+            actor = self.actors[actor_id] = _Actor(self.burst)
+            self._evict_idle()
+        self.actors.move_to_end(actor_id)
+        return actor
+
+    def _evict_idle(self):
+        # Only actors without running streams are dropped, their bucket refills to full anyway
+        while len(self.actors) > ADMISSION_MAX_ACTORS:
+            idle = next((key for key, actor in self.actors.items() if actor.in_flight == 0), None)
+            if idle is None:
+                break
+            del self.actors[idle]
+
+    def _take_token(self, actor: _Actor) -> float:
+        """0 when a token was taken, otherwise seconds until one is available"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        actor.tokens = min(self.burst, actor.tokens + (now - actor.updated_at) * self.rate)
+        actor.updated_at = now
+        if actor.tokens >= 1:
+            actor.tokens -= 1
+            return 0.0
+        return (1 - actor.tokens) / self.rate
+
+    def _reject(self, reason: str, retry_after: float):
+        self.counters["rejected"] += 1
+        self.metrics.rejections.labels(reason).inc()
+        logger.info(f"Admission rejected: {reason}, retry after {retry_after:.1f}s")
+        raise AdmissionRejected(reason, retry_after)
+
+    async def acquire(self, actor_id: str) -> AdmissionTicket:
+        actor = self._actor(actor_id or "anonymous")
+        if actor.in_flight >= self.actor_max_in_flight:
+            self._reject("actor_concurrency", self.avg_hold_seconds)
+        wait = self._take_token(actor)
+        if wait > 0:
+            self._reject("actor_rate", wait)
+
+        actor.in_flight += 1
+        try:
+            if self._slots.locked():
+                if self.waiting >= self.max_queue:
+                    self._reject("queue_full", self.avg_hold_seconds * (self.waiting + 1) / self.max_in_flight)
+                await self._wait_for_slot()
+            else:
+                await self._slots.acquire()
+        except BaseException:
+            actor.in_flight -= 1
+            actor.tokens = min(self.burst, actor.tokens + 1)
+            raise
+
+        self.in_flight += 1
+        self.counters["admitted"] += 1
+        self.metrics.in_flight.set(self.in_flight)
+        return AdmissionTicket(self, actor_id or "anonymous")
+
+    async def _wait_for_slot(self):
+        self.waiting += 1
+        self.counters["queued"] += 1
+        self.metrics.queue_depth.set(self.waiting)
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject("queue_timeout", self.avg_hold_seconds * self.waiting / self.max_in_flight)
+        finally:
+            self.waiting -= 1
+            self.metrics.queue_depth.set(self.waiting)
+            self.metrics.queue_wait.observe(time.monotonic() - start)
+
+    def _release(self, ticket: AdmissionTicket):
+        self._slots.release()
+        self.in_flight -= 1
+        self.metrics.in_flight.set(self.in_flight)
+        actor = self.actors.get(ticket.actor_id)
+        if actor is not None:
+            actor.in_flight -= 1
+        held = time.monotonic() - ticket.admitted_at
+        self.avg_hold_seconds = 0.9 * self.avg_hold_seconds + 0.1 * held
+
+    def stats(self):
+        return {
+            **self.counters,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "actors": len(self.actors),
+            "avg_hold_seconds": round(self.avg_hold_seconds, 2),
+        }
+
+
+async def _release_when_done(ticket: AdmissionTicket, chunks):
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        ticket.release()
+
+
+def admitted_stream(ticket: AdmissionTicket, chunks):
+    """Streams the chunks and frees the slot when the stream ends or the client goes away"""
+    stream = _release_when_done(ticket, chunks)
+    # A generator dropped before its first chunk never runs its finally block
+    weakref.finalize(stream, ticket.release)
+    return stream
+
+
+def controller_from_env(metrics_prefix: str, max_in_flight: int, max_queue: int):
+    """
+    The app's controller, None with ADMISSION_ENABLED=false. ADMISSION_MAX_IN_FLIGHT and
+    ADMISSION_MAX_QUEUE override the app's own defaults.
+    """
+    if not ADMISSION_ENABLED:
+        return None
+    return AdmissionController(int(os.getenv("ADMISSION_MAX_IN_FLIGHT", str(max_in_flight))),
+                               int(os.getenv("ADMISSION_MAX_QUEUE", str(max_queue))), metrics_prefix)